@@ -38,6 +38,7 @@ $(document).ready(function() {
     const msgBox     = $('#msgBox');
     const chunks = {};
     const queryQueue = $.ajaxq.Queue(10);
+    const areaSize = 16;
 
     let seed, wtype, version;
     let vpCenter = { x: 0, z: 0 };
@@ -114,6 +115,15 @@ $(document).ready(function() {
             .appendTo(this.element);
     }
 
+    // Process each chunk of a whole area requested at once, still waiting on it.
+    function processArea(response) {
+        for (const data of response.chunks) {
+            const chunk = (chunks[data.z] || {})[data.x];
+            if (chunk && chunk.request === this)
+                processChunk.call(chunk, data);
+        }
+    }
+
     function stopUpdate() {
         for (let z in chunks) {
             const chunkRow = chunks[z];
@@ -171,19 +181,46 @@ $(document).ready(function() {
                 const element = chunk.element[0];
                 element.style.top = chunk.rect.top + vpHeight * scale;
                 element.style.left = chunk.rect.left + vpWidth * scale;
+                chunk.pending = true;
+            }
+        }
+
+        // Get the new chunks' image URLs and data, an area of chunks per request. Areas are
+        // aligned to a grid of areaSize chunks, so the same area always has the same URL.
+        const gridZMin = Math.floor(zMin / areaSize) * areaSize,
+              gridXMin = Math.floor(xMin / areaSize) * areaSize;
+
+        for (let areaZ=gridZMin; areaZ<zMax; areaZ+=areaSize) {
+            for (let areaX=gridXMin; areaX<xMax; areaX+=areaSize) {
+                const areaChunks = [];
 
-                // Get the chunk's image URL and data.
-                chunk.request = queryQueue.ajax({
-                    context: chunk,
-                    url: '/api/biomes?' + [
+                for (let z=Math.max(areaZ, zMin); z<Math.min(areaZ + areaSize, zMax); z++)
+                    for (let x=Math.max(areaX, xMin); x<Math.min(areaX + areaSize, xMax); x++)
+                        if (chunks[z][x].pending)
+                            areaChunks.push(chunks[z][x]);
+
+                if (!areaChunks.length)
+                    continue;
+
+                const request = queryQueue.ajax({
+                    // (Parameters in their canonical order, so Apache's cache serves repeat requests.)
+                    url: '/api/area?' + [
                         'seed=' + seed,
-                        'wtype=' + wtype,
                         'version=' + version,
-                        'x=' + x,
-                        'z=' + z,
+                        'wtype=' + wtype,
+                        'x=' + areaX,
+                        'z=' + areaZ,
+                        'w=' + areaSize,
+                        'd=' + areaSize,
                     ].join('&'),
                     dataType: 'json',
-                }).done(processChunk);
+                });
+                request.done(processArea.bind(request));
+
+                for (const chunk of areaChunks) {
+                    delete chunk.pending;
+                    chunk.request = request;
+                }
             }
         }
     }
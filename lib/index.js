@@ -13,3 +13,74 @@
   * See the License for the specific language governing permissions and
   * limitations under the License.
 **/
+
+const BINARY_MAGIC = 0x4D42434D; // "MCBM", little endian.
+const BINARY_HEADER_SIZE = 16;
+const BIOMES_RAW = 0, BIOMES_RLE = 1, BIOMES_ZLIB = 2;
+
+// Inflates zlib compressed bytes, where the browser supports it.
+async function inflate(bytes) {
+    const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('deflate'));
+    return new Uint8Array(await new Response(stream).arrayBuffer());
+}
+
+/**
+  * Decodes every chunk in the binary biome data of an ArrayBuffer, as returned by the
+  * "/api/biomes" and "/api/area" endpoints given "fmt=raw", "fmt=rle" or "fmt=zlib" (or an
+  * Accept header of "application/x-mcmaps-biomes"). Resolves to the same chunk objects as
+  * their JSON data, including the image URL if the chunks' world ({seed, version, wtype})
+  * is given.
+**/
+export async function decodeChunks(buffer, world) {
+    const view = new DataView(buffer);
+    const chunks = [];
+
+    for (let offset=0; offset<buffer.byteLength; ) {
+        if (view.getUint32(offset, true) !== BINARY_MAGIC || view.getUint8(offset + 4) !== 1)
+            throw new Error('Not a version 1 binary chunk');
+
+        const encoding = view.getUint8(offset + 5),
+              length = view.getUint16(offset + 6, true),
+              x = view.getInt32(offset + 8, true),
+              z = view.getInt32(offset + 12, true);
+        let payload = new Uint8Array(buffer, offset + BINARY_HEADER_SIZE, length);
+        offset += BINARY_HEADER_SIZE + length;
+
+        let values;
+        if (encoding === BIOMES_RLE) {
+            // (Run length - 1, biome ID) byte pairs.
+            values = new Int8Array(256);
+            for (let i=0, pos=0; i<payload.length; i+=2) {
+                const end = pos + payload[i] + 1;
+                values.fill(payload[i + 1] << 24 >> 24, pos, end);
+                pos = end;
+            }
+        } else if (encoding === BIOMES_ZLIB || encoding === BIOMES_RAW) {
+            if (encoding === BIOMES_ZLIB)
+                payload = await inflate(payload);
+            values = new Int8Array(payload.buffer, payload.byteOffset, payload.length);
+        } else {
+            throw new Error(`Unknown biomes encoding: ${encoding}`);
+        }
+
+        const hash = (BigInt(z >>> 0) << BigInt(32) | BigInt(x >>> 0)).toString().padStart(20, '0');
+        const chunk = {
+            x: x, z: z,
+            hash: hash,
+            biomes: Array.from(new Set(values)).sort((a, b) => a - b),
+            values: Array.from(values),
+        };
+        if (world)
+            chunk.image = '/api/image?' + [
+                'seed=' + encodeURIComponent(world.seed),
+                'version=' + encodeURIComponent(world.version),
+                'wtype=' + encodeURIComponent(world.wtype),
+                'x=' + x,
+                'z=' + z,
+            ].join('&');
+
+        chunks.push(chunk);
+    }
+
+    return chunks;
+}
@@ -25,5 +25,6 @@ parser = ArgumentParser(
 )
 subparsers = parser.add_subparsers(help='sub-command help')
 
+from . import cache  # @IgnorePep8 @UnresolvedImport
 from . import maps  # @IgnorePep8 @UnresolvedImport
 from . import webserver  # @IgnorePep8 @UnresolvedImport
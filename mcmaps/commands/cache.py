@@ -0,0 +1,334 @@
+# Copyright 2020 Lane Shaw
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+''' Command line for managing the cached world data. '''
+
+__all__ = ['cache_daemon', 'cache_usage', 'evict_cache', 'migrate_cache', 'warm_cache']
+
+import json, mcmaps, re, time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from . import subparsers  # @UnresolvedImport
+from mcmaps.mc.constants import WORLD_TYPE
+from mcmaps.util.eviction import parse_size
+
+# Warmed regions are cached before moving on, so interrupted runs can resume where they left off.
+_WARM_ENV = {'MCMAPS_CACHE_WRITE_QUEUE': '0'}
+
+worker_doc_root = None
+worker_region_chunks = None
+
+
+def migrate_cache(args):
+    from mcmaps.mc.chunks import unhashChunkXZ
+    from mcmaps.util.binary import encode_biomes
+    from mcmaps.util.cache import FilesystemBackend, SQLiteBackend
+    from mcmaps.util.chunks import CONTENT_ENCODINGS, compress_json
+    from mcmaps.util.common import chunk_image_url
+    from mcmaps.util.region import CHUNK_BINARY, CHUNK_IMAGE, CHUNK_JSON, region_path
+
+    if args.backend == 'sqlite':
+        cache = SQLiteBackend(str(args.root / 'cache.sqlite3'))
+    else:
+        cache = FilesystemBackend(str(args.root))
+
+    migrated = skipped = 0
+
+    # Convert every world's per chunk JSON and image files into cache records, a region at a time.
+    for biomes_path in sorted(args.root.glob('*/*/*/DIM*/biomes')):
+        world = biomes_path.parts[-5:-1]
+        version, world_type_name, seed = world[:3]
+        region_chunks = defaultdict(list)
+
+        for json_path in biomes_path.glob('*.json'):
+            image_path = biomes_path / 'img' / (json_path.stem + '.png')
+            if not image_path.exists():
+                skipped += 1
+                continue
+
+            x, z = unhashChunkXZ(int(json_path.stem))
+            region_chunks[region_path(str(biomes_path), x, z)].append((x, z, json_path, image_path))
+
+        for path, chunks in region_chunks.items():
+            records = []
+
+            for x, z, json_path, image_path in chunks:
+                # Images are served by the image endpoint now, instead of from the cache folder.
+                chunk = json.loads(json_path.read_bytes())
+                chunk['image'] = chunk_image_url(version, world_type_name, seed, x, z)
+
+                body = json.dumps(chunk).encode('us-ascii')
+                records.append((x, z, CHUNK_JSON, body))
+                records.extend((x, z, record, compress_json(body, record)) for record in CONTENT_ENCODINGS.values())
+                records.append((x, z, CHUNK_IMAGE, image_path.read_bytes()))
+                records.append((x, z, CHUNK_BINARY, encode_biomes(x, z, chunk['values'])))
+
+            cache.put(world, 'biomes', records)
+            migrated += len(chunks)
+
+            if not args.keep:
+                for _, _, json_path, image_path in chunks:
+                    json_path.unlink()
+                    image_path.unlink()
+
+        if region_chunks:
+            print('Migrated %s chunk(s) in %s' % (sum(map(len, region_chunks.values())), biomes_path))
+
+    print('Migrated %s chunk(s) in total, skipped %s without an image.' % (migrated, skipped))
+
+
+def _format_size(size):
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if size < 1024:
+            break
+        size /= 1024
+    else:
+        unit = 'TiB'
+
+    return '%.1f %s' % (size, unit)
+
+
+def cache_usage(args):
+    from mcmaps.util.eviction import CacheIndex
+
+    worlds = defaultdict(lambda: [0, 0, 0.0])
+    for usage in CacheIndex(str(args.root)).scan():
+        world = worlds[usage.world]
+        world[0] += usage.size
+        world[1] += usage.hits
+        world[2] = max(world[2], usage.accessed)
+
+    # Largest worlds first.
+    for world, (size, hits, accessed) in sorted(worlds.items(), key=lambda item: -item[1][0]):
+        print('%-40s %12s %8s hit(s), last used %s' % (
+            world, _format_size(size), hits,
+            time.strftime('%Y-%m-%d %H:%M', time.localtime(accessed)),
+        ))
+
+    print('%s world(s), %s in total.' % (len(worlds), _format_size(sum(world[0] for world in worlds.values()))))
+
+
+def _evict(args):
+    from mcmaps.util.eviction import CacheIndex, evict, parse_worlds
+
+    if args.max_size is None:
+        raise SystemExit('A maximum cache size is required, via --max-size.')
+
+    evicted = evict(
+        CacheIndex(str(args.root)), args.max_size,
+        pinned=parse_worlds(','.join(args.pin)),
+        policy=args.policy,
+        whole_worlds=args.worlds,
+    )
+    if evicted:
+        print('Evicted %s region(s) of %s world(s), %s.' % (
+            len(evicted), len({usage.world for usage in evicted}),
+            _format_size(sum(usage.size for usage in evicted)),
+        ))
+
+    return evicted
+
+
+def evict_cache(args):
+    if not _evict(args):
+        print('Cache is within its maximum size, nothing evicted.')
+
+
+def cache_daemon(args):
+    # Evict in the foreground until interrupted, for running as a service instead of in every WSGI process.
+    try:
+        while True:
+            _evict(args)
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+
+
+def warm_worker_init(doc_root, region_chunks):
+    global worker_doc_root
+    global worker_region_chunks
+    worker_doc_root = doc_root
+    worker_region_chunks = region_chunks
+
+
+def warm_worker(version, world_type, seed, region_x, region_z):
+    from mcmaps.util.cache import get_cache_backend
+    from mcmaps.util.region import CHUNK_JSON
+    from mcmaps.util.chunks import cache_region
+
+    cache = get_cache_backend(_WARM_ENV, worker_doc_root)
+    world_type_name = world_type.name.casefold()
+    world = (version, world_type_name, str(seed), 'DIM0')
+    last_chunk = worker_region_chunks - 1
+
+    # Accesses are counted in the index right away, since pool workers never run atexit hooks.
+    try:
+        # Regions are cached whole, so skip any whose first and last chunks were already cached.
+        if cache.get(world, 'biomes', region_x, region_z, CHUNK_JSON) is not None and \
+                cache.get(world, 'biomes', region_x + last_chunk, region_z + last_chunk, CHUNK_JSON) is not None:
+            return False
+
+        cache_region(cache, version, world_type, seed, region_x, region_z, worker_region_chunks)
+        return True
+    finally:
+        cache.flush()
+
+
+def _warm_task(task):
+    return warm_worker(*task)
+
+
+def _spawn_regions(args, version, region_chunks):
+    from mcmaps.java.string import hashCode
+
+    # Spawn is searched for near the world's origin, so regions are warmed around it, nearest first.
+    chunk_radius = max(args.radius >> 4, 1)
+    region_range = range(-chunk_radius // region_chunks, (chunk_radius - 1) // region_chunks + 1)
+    regions = sorted(
+        ((region_x, region_z) for region_x in region_range for region_z in region_range),
+        key=lambda region: (region[0] * 2 + 1) ** 2 + (region[1] * 2 + 1) ** 2,
+    )
+
+    for seed in args.seed:
+        # Try to parse our seed as either a 64-bit long or hash a string, like the website does.
+        try:
+            seed = int(seed)
+        except ValueError:
+            seed = hashCode(seed)
+
+        for world_type in args.type or ['DEFAULT']:
+            world_type = WORLD_TYPE.__members__[world_type]  # @UndefinedVariable
+            for region_x, region_z in regions:
+                yield version, world_type, seed, region_x * region_chunks, region_z * region_chunks
+
+
+_LOG_REQUEST = re.compile(r'"GET /api/(biomes|area)\?(\S+) HTTP/[\d.]+"')
+
+
+def _log_regions(log_path, region_chunks):
+    from mcmaps.util.wsgi import HTTPServerException, verify_area_parameters, verify_default_parameters
+
+    regions = Counter()
+    with open(log_path, errors='replace') as log_file:
+        for line in log_file:
+            match = _LOG_REQUEST.search(line)
+            if match is None:
+                continue
+
+            endpoint, query = match.groups()
+            try:
+                seed, version, world_type, x, z = verify_default_parameters(query)
+                width = depth = 1
+
+                # (Areas in the log were already accepted by the server, whatever their size.)
+                if endpoint == 'area':
+                    width, depth = verify_area_parameters(query, float('inf'))
+            except HTTPServerException:
+                continue
+
+            # Every region an area covers counts as requested once.
+            for region_x in range(x // region_chunks, (x + width - 1) // region_chunks + 1):
+                for region_z in range(z // region_chunks, (z + depth - 1) // region_chunks + 1):
+                    regions[version, world_type, seed, region_x * region_chunks, region_z * region_chunks] += 1
+
+    # Most requested regions first.
+    return [region for region, _ in regions.most_common()]
+
+
+def _paced(tasks, rate):
+    start_time = time.perf_counter()
+
+    for index, task in enumerate(tasks):
+        if rate:
+            delay = start_time + index / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        yield task
+
+
+def warm_cache(args):
+    from multiprocessing import Pool
+    from mcmaps.mc.biomes import VERSION
+    from mcmaps.util.cache import MemoryBackend, get_cache_backend
+    from mcmaps.util.chunks import get_region_chunks
+
+    doc_root = str(args.root.parent)
+    if isinstance(get_cache_backend(_WARM_ENV, doc_root), MemoryBackend):
+        raise SystemExit('The memory cache backend only lives as long as its process, nothing to warm.')
+
+    region_chunks = get_region_chunks({})
+    if args.log is not None:
+        tasks = _log_regions(args.log, region_chunks)
+    elif args.seed:
+        tasks = list(_spawn_regions(args, VERSION, region_chunks))
+    else:
+        raise SystemExit('Either seeds to warm (--seed) or an access log to replay (--log) are required.')
+
+    warmed = skipped = 0
+    start_time = time.perf_counter()
+
+    warm_pool = Pool(
+        processes=args.jobs,
+        initializer=warm_worker_init,
+        initargs=(doc_root, region_chunks),
+    )
+
+    try:
+        # Generate regions as they're paced out to the workers, reporting progress along the way.
+        for generated in warm_pool.imap_unordered(_warm_task, _paced(tasks, args.rate)):
+            if generated:
+                warmed += 1
+            else:
+                skipped += 1
+
+            print('\r%s/%s region(s) done, %s already cached, %.2f region(s)/s' % (
+                warmed + skipped, len(tasks), skipped,
+                warmed / (time.perf_counter() - start_time),
+            ), end='', flush=True)
+    finally:
+        warm_pool.close()
+        warm_pool.join()
+
+    print('\nWarmed %s region(s) of %s chunk(s) in %s second(s).' % (
+        warmed, region_chunks * region_chunks,
+        int(time.perf_counter() - start_time) + 1,
+    ))
+
+
+CACHE_CMDS = {
+    'daemon': cache_daemon,
+    'evict': evict_cache,
+    'migrate': migrate_cache,
+    'usage': cache_usage,
+    'warm': warm_cache,
+}
+
+cache_cmd = subparsers.add_parser('cache', help='world cache commands')
+cache_cmd.add_argument('-r', '--root', type=Path, default=Path(mcmaps.__file__).parent.parent / 'world_cache')
+cache_cmd.add_argument('-k', '--keep', action='store_true', help='keep the migrated chunk files')
+cache_cmd.add_argument('-b', '--backend', choices=('filesystem', 'sqlite'), default='filesystem', help='cache backend to migrate into')
+cache_cmd.add_argument('-m', '--max-size', type=parse_size, help='maximum cache size to evict down to, like 10G')
+cache_cmd.add_argument('-p', '--pin', action='append', default=[], help='never evict this "version:world type:seed" world')
+cache_cmd.add_argument('--policy', type=str.lower, choices=('lru', 'lfu'), default='lru', help='evict least recently or frequently used first')
+cache_cmd.add_argument('-w', '--worlds', action='store_true', help='evict whole worlds instead of regions')
+cache_cmd.add_argument('-i', '--interval', type=int, default=300, help='seconds between evictions of the daemon')
+cache_cmd.add_argument('-s', '--seed', action='append', default=[], help='seed to warm the regions around spawn of')
+cache_cmd.add_argument('-t', '--type', action='append', type=str.upper, choices=WORLD_TYPE.__members__, help='world type to warm (default: DEFAULT)')  # @UndefinedVariable
+cache_cmd.add_argument('--radius', type=int, default=1024, help='blocks around spawn to warm')
+cache_cmd.add_argument('-l', '--log', type=Path, help='access log to replay the biome requests of, instead of seeds')
+cache_cmd.add_argument('-j', '--jobs', type=int, help='worker processes warming regions (default: CPU count)')
+cache_cmd.add_argument('--rate', type=float, default=0, help='maximum regions warmed per second (default: unlimited)')
+cache_cmd.add_argument('command', metavar='command', type=str.lower, choices=CACHE_CMDS, help='Supported commands: ' + ', '.join(CACHE_CMDS))
+cache_cmd.set_defaults(command_func=lambda x: CACHE_CMDS[x.command](x))
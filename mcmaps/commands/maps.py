@@ -39,11 +39,14 @@ def _blend_colors(c1, c2, a):
     )
 
 
-def image_worker_init(generator, draw_bounds, alpha):
+def image_worker_init(snapshot_path, index, draw_bounds, alpha):
+    from mcmaps.mc.biomes import load_biomes_snapshot
+
     global worker_generator
     global draw_boundaries
     global bound_alpha
-    worker_generator = generator
+    # Every worker maps the same snapshot, instead of unpickling its own copy of the layers.
+    worker_generator = load_biomes_snapshot(snapshot_path, plan_size=(16, 16))[index]
     draw_boundaries = draw_bounds
     bound_alpha = alpha / 255.0
 
@@ -57,16 +60,18 @@ def image_worker(x, z):
     # Generate the biome data.
     area = worker_generator.get_area(x, z, 16, 16)
 
+    if not draw_boundaries:
+        return x, z, area.colors()
+
     # Create a single unified list of biome values per chunk.
     colors = []
     for az in chunk_range:
         for ax in chunk_range:
-            color = area[ax][az].color
-            if draw_boundaries:
-                if (not ax and not x) or (not az and not z):
-                    color = _blend_colors(color, Color(255, 0, 0), bound_alpha)
-                elif not ax or not az:
-                    color = _blend_colors(color, BIOME_ID.NONE.color, bound_alpha)  # @UndefinedVariable
+            color = area.biome(ax, az).color
+            if (not ax and not x) or (not az and not z):
+                color = _blend_colors(color, Color(255, 0, 0), bound_alpha)
+            elif not ax or not az:
+                color = _blend_colors(color, BIOME_ID.NONE.color, bound_alpha)  # @UndefinedVariable
             colors.append(color)
 
     # Create a chunk image from the biome color values and return it.
@@ -75,9 +80,10 @@ def image_worker(x, z):
 
 def generate_image(args):
     from mcmaps.java.string import hashCode
-    from mcmaps.mc.biomes import initialize_all_biomes
+    from mcmaps.mc.biomes import save_biomes_snapshot
     from time import perf_counter
     from multiprocessing import Pool
+    from tempfile import TemporaryDirectory
 
     # Try to parse our seed as either a 64-bit long or hash a string.
     try:
@@ -88,9 +94,6 @@ def generate_image(args):
         if seed not in range(-2**63, 2**63):
             raise ValueError('Invalid seed: ' + args.seed)
 
-    # Pick either the block biome layers or the rainfall/temperature index layers.
-    layers_generator = initialize_all_biomes(seed, args.type)[args.index]
-
     # Round our map corners to the nearest chunk boundary.
     min_x = args.x - (args.x % 16)
     min_z = args.z - (args.z % 16)
@@ -114,9 +117,15 @@ def generate_image(args):
     # Start timing things.
     start_time = perf_counter()
 
+    # Snapshot the world's layer seeds for the workers, which pick either the block biome
+    # layers or the rainfall/temperature index layers.
+    snapshot_dir = TemporaryDirectory(prefix='mcmaps-')
+    snapshot_path = str(Path(snapshot_dir.name, 'generator.snapshot'))
+    save_biomes_snapshot(snapshot_path, seed, args.type)
+
     image_pool = Pool(
         initializer=image_worker_init,
-        initargs=(layers_generator, args.bounds, args.alpha),
+        initargs=(snapshot_path, int(args.index), args.bounds, args.alpha),
     )
     work_args = []
 
@@ -135,6 +144,7 @@ def generate_image(args):
     finally:
         image_pool.close()
         image_pool.join()
+        snapshot_dir.cleanup()
 
     # Save the new map to an image file.
     map_image.save(args.outfile, format='PNG', optimize=True)
@@ -54,12 +54,8 @@ def webserver_run(args):
         'server.socket_port': port,
     })
 
-    cherrypy.quickstart(Root(), '/', {
-        '/cache': {
-            'tools.staticdir.on': True,
-            'tools.staticdir.dir': str(Root.path / 'world_cache'),
-        },
-    })
+    # Cached world data is only served by the API, straight from the cache's region files.
+    cherrypy.quickstart(Root(), '/')
 
 
 SERVER_CMDS = {
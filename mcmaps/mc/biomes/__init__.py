@@ -15,24 +15,41 @@
 ''' Library classes for Biome layer generation. '''
 
 from . import _abc
+from . import cache
+from . import grid
 from . import island
 from . import misc
+from . import plan
 from . import river
+from . import snapshot
 from . import zoom
 from ._abc import *
+from .cache import *
+from .grid import *
 from .island import *
 from .misc import *
+from .plan import *
 from .river import *
+from .snapshot import *
 from .zoom import *
 from mcmaps.mc.constants import WORLD_TYPE
 
+# Layer stacks are currently only implemented for this MC version.
+VERSION = '1.6.4'
+
 __all__ = [
     *_abc.__all__,
+    *cache.__all__,
+    *grid.__all__,
     *island.__all__,
     *misc.__all__,
+    *plan.__all__,
     *river.__all__,
+    *snapshot.__all__,
     *zoom.__all__,
     'initialize_all_biomes',
+    'load_biomes_snapshot',
+    'save_biomes_snapshot',
 ]
 
 _ISLAND_LAYERS = (
@@ -50,8 +67,7 @@ _ISLAND_LAYERS = (
 )
 
 
-def initialize_all_biomes(world_seed, world_type, _debug=None):
-    global _BIOME_LAYERS
+def _create_all_biomes(world_type, _debug=None):
     from copy import copy
 
     base_zoom = 6 if world_type is WORLD_TYPE.LARGE_BIOME else 4
@@ -61,6 +77,11 @@ def initialize_all_biomes(world_seed, world_type, _debug=None):
     for layer, seed in _ISLAND_LAYERS:
         island_layer = layer(seed, child=island_layer, _debug=_debug)
 
+    # The island layers feed both the river and landmass generators, so share them between both per request.
+    # (Unless debugging, where every layer's output is expected exactly as MC generates it.)
+    if not _debug:
+        island_layer = SharedLayer(island_layer)
+
     # Initialize our river and landmass biome generators.
     river_init_layer = ZoomLayer.zoom(
         1000,
@@ -106,10 +127,64 @@ def initialize_all_biomes(world_seed, world_type, _debug=None):
         child_river=river_layer,
         _debug=_debug,
     )
-    biome_noise_layer = VoronoiZoomLayer(10, child=copy(block_biome_layer), _debug=_debug)
+    # Both generators share the block biome layers, except when debugging where only the noise layer is traced.
+    biome_noise_layer = VoronoiZoomLayer(
+        10,
+        child=copy(block_biome_layer) if _debug else block_biome_layer,
+        _debug=_debug,
+    )
+
+    return block_biome_layer, biome_noise_layer
+
+
+def _finish_all_biomes(block_biome_layer, biome_noise_layer, tile_cache, plan_size):
+    # Optionally serve every layer below the generators from a shared TileCache.
+    if tile_cache is not None:
+        tile_cache.attach(block_biome_layer)
+        tile_cache.attach(biome_noise_layer)
+
+    # Optionally compile both generators into plans for areas of a fixed (width, depth).
+    if plan_size is not None:
+        return LayerPlan(block_biome_layer, *plan_size), LayerPlan(biome_noise_layer, *plan_size)
+
+    return block_biome_layer, biome_noise_layer
+
+
+def initialize_all_biomes(world_seed, world_type, tile_cache=None, plan_size=None, _debug=None):
+    block_biome_layer, biome_noise_layer = _create_all_biomes(world_type, _debug=_debug)
 
     # Calculate the layers seeds. (Recursively calculates all the wrapped child layers' seeds)
     block_biome_layer.init_world_seed(world_seed)
     biome_noise_layer.init_world_seed(world_seed)
 
-    return block_biome_layer, biome_noise_layer
+    return _finish_all_biomes(block_biome_layer, biome_noise_layer, tile_cache, plan_size)
+
+
+def save_biomes_snapshot(path, world_seed, world_type):
+    ''' Saves a Snapshot of every layer's world seed, for both generators of a world. '''
+    layers = initialize_all_biomes(world_seed, world_type)
+    write_snapshot(path, Snapshot(
+        VERSION, world_type, world_seed,
+        [layer.world_seed.value for layer in walk_layers(*layers)],
+    ))
+
+
+def load_biomes_snapshot(path, tile_cache=None, plan_size=None):
+    '''
+    Creates both generators of the world saved in a Snapshot, restoring every
+    layer's world seed as is instead of calculating them.
+    '''
+    version, world_type, _, world_seeds = read_snapshot(path)
+    if version != VERSION:
+        raise ValueError('Unsupported snapshot version: ' + version)
+
+    world_type = WORLD_TYPE(world_type)
+    layers = _create_all_biomes(world_type)
+    snapshot_layers = list(walk_layers(*layers))
+    if len(snapshot_layers) != len(world_seeds):
+        raise ValueError('Snapshot doesn\'t match the layers of world type: ' + world_type.name)
+
+    for layer, layer_world_seed in zip(snapshot_layers, world_seeds.tolist()):
+        layer.world_seed.value = layer_world_seed
+
+    return _finish_all_biomes(*layers, tile_cache, plan_size)
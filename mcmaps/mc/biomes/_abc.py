@@ -16,9 +16,14 @@
 
 from abc import ABC, abstractmethod
 from collections import OrderedDict
+from contextlib import contextmanager
 from copy import copy
 from ctypes import c_int32, c_int64
 
+import numpy as np
+
+from .grid import BiomeGrid
+
 __all__ = [
     'BaseLayer',
 ]
@@ -27,6 +32,9 @@ __all__ = [
 class BaseLayer(ABC):
     __slots__ = ('child_layer', 'world_seed', 'layer_seed', 'chunk_seed', '_debug')
 
+    # Name of the layer's type in debug output.
+    debug_name = None
+
     def __init__(self, layer_seed, child=None, _debug=None):
         self._debug = _debug
         self.child_layer = child
@@ -121,6 +129,99 @@ class BaseLayer(ABC):
 
         return next_value.value
 
+    def get_child_areas(self, x_pos, z_pos, x_width, z_depth):
+        ''' Returns (child layer, area) pairs for every child area get_area requests. '''
+        # Most layers request their child's area with a 1 cell halo.
+        return (
+            (self.child_layer, (x_pos - 1, z_pos - 1, x_width + 2, z_depth + 2)),
+        )
+
+    def plan_area(self, x_pos, z_pos, x_width, z_depth, shared_layers):
+        ''' Walks the areas requested below this layer, planning them on any shared layers. '''
+        for child, child_area in self.get_child_areas(x_pos, z_pos, x_width, z_depth):
+            child.plan_area(*child_area, shared_layers)
+
+    @contextmanager
+    def share_child_areas(self, x_pos, z_pos, x_width, z_depth):
+        '''
+        Plans an area on every shared layer below this one, so layers reached through
+        several children are only generated once, then releases them afterwards.
+        '''
+        shared_layers = []
+        self.plan_area(x_pos, z_pos, x_width, z_depth, shared_layers)
+
+        try:
+            yield
+        finally:
+            for layer in shared_layers:
+                layer.release()
+
+    def init_chunk_seeds(self, x_pos, z_pos, x_width, z_depth, shift=0):
+        '''
+        Vectorized init_chunk_seed, returning the chunk seed of every cell in an area
+        as an int64 array indexed by [x, z]. Each cell is seeded with the chunk
+        coordinates ((x_pos + x) << shift, (z_pos + z) << shift).
+        '''
+        chunk_x = (np.arange(x_width, dtype=np.int64) + x_pos) << shift
+        chunk_z = (np.arange(z_depth, dtype=np.int64) + z_pos) << shift
+
+        # The first step only depends on X, so it's calculated once per column.
+        chunk_seeds = np.full(x_width, self.world_seed.value, dtype=np.int64)
+        chunk_seeds *= chunk_seeds * 6364136223846793005 + 1442695040888963407
+        chunk_seeds += chunk_x
+
+        chunk_seeds = chunk_seeds[:, None] * (chunk_seeds[:, None] * 6364136223846793005 + 1442695040888963407)
+        chunk_seeds = chunk_seeds + chunk_z
+
+        chunk_seeds *= chunk_seeds * 6364136223846793005 + 1442695040888963407
+        chunk_seeds += chunk_x[:, None]
+
+        chunk_seeds *= chunk_seeds * 6364136223846793005 + 1442695040888963407
+        chunk_seeds += chunk_z
+
+        return chunk_seeds
+
+    def nextInts(self, chunk_seeds, bound, mask=None):
+        '''
+        Vectorized nextInt, drawing one value per cell from an array of chunk seeds.
+
+        The chunk seeds are advanced in place, but only for cells set in mask (when
+        given) so cells that wouldn't have drawn a value keep their sequence intact.
+        The bound may also be an array to draw with a different bound per cell.
+        '''
+        next_values = (chunk_seeds >> 24) % bound
+
+        next_seeds = chunk_seeds * (chunk_seeds * 6364136223846793005 + 1442695040888963407)
+        next_seeds += self.world_seed.value
+
+        if mask is None:
+            chunk_seeds[...] = next_seeds
+        else:
+            np.copyto(chunk_seeds, next_seeds, where=mask)
+
+        return next_values
+
+    def peekInts(self, chunk_seeds, bound, count):
+        ''' Returns the first count nextInt values of every cell, stacked on the first axis. '''
+        chunk_seeds = chunk_seeds.copy()
+        return np.stack([self.nextInts(chunk_seeds, bound) for _ in range(count)])
+
+    def _store_chunk_seed(self, chunk_seeds, mask=None):
+        ''' Keeps chunk_seed as the last seed used by a vectorized area, like the per-cell loops. '''
+        # Cells are seeded row by row along the X axis, so the last one is at the end of Z.
+        chunk_seeds = chunk_seeds.T.ravel()
+
+        if mask is not None:
+            chunk_seeds = chunk_seeds[mask.T.ravel()]
+
+        if chunk_seeds.size:
+            self.chunk_seed.value = int(chunk_seeds[-1])
+
+    def _store_last_chunk_seed(self, x_pos, z_pos, x_width, z_depth):
+        ''' Like _store_chunk_seed, but for layers that seed every cell without drawing any values. '''
+        if x_width > 0 and z_depth > 0:
+            self.init_chunk_seed(x_pos + x_width - 1, z_pos + z_depth - 1)
+
     def _output_debug_data(self, name, x_pos, z_pos, x_width, z_depth, area):
         ''' Used during implementation testing with an SAX XML writer in _debug. '''
         if not self._debug:
@@ -140,12 +241,32 @@ class BaseLayer(ABC):
 
         for z in range(z_depth):
             debug.startElement('values', {})
-            biomes = map(int, (area[x][z] for x in range(x_width)))
-            debug.characters(' '.join(map(str, biomes)))
+            debug.characters(' '.join(map(str, area.values[:, z].tolist())))
             debug.endElement('values')
 
         debug.endElement('layer')
 
-    @abstractmethod
     def get_area(self, x_pos, z_pos, x_width, z_depth):
-        pass
+        child_areas = self.get_child_areas(x_pos, z_pos, x_width, z_depth)
+
+        # Layers with several children share any layers they have in common.
+        if len(child_areas) > 1:
+            with self.share_child_areas(x_pos, z_pos, x_width, z_depth):
+                child_values = [child.get_area(*child_area) for child, child_area in child_areas]
+        else:
+            child_values = [child.get_area(*child_area) for child, child_area in child_areas]
+
+        biome_values = BiomeGrid.empty(x_pos, z_pos, x_width, z_depth)
+        self.generate_area(biome_values, *child_values)
+
+        if self._debug:
+            self._output_debug_data(self.debug_name, x_pos, z_pos, x_width, z_depth, biome_values)
+
+        return biome_values
+
+    @abstractmethod
+    def generate_area(self, biome_values, *child_values):
+        '''
+        Fills biome_values with this layer's values for its area, given the child
+        values of every area returned by get_child_areas (in the same order).
+        '''
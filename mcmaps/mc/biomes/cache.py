@@ -0,0 +1,293 @@
+# Copyright 2020 Lane Shaw
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+''' Optional caching of generated layer areas, per request or in aligned tiles. '''
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from copy import copy
+from itertools import count
+from threading import Lock, local
+
+import numpy as np
+
+from ._abc import BaseLayer
+from .grid import BiomeGrid
+
+__all__ = [
+    'CachedLayer', 'SharedLayer', 'TileCache',
+]
+
+_layer_ids = count()
+
+
+class TileCache:
+    '''
+    A least recently used cache of aligned layer tiles, shared by every CachedLayer
+    it's attached to and bounded by the total bytes of the tiles it holds.
+
+    Tiles used by a request are kept for the rest of it, even once evicted, since
+    tiles are generated from their child tiles. (Otherwise budgets smaller than a
+    request's tiles would evict child tiles while their siblings still need them.)
+    '''
+    __slots__ = ('tile_size', 'max_bytes', 'used_bytes', 'hits', 'misses', '_tiles', '_lock', '_local')
+
+    def __init__(self, max_bytes=64 << 20, tile_size=32):
+        self.tile_size = tile_size
+        self.max_bytes = max_bytes
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._tiles = OrderedDict()
+        self._lock = Lock()
+        self._local = local()
+
+    def __repr__(self):
+        return '%s(tiles=%s, used bytes=%s, max bytes=%s, hits=%s, misses=%s)' % (
+            self.__class__.__name__,
+            len(self._tiles), self.used_bytes, self.max_bytes,
+            self.hits, self.misses,
+        )
+
+    def __len__(self):
+        return len(self._tiles)
+
+    @contextmanager
+    def pinning(self):
+        '''
+        Keeps every tile this thread gets or puts in the cache until the outermost
+        pinning block exits, however many tiles are evicted meanwhile.
+        '''
+        state = self._local
+        depth = getattr(state, 'depth', 0)
+        if not depth:
+            state.pinned = {}
+
+        state.depth = depth + 1
+        try:
+            yield
+        finally:
+            state.depth = depth
+            if not depth:
+                state.pinned = None
+
+    def get(self, key):
+        pinned = getattr(self._local, 'pinned', None)
+
+        with self._lock:
+            tile = self._tiles.get(key)
+
+            if tile is None and pinned is not None:
+                tile = pinned.get(key)
+
+            if tile is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            if key in self._tiles:
+                self._tiles.move_to_end(key)
+
+        if pinned is not None:
+            pinned[key] = tile
+        return tile
+
+    def put(self, key, tile):
+        pinned = getattr(self._local, 'pinned', None)
+        if pinned is not None:
+            pinned[key] = tile
+
+        with self._lock:
+            if key in self._tiles:
+                return
+
+            self._tiles[key] = tile
+            self.used_bytes += tile.values.nbytes
+
+            # Evict the least recently used tiles until we're back within budget.
+            while self.used_bytes > self.max_bytes and len(self._tiles) > 1:
+                _, evicted = self._tiles.popitem(last=False)
+                self.used_bytes -= evicted.values.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._tiles.clear()
+            self.used_bytes = 0
+
+    def attach(self, layer):
+        ''' Wraps every layer below the given layer with a CachedLayer using this cache. '''
+        wrapped = {}
+
+        def wrap_children(parent):
+            for attr in ('child_layer', 'child_river_layer'):
+                child = getattr(parent, attr, None)
+                if child is None or isinstance(child, CachedLayer):
+                    continue
+
+                # Layers shared by several parents keep sharing a single wrapper.
+                if id(child) not in wrapped:
+                    wrapped[id(child)] = CachedLayer(child, self)
+                    wrap_children(child)
+
+                setattr(parent, attr, wrapped[id(child)])
+
+        wrap_children(layer)
+        return layer
+
+
+class _LayerWrapper(BaseLayer):
+    ''' Base class of layers that change how a child layer is generated, not what it generates. '''
+    __slots__ = ()
+
+    def __init__(self, child):
+        self.child_layer = child
+        self._debug = None
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, self.child_layer)
+
+    @property
+    def world_seed(self):
+        return self.child_layer.world_seed
+
+    def init_world_seed(self, world_seed):
+        self.child_layer.init_world_seed(world_seed)
+
+    def get_child_areas(self, x_pos, z_pos, x_width, z_depth):
+        return (
+            (self.child_layer, (x_pos, z_pos, x_width, z_depth)),
+        )
+
+    def generate_area(self, biome_values, child_values):
+        biome_values.values[...] = child_values.values
+
+
+class CachedLayer(_LayerWrapper):
+    '''
+    Serves a layer's areas from aligned tiles stored in a TileCache, generating
+    and storing any tile that's missing. Tiles are keyed by this wrapper's
+    identity, the layer's world seed, and the tile coordinates.
+    '''
+    __slots__ = ('tile_cache', 'layer_id')
+
+    def __init__(self, child, tile_cache):
+        _LayerWrapper.__init__(self, child)
+        self.tile_cache = tile_cache
+        self.layer_id = next(_layer_ids)
+
+    def __reduce__(self):
+        # Caches are local to a process, so only the wrapped layer is pickled.
+        return copy, (self.child_layer,)
+
+    def __copy__(self):
+        return CachedLayer(copy(self.child_layer), self.tile_cache)
+
+    def get_child_areas(self, x_pos, z_pos, x_width, z_depth):
+        # Tiles are requested individually when missing, so planning stops here.
+        return ()
+
+    def get_tile(self, tile_x, tile_z):
+        tile_size = self.tile_cache.tile_size
+        key = (self.layer_id, self.child_layer.world_seed.value, tile_x, tile_z)
+        tile = self.tile_cache.get(key)
+
+        if tile is None:
+            tile = self.child_layer.get_area(tile_x * tile_size, tile_z * tile_size, tile_size, tile_size)
+            tile = BiomeGrid(tile.x_pos, tile.z_pos, np.ascontiguousarray(tile.values))
+            self.tile_cache.put(key, tile)
+
+        return tile
+
+    def get_area(self, x_pos, z_pos, x_width, z_depth):
+        # Tiles are kept until the outermost cached layer's area is done.
+        with self.tile_cache.pinning():
+            return self._get_tiles_area(x_pos, z_pos, x_width, z_depth)
+
+    def _get_tiles_area(self, x_pos, z_pos, x_width, z_depth):
+        tile_size = self.tile_cache.tile_size
+        tile_x_range = range(x_pos // tile_size, (x_pos + x_width - 1) // tile_size + 1)
+        tile_z_range = range(z_pos // tile_size, (z_pos + z_depth - 1) // tile_size + 1)
+
+        # Areas inside of a single tile don't need to be copied.
+        if len(tile_x_range) == 1 and len(tile_z_range) == 1:
+            return self.get_tile(tile_x_range[0], tile_z_range[0]).view(x_pos, z_pos, x_width, z_depth)
+
+        # Otherwise assemble the area from the overlapping parts of each tile.
+        biome_values = BiomeGrid.empty(x_pos, z_pos, x_width, z_depth)
+
+        for tile_x in tile_x_range:
+            min_x = max(x_pos, tile_x * tile_size)
+            max_x = min(x_pos + x_width, (tile_x + 1) * tile_size)
+
+            for tile_z in tile_z_range:
+                min_z = max(z_pos, tile_z * tile_size)
+                max_z = min(z_pos + z_depth, (tile_z + 1) * tile_size)
+
+                tile = self.get_tile(tile_x, tile_z)
+                biome_values.view(min_x, min_z, max_x - min_x, max_z - min_z).values[...] = \
+                    tile.view(min_x, min_z, max_x - min_x, max_z - min_z).values
+
+        return biome_values
+
+
+class SharedLayer(_LayerWrapper):
+    '''
+    Wraps a layer used by several parents. Every area planned on it while a parent
+    shares its child areas is generated once as a single union, and requests are
+    served as views of it until the parent releases it. State is kept per thread.
+    '''
+    __slots__ = ('_state',)
+
+    def __init__(self, child):
+        _LayerWrapper.__init__(self, child)
+        self._state = local()
+
+    def __reduce__(self):
+        return SharedLayer, (self.child_layer,)
+
+    def __copy__(self):
+        return SharedLayer(copy(self.child_layer))
+
+    def plan_area(self, x_pos, z_pos, x_width, z_depth, shared_layers):
+        planned_area = getattr(self._state, 'planned_area', None)
+
+        if planned_area is None:
+            self._state.planned_area = (x_pos, z_pos, x_width, z_depth)
+            self._state.shared_area = None
+            shared_layers.append(self)
+            return
+
+        # Grow the planned area to the union of both areas.
+        planned_x, planned_z, planned_width, planned_depth = planned_area
+        min_x = min(x_pos, planned_x)
+        min_z = min(z_pos, planned_z)
+        max_x = max(x_pos + x_width, planned_x + planned_width)
+        max_z = max(z_pos + z_depth, planned_z + planned_depth)
+        self._state.planned_area = (min_x, min_z, max_x - min_x, max_z - min_z)
+
+    def release(self):
+        self._state.planned_area = None
+        self._state.shared_area = None
+
+    def get_area(self, x_pos, z_pos, x_width, z_depth):
+        planned_area = getattr(self._state, 'planned_area', None)
+
+        if planned_area is not None:
+            if self._state.shared_area is None:
+                self._state.shared_area = self.child_layer.get_area(*planned_area)
+
+            if self._state.shared_area.contains(x_pos, z_pos, x_width, z_depth):
+                return self._state.shared_area.view(x_pos, z_pos, x_width, z_depth)
+
+        return self.child_layer.get_area(x_pos, z_pos, x_width, z_depth)
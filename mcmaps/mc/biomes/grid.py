@@ -0,0 +1,140 @@
+# Copyright 2020 Lane Shaw
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+''' Compact array storage for biome values passed between layers. '''
+
+from collections import namedtuple
+
+import numpy as np
+
+from mcmaps.mc.constants import BIOME_ID
+
+__all__ = [
+    'BiomeGrid', 'Neighborhood',
+]
+
+# T=Top,  M=Middle, B=Bottom
+# L=Left, C=Center, R=Right
+#
+# [TL | TC | TR]
+# [---+----+---]
+# [ML | MC | MR]
+# [---+----+---]
+# [BL | BC | BR]
+Neighborhood = namedtuple('Neighborhood', ('tl', 'tc', 'tr', 'ml', 'mc', 'mr', 'bl', 'bc', 'br'))
+
+# RGB colors for every biome, indexed by the biome's ID as an unsigned byte.
+_COLOR_TABLE = np.zeros((256, 3), dtype=np.uint8)
+for _biome in BIOME_ID:
+    _COLOR_TABLE[_biome.value & 0xFF] = _biome.color
+del _biome
+
+
+class BiomeGrid:
+    '''
+    A rectangle of raw biome IDs positioned in layer coordinates.
+
+    Values are stored as a single int8 array indexed by [x, z], so sub-areas
+    (like the 1 cell halo most layers request from their children) can be
+    taken as views without copying. BIOME_ID members are only created when
+    values are read out through biome() or biomes().
+    '''
+    __slots__ = ('x_pos', 'z_pos', 'values')
+
+    dtype = np.int8
+
+    def __init__(self, x_pos, z_pos, values):
+        self.x_pos = x_pos
+        self.z_pos = z_pos
+        self.values = values
+
+    @classmethod
+    def empty(cls, x_pos, z_pos, x_width, z_depth, fill=BIOME_ID.OCEAN):
+        return cls(x_pos, z_pos, np.full((x_width, z_depth), fill, dtype=cls.dtype))
+
+    def __repr__(self):
+        return '%s(x=%s, z=%s, width=%s, depth=%s)' % (
+            self.__class__.__name__,
+            self.x_pos, self.z_pos,
+            self.x_width, self.z_depth,
+        )
+
+    def __eq__(self, other):
+        if not isinstance(other, BiomeGrid):
+            return NotImplemented
+
+        return (
+            self.x_pos == other.x_pos and
+            self.z_pos == other.z_pos and
+            np.array_equal(self.values, other.values)
+        )
+
+    @property
+    def area(self):
+        return self.x_pos, self.z_pos, self.x_width, self.z_depth
+
+    @property
+    def x_width(self):
+        return self.values.shape[0]
+
+    @property
+    def z_depth(self):
+        return self.values.shape[1]
+
+    def contains(self, x_pos, z_pos, x_width, z_depth):
+        ''' Checks if an area lies completely inside of this grid. '''
+        x_offset = x_pos - self.x_pos
+        z_offset = z_pos - self.z_pos
+
+        return x_offset >= 0 and z_offset >= 0 and \
+            x_offset + x_width <= self.x_width and \
+            z_offset + z_depth <= self.z_depth
+
+    def view(self, x_pos, z_pos, x_width, z_depth):
+        ''' Returns a sub-area of this grid sharing the same memory. '''
+        x_offset = x_pos - self.x_pos
+        z_offset = z_pos - self.z_pos
+
+        if not self.contains(x_pos, z_pos, x_width, z_depth):
+            raise ValueError('Area (%s, %s, %s, %s) is outside of %r' % (
+                x_pos, z_pos, x_width, z_depth, self,
+            ))
+
+        return BiomeGrid(x_pos, z_pos, self.values[
+            x_offset:x_offset + x_width,
+            z_offset:z_offset + z_depth,
+        ])
+
+    def neighborhood(self, x_pos, z_pos, x_width, z_depth):
+        '''
+        Returns a Neighborhood of an area's values shifted by one cell in every
+        direction, for grids generated with a 1 cell halo around the area.
+        '''
+        return Neighborhood(*(
+            self.view(x_pos + x, z_pos + z, x_width, z_depth).values
+            for z in (-1, 0, 1)
+            for x in (-1, 0, 1)
+        ))
+
+    def biome(self, x, z):
+        ''' Returns the BIOME_ID at the grid relative x/z coordinates. '''
+        return BIOME_ID(int(self.values[x, z]))
+
+    def biomes(self):
+        ''' Returns every BIOME_ID in the grid, row by row along the X axis. '''
+        return list(map(BIOME_ID, self.values.T.ravel().tolist()))
+
+    def colors(self):
+        ''' Returns packed RGB bytes of every biome color, row by row along the X axis. '''
+        return _COLOR_TABLE[self.values.T.view(np.uint8)].tobytes()
@@ -14,7 +14,10 @@
 
 ''' Island, Beach, and Ocean layer generation. '''
 
+import numpy as np
+
 from ._abc import BaseLayer
+from .grid import BiomeGrid
 from mcmaps.mc.constants import BIOME_ID
 
 __all__ = [
@@ -24,190 +27,135 @@ __all__ = [
 
 
 class IslandLayer(BaseLayer):
+    debug_name = 'Island'
 
-    def get_area(self, x_pos, z_pos, x_width, z_depth):
-        biome_values = [[BIOME_ID.OCEAN] * z_depth for _ in range(x_width)]
+    def get_child_areas(self, x_pos, z_pos, x_width, z_depth):
+        return ()
 
-        for z in range(z_depth):
-            for x in range(x_width):
-                self.init_chunk_seed(x_pos + x, z_pos + z)
+    def generate_area(self, biome_values):
+        x_pos, z_pos, x_width, z_depth = biome_values.area
+        chunk_seeds = self.init_chunk_seeds(x_pos, z_pos, x_width, z_depth)
 
-                if not self.nextInt(10):
-                    biome_values[x][z] = BIOME_ID.PLAINS
-                else:
-                    biome_values[x][z] = BIOME_ID.OCEAN
+        # Roughly 1 in 10 cells become land, the rest stay ocean.
+        biome_values.values[...] = BIOME_ID.OCEAN
+        biome_values.values[self.nextInts(chunk_seeds, 10) == 0] = BIOME_ID.PLAINS
+        self._store_chunk_seed(chunk_seeds)
 
         if (x_pos > -x_width and x_pos <= 0) and \
            (z_pos > -z_depth and z_pos <= 0):
-            biome_values[-x_pos][-z_pos] = BIOME_ID.PLAINS
+            biome_values.values[-x_pos, -z_pos] = BIOME_ID.PLAINS
 
-        if self._debug:
-            self._output_debug_data('Island', x_pos, z_pos, x_width, z_depth, biome_values)
 
-        return biome_values
+class AddIslandLayer(BaseLayer):
+    debug_name = 'AddIsland'
+
+    def generate_area(self, biome_values, child_values):
+        area = child_values.neighborhood(*biome_values.area)
+        chunk_seeds = self.init_chunk_seeds(*biome_values.area)
+
+        # [TL |    | TR]
+        # [---+----+---]
+        # [   | MC |   ]
+        # [---+----+---]
+        # [BL |    | BR]
+        center_value = area.mc
+        corner_values = (area.tl, area.tr, area.bl, area.br)
+        corner_oceans = [value == BIOME_ID.OCEAN for value in corner_values]
+
+        # Oceans next to land may grow, while land next to oceans may erode.
+        grow = (center_value == BIOME_ID.OCEAN) & ~np.logical_and.reduce(corner_oceans)
+        erode = (center_value != BIOME_ID.OCEAN) & np.logical_or.reduce(corner_oceans)
+
+        # Pick one of the land corners, drawing once per land corner with an increasing bound.
+        corner_probability = np.ones(center_value.shape, dtype=np.int64)
+        next_value = np.full(center_value.shape, BIOME_ID.PLAINS, dtype=BiomeGrid.dtype)
+
+        for value, ocean in zip(corner_values, corner_oceans):
+            land = grow & ~ocean
+            picked = self.nextInts(chunk_seeds, corner_probability, land) == 0
+            np.copyto(next_value, value, where=land & picked)
+            corner_probability += land
+
+        grow_land = self.nextInts(chunk_seeds, 3, grow) == 0
+        erode_land = self.nextInts(chunk_seeds, 5, erode) == 0
+        self._store_chunk_seed(chunk_seeds)
+
+        np.copyto(biome_values.values, np.select(
+            (
+                grow & grow_land,
+                grow & (next_value == BIOME_ID.PLAINS_ICE),
+                grow,
+                erode & erode_land & (center_value == BIOME_ID.PLAINS_ICE),
+                erode & erode_land,
+            ),
+            (
+                next_value,
+                BIOME_ID.OCEAN_FROZEN,
+                BIOME_ID.OCEAN,
+                BIOME_ID.OCEAN_FROZEN,
+                BIOME_ID.OCEAN,
+            ),
+            default=center_value,
+        ), casting='unsafe')
 
 
-class AddIslandLayer(BaseLayer):
+class AddMushroomIslandLayer(BaseLayer):
+    debug_name = 'AddMushroomIsland'
 
-    def get_area(self, x_pos, z_pos, x_width, z_depth):
-        biome_values = [[BIOME_ID.OCEAN] * z_depth for _ in range(x_width)]
-        child_values = self.child_layer.get_area(
-            x_pos - 1, z_pos - 1,
-            x_width + 2, z_depth + 2,
-        )
-
-        for z in range(z_depth):
-            for x in range(x_width):
-                self.init_chunk_seed(x_pos + x, z_pos + z)
-
-                # T=Top,  M=Middle, B=Bottom
-                # L=Left, C=Center, R=Right
-                #
-                # [TL |    | TR]
-                # [---+----+---]
-                # [   | MC |   ]
-                # [---+----+---]
-                # [BL |    | BR]
-                center_value = child_values[x + 1][z + 1]  # MC
-                corner_values = (
-                    child_values[x + 0][z + 0],  # TL
-                    child_values[x + 2][z + 0],  # TR
-                    child_values[x + 0][z + 2],  # BL
-                    child_values[x + 2][z + 2],  # BR
-                )
-
-                if center_value is BIOME_ID.OCEAN and any(
-                    value is not BIOME_ID.OCEAN for value in corner_values
-                ):
-                    corner_probability = 1
-                    next_value = BIOME_ID.PLAINS
-
-                    for value in corner_values:
-                        if value is not BIOME_ID.OCEAN:
-                            if not self.nextInt(corner_probability):
-                                next_value = value
-                            corner_probability += 1
-
-                    if not self.nextInt(3):
-                        biome_values[x][z] = next_value
-                    elif next_value is BIOME_ID.PLAINS_ICE:
-                        biome_values[x][z] = BIOME_ID.OCEAN_FROZEN
-                    else:
-                        biome_values[x][z] = BIOME_ID.OCEAN
-
-                elif center_value is not BIOME_ID.OCEAN and BIOME_ID.OCEAN in corner_values:
-                    if not self.nextInt(5):
-                        if center_value is BIOME_ID.PLAINS_ICE:
-                            biome_values[x][z] = BIOME_ID.OCEAN_FROZEN
-                        else:
-                            biome_values[x][z] = BIOME_ID.OCEAN
-                    else:
-                        biome_values[x][z] = center_value
-                else:
-                    biome_values[x][z] = center_value
-
-        if self._debug:
-            self._output_debug_data('AddIsland', x_pos, z_pos, x_width, z_depth, biome_values)
-
-        return biome_values
+    def generate_area(self, biome_values, child_values):
+        area = child_values.neighborhood(*biome_values.area)
+        chunk_seeds = self.init_chunk_seeds(*biome_values.area)
 
+        # [TL |    | TR]
+        # [---+----+---]
+        # [   | MC |   ]
+        # [---+----+---]
+        # [BL |    | BR]
+        center_value = area.mc
+        all_ocean = np.logical_and.reduce([
+            value == BIOME_ID.OCEAN
+            for value in (area.tl, area.tr, area.bl, area.br, center_value)
+        ])
 
-class AddMushroomIslandLayer(BaseLayer):
+        # Oceans surrounded by oceans have a 1 in 100 chance of becoming a mushroom island.
+        mushroom = all_ocean & (self.nextInts(chunk_seeds, 100, all_ocean) == 0)
+        self._store_chunk_seed(chunk_seeds)
 
-    def get_area(self, x_pos, z_pos, x_width, z_depth):
-        biome_values = [[BIOME_ID.OCEAN] * z_depth for _ in range(x_width)]
-        child_values = self.child_layer.get_area(
-            x_pos - 1, z_pos - 1,
-            x_width + 2, z_depth + 2,
-        )
-
-        for z in range(z_depth):
-            for x in range(x_width):
-                self.init_chunk_seed(x_pos + x, z_pos + z)
-
-                # T=Top,  M=Middle, B=Bottom
-                # L=Left, C=Center, R=Right
-                #
-                # [TL |    | TR]
-                # [---+----+---]
-                # [   | MC |   ]
-                # [---+----+---]
-                # [BL |    | BR]
-                center_value = child_values[x + 1][z + 1]  # MC
-                value_matrix = (
-                    child_values[x + 0][z + 0],  # TL
-                    child_values[x + 2][z + 0],  # TR
-                    child_values[x + 0][z + 2],  # BL
-                    child_values[x + 2][z + 2],  # BR
-                    center_value,
-                )
-
-                if all(value is BIOME_ID.OCEAN for value in value_matrix) and \
-                   not self.nextInt(100):
-                    biome_values[x][z] = BIOME_ID.MUSHROOM_ISLAND
-                else:
-                    biome_values[x][z] = center_value
-
-        if self._debug:
-            self._output_debug_data('AddMushroomIsland', x_pos, z_pos, x_width, z_depth, biome_values)
-
-        return biome_values
+        biome_values.values[...] = center_value
+        biome_values.values[mushroom] = BIOME_ID.MUSHROOM_ISLAND
 
 
 class ShoreLayer(BaseLayer):
-
-    def get_area(self, x_pos, z_pos, x_width, z_depth):
-        biome_values = [[BIOME_ID.OCEAN] * z_depth for _ in range(x_width)]
-        child_values = self.child_layer.get_area(
-            x_pos - 1, z_pos - 1,
-            x_width + 2, z_depth + 2,
-        )
-
-        for z in range(z_depth):
-            for x in range(x_width):
-                self.init_chunk_seed(x_pos + x, z_pos + z)
-
-                # T=Top,  M=Middle, B=Bottom
-                # L=Left, C=Center, R=Right
-                #
-                # [   | TC |   ]
-                # [---+----+---]
-                # [ML | MC | MR]
-                # [---+----+---]
-                # [   | BC |   ]
-                center_value = child_values[x + 1][z + 1]  # MC
-                edge_values = (
-                    child_values[x + 1][z + 0],  # TC
-                    child_values[x + 2][z + 1],  # ML
-                    child_values[x + 0][z + 1],  # MR
-                    child_values[x + 1][z + 2],  # BC
-                )
-
-                if center_value is BIOME_ID.MUSHROOM_ISLAND:
-                    if BIOME_ID.OCEAN not in edge_values:
-                        biome_values[x][z] = center_value
-                    else:
-                        biome_values[x][z] = BIOME_ID.MUSHROOM_BEACH
-
-                elif center_value not in (
-                    BIOME_ID.OCEAN, BIOME_ID.RIVER,
-                    BIOME_ID.SWAMP, BIOME_ID.HILLS_EXTREME,
-                ):
-                    if BIOME_ID.OCEAN not in edge_values:
-                        biome_values[x][z] = center_value
-                    else:
-                        biome_values[x][z] = BIOME_ID.BEACH
-
-                elif center_value is BIOME_ID.HILLS_EXTREME:
-                    if all(value is BIOME_ID.HILLS_EXTREME for value in edge_values):
-                        biome_values[x][z] = center_value
-                    else:
-                        biome_values[x][z] = BIOME_ID.HILLS_EXTREME_EDGE
-
-                else:
-                    biome_values[x][z] = center_value
-
-        if self._debug:
-            self._output_debug_data('Beach', x_pos, z_pos, x_width, z_depth, biome_values)
-
-        return biome_values
+    debug_name = 'Beach'
+
+    def generate_area(self, biome_values, child_values):
+        area = child_values.neighborhood(*biome_values.area)
+        self._store_last_chunk_seed(*biome_values.area)
+
+        # [   | TC |   ]
+        # [---+----+---]
+        # [ML | MC | MR]
+        # [---+----+---]
+        # [   | BC |   ]
+        center_value = area.mc
+        edge_values = (area.tc, area.ml, area.mr, area.bc)
+        ocean_edge = np.logical_or.reduce([value == BIOME_ID.OCEAN for value in edge_values])
+        hills_edge = np.logical_and.reduce([value == BIOME_ID.HILLS_EXTREME for value in edge_values])
+        keep_biomes = np.isin(center_value, (
+            BIOME_ID.OCEAN, BIOME_ID.RIVER,
+            BIOME_ID.SWAMP, BIOME_ID.HILLS_EXTREME,
+        ))
+
+        np.copyto(biome_values.values, np.select(
+            (
+                (center_value == BIOME_ID.MUSHROOM_ISLAND) & ocean_edge,
+                ~keep_biomes & ocean_edge,
+                (center_value == BIOME_ID.HILLS_EXTREME) & ~hills_edge,
+            ),
+            (
+                BIOME_ID.MUSHROOM_BEACH,
+                BIOME_ID.BEACH,
+                BIOME_ID.HILLS_EXTREME_EDGE,
+            ),
+            default=center_value,
+        ), casting='unsafe')
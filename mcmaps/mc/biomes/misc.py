@@ -17,7 +17,10 @@
 from copy import copy
 from ctypes import c_int64
 
+import numpy as np
+
 from ._abc import BaseLayer
+from .grid import BiomeGrid
 from mcmaps.mc.constants import BIOME_ID, WORLD_TYPE
 
 __all__ = [
@@ -27,35 +30,24 @@ __all__ = [
 
 
 class AddSnowLayer(BaseLayer):
+    debug_name = 'AddSnow'
 
-    def get_area(self, x_pos, z_pos, x_width, z_depth):
-        biome_values = [[BIOME_ID.OCEAN] * z_depth for _ in range(x_width)]
-        child_values = self.child_layer.get_area(
-            x_pos - 1, z_pos - 1,
-            x_width + 2, z_depth + 2,
-        )
-
-        for z in range(z_depth):
-            for x in range(x_width):
-                self.init_chunk_seed(x_pos + x, z_pos + z)
-                next_value = child_values[x + 1][z + 1]
-
-                if next_value is not BIOME_ID.OCEAN:
-                    if not self.nextInt(5):
-                        next_value = BIOME_ID.PLAINS_ICE
-                    else:
-                        next_value = BIOME_ID.PLAINS
+    def generate_area(self, biome_values, child_values):
+        area = child_values.neighborhood(*biome_values.area)
+        chunk_seeds = self.init_chunk_seeds(*biome_values.area)
 
-                biome_values[x][z] = next_value
-
-        if self._debug:
-            self._output_debug_data('AddSnow', x_pos, z_pos, x_width, z_depth, biome_values)
-
-        return biome_values
+        # Land has a 1 in 5 chance of becoming snowy, otherwise it's plains.
+        biome_values.values[...] = area.mc
+        land = biome_values.values != BIOME_ID.OCEAN
+        snow = self.nextInts(chunk_seeds, 5, land) == 0
+        biome_values.values[land] = BIOME_ID.PLAINS
+        biome_values.values[land & snow] = BIOME_ID.PLAINS_ICE
+        self._store_chunk_seed(chunk_seeds)
 
 
 class BiomeInitLayer(BaseLayer):
     __slots__ = ('allowed_biomes',)
+    debug_name = 'Biome'
 
     def __init__(self, layer_seed, child=None, world_type=WORLD_TYPE.DEFAULT, _debug=None):
         BaseLayer.__init__(self, layer_seed, child=child, _debug=_debug)
@@ -118,38 +110,28 @@ class BiomeInitLayer(BaseLayer):
         obj.allowed_biomes = copy(self.allowed_biomes)
         return obj
 
-    def get_area(self, x_pos, z_pos, x_width, z_depth):
-        biome_values = [[BIOME_ID.OCEAN] * z_depth for _ in range(x_width)]
-        child_values = self.child_layer.get_area(
-            x_pos, z_pos, x_width, z_depth,
-        )
-        preserve_biomes = (
-            BIOME_ID.OCEAN,
-            BIOME_ID.MUSHROOM_ISLAND,
+    def get_child_areas(self, x_pos, z_pos, x_width, z_depth):
+        return (
+            (self.child_layer, (x_pos, z_pos, x_width, z_depth)),
         )
 
-        for z in range(z_depth):
-            for x in range(x_width):
-                self.init_chunk_seed(x_pos + x, z_pos + z)
-                next_value = child_values[x][z]
+    def generate_area(self, biome_values, child_values):
+        child_values = child_values.values
+        chunk_seeds = self.init_chunk_seeds(*biome_values.area)
+        allowed_biomes = np.array(self.allowed_biomes, dtype=BiomeGrid.dtype)
 
-                if next_value in preserve_biomes:
-                    biome_values[x][z] = next_value
+        # Oceans and mushroom islands are preserved, every other cell picks an allowed biome.
+        preserve = (child_values == BIOME_ID.OCEAN) | (child_values == BIOME_ID.MUSHROOM_ISLAND)
+        next_values = allowed_biomes[self.nextInts(chunk_seeds, len(allowed_biomes), ~preserve)]
+        self._store_chunk_seed(chunk_seeds)
 
-                elif next_value is BIOME_ID.PLAINS:
-                    biome_index = self.nextInt(len(self.allowed_biomes))
-                    biome_values[x][z] = self.allowed_biomes[biome_index]
-
-                elif self.allowed_biomes[self.nextInt(len(self.allowed_biomes))] is BIOME_ID.TAIGA:
-                    biome_values[x][z] = BIOME_ID.TAIGA
-
-                else:
-                    biome_values[x][z] = BIOME_ID.PLAINS_ICE
-
-        if self._debug:
-            self._output_debug_data('Biome', x_pos, z_pos, x_width, z_depth, biome_values)
-
-        return biome_values
+        # Plains take the picked biome, while snowy land only keeps it if it's a taiga.
+        np.copyto(biome_values.values, np.where(
+            child_values == BIOME_ID.PLAINS,
+            next_values,
+            np.where(next_values == BIOME_ID.TAIGA, BIOME_ID.TAIGA, BIOME_ID.PLAINS_ICE),
+        ), casting='unsafe')
+        biome_values.values[preserve] = child_values[preserve]
 
 
 class HillsLayer(BaseLayer):
@@ -161,90 +143,54 @@ class HillsLayer(BaseLayer):
         BIOME_ID.PLAINS_ICE: BIOME_ID.HILLS_EXTREME_ICE,
         BIOME_ID.JUNGLE:     BIOME_ID.HILLS_JUNGLE,
     }
+    debug_name = 'Hills'
 
-    def get_area(self, x_pos, z_pos, x_width, z_depth):
-        biome_values = [[BIOME_ID.OCEAN] * z_depth for _ in range(x_width)]
-        child_values = self.child_layer.get_area(
-            x_pos - 1, z_pos - 1,
-            x_width + 2, z_depth + 2,
-        )
+    def generate_area(self, biome_values, child_values):
+        area = child_values.neighborhood(*biome_values.area)
+        chunk_seeds = self.init_chunk_seeds(*biome_values.area)
 
-        for z in range(z_depth):
-            for x in range(x_width):
-                self.init_chunk_seed(x_pos + x, z_pos + z)
-                next_value = child_values[x + 1][z + 1]
-
-                if not self.nextInt(3):
-                    hill_value = self.HILLS_MAP.get(next_value, next_value)
-
-                    if hill_value == next_value:
-                        biome_values[x][z] = next_value
-                    else:
-                        # T=Top,  M=Middle, B=Bottom
-                        # L=Left, C=Center, R=Right
-                        #
-                        # [   | TC |   ]
-                        # [---+----+---]
-                        # [ML |    | MR]
-                        # [---+----+---]
-                        # [   | BC |   ]
-                        edge_values = (
-                            child_values[x + 1][z + 0],  # TC
-                            child_values[x + 2][z + 1],  # ML
-                            child_values[x + 0][z + 1],  # MR
-                            child_values[x + 1][z + 2],  # BC
-                        )
-                        if all(value is next_value for value in edge_values):
-                            biome_values[x][z] = hill_value
-                        else:
-                            biome_values[x][z] = next_value
-                else:
-                    biome_values[x][z] = next_value
-
-        if self._debug:
-            self._output_debug_data('Hills', x_pos, z_pos, x_width, z_depth, biome_values)
-
-        return biome_values
+        # [   | TC |   ]
+        # [---+----+---]
+        # [ML | MC | MR]
+        # [---+----+---]
+        # [   | BC |   ]
+        next_value = area.mc
+        same_edges = np.logical_and.reduce([
+            value == next_value
+            for value in (area.tc, area.ml, area.mr, area.bc)
+        ])
 
+        # Biomes have a 1 in 3 chance of becoming hills, if they're surrounded by the same biome.
+        hills = (self.nextInts(chunk_seeds, 3) == 0) & same_edges
+        self._store_chunk_seed(chunk_seeds)
 
-class SmoothLayer(BaseLayer):
+        biome_values.values[...] = next_value
+        for biome, hill_biome in self.HILLS_MAP.items():
+            biome_values.values[hills & (next_value == biome)] = hill_biome
 
-    def get_area(self, x_pos, z_pos, x_width, z_depth):
-        biome_values = [[BIOME_ID.OCEAN] * z_depth for _ in range(x_width)]
-        child_values = self.child_layer.get_area(
-            x_pos - 1, z_pos - 1,
-            x_width + 2, z_depth + 2,
-        )
 
-        for z in range(z_depth):
-            for x in range(x_width):
-                # T=Top,  M=Middle, B=Bottom
-                # L=Left, C=Center, R=Right
-                #
-                # [   | TC |   ]
-                # [---+----+---]
-                # [ML | MC | MR]
-                # [---+----+---]
-                # [   | BC |   ]
-                value_ml = child_values[x + 0][z + 1]  # ML
-                value_mr = child_values[x + 2][z + 1]  # MR
-                value_tc = child_values[x + 1][z + 0]  # TC
-                value_bc = child_values[x + 1][z + 2]  # BC
-                value_mc = child_values[x + 1][z + 1]  # MC
-
-                if value_ml == value_mr and value_tc == value_bc:
-                    self.init_chunk_seed(x_pos + x, z_pos + z)
-                    value_mc = value_tc if self.nextInt(2) else value_ml
-
-                else:
-                    if value_ml == value_mr:
-                        value_mc = value_ml
-                    if value_tc == value_bc:
-                        value_mc = value_tc
-
-                biome_values[x][z] = value_mc
-
-        if self._debug:
-            self._output_debug_data('Smooth', x_pos, z_pos, x_width, z_depth, biome_values)
-
-        return biome_values
+class SmoothLayer(BaseLayer):
+    debug_name = 'Smooth'
+
+    def generate_area(self, biome_values, child_values):
+        area = child_values.neighborhood(*biome_values.area)
+
+        # [   | TC |   ]
+        # [---+----+---]
+        # [ML | MC | MR]
+        # [---+----+---]
+        # [   | BC |   ]
+        same_ml_mr = area.ml == area.mr
+        same_tc_bc = area.tc == area.bc
+
+        # Only cells with matching values on both axes randomly pick one of the axes.
+        both = same_ml_mr & same_tc_bc
+        chunk_seeds = self.init_chunk_seeds(*biome_values.area)
+        pick_tc = self.nextInts(chunk_seeds, 2, both) != 0
+        self._store_chunk_seed(chunk_seeds, both)
+
+        np.copyto(biome_values.values, np.select(
+            (both & pick_tc, same_ml_mr, same_tc_bc),
+            (area.tc, area.ml, area.tc),
+            default=area.mc,
+        ))
@@ -0,0 +1,247 @@
+# Copyright 2020 Lane Shaw
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+''' Layer stacks compiled into flat plans for generating areas of a fixed size. '''
+
+from threading import local
+
+import numpy as np
+
+from .cache import CachedLayer, SharedLayer
+from .grid import BiomeGrid
+
+__all__ = [
+    'LayerPlan',
+]
+
+
+def _union_area(area, other_area):
+    if area is None:
+        return other_area
+
+    x_pos, z_pos, x_width, z_depth = area
+    other_x_pos, other_z_pos, other_x_width, other_z_depth = other_area
+    min_x = min(x_pos, other_x_pos)
+    min_z = min(z_pos, other_z_pos)
+    max_x = max(x_pos + x_width, other_x_pos + other_x_width)
+    max_z = max(z_pos + z_depth, other_z_pos + other_z_depth)
+
+    return min_x, min_z, max_x - min_x, max_z - min_z
+
+
+class LayerPlan:
+    '''
+    A layer stack compiled into a flat list of layers, ordered so every layer comes
+    after all of its children, for generating areas of a given size.
+
+    Areas are generated without recursing through the stack, into buffers sized
+    for the plan's area size and reused by every later area generated on the same
+    thread. (Areas of other sizes are still generated, growing the buffers as needed.)
+    Layers used by several parents are only generated once per area, and layers
+    served from a TileCache are requested from their CachedLayer as usual.
+
+    Areas larger than tile_size are generated in fused tiles: the layers near the
+    top of the stack, generating at least half of a tile's resolution, are run
+    together one tile at a time, while the lower resolution layers below them are
+    generated once for the whole area. This keeps the large intermediate areas
+    small, at the cost of regenerating the edges shared by neighboring tiles.
+    '''
+    __slots__ = (
+        'layer', 'x_width', 'z_depth', 'tile_size',
+        'layers', 'child_indexes', 'fused', 'buffer_shapes', '_state',
+    )
+
+    def __init__(self, layer, x_width, z_depth, tile_size=256):
+        self.layer = layer
+        self.x_width = x_width
+        self.z_depth = z_depth
+        self.tile_size = tile_size
+        self.layers = []
+        self.child_indexes = []
+        self._state = local()
+        self._compile(layer, {})
+        self.fused = self._fuse_layers()
+
+        # Size every layer's buffer for an area of the plan's size.
+        areas = [None] * len(self.layers)
+        areas[-1] = (0, 0, x_width, z_depth)
+        self.plan_areas(areas, range(len(self.layers)))
+        self.buffer_shapes = [(x_width, z_depth) for _, _, x_width, z_depth in areas]
+
+    def __repr__(self):
+        return '%s(%r, x_width=%s, z_depth=%s, tile_size=%s)' % (
+            self.__class__.__name__,
+            self.layer, self.x_width, self.z_depth, self.tile_size,
+        )
+
+    def __reduce__(self):
+        # Buffers are local to a process, so plans are recompiled when unpickled.
+        return LayerPlan, (self.layer, self.x_width, self.z_depth, self.tile_size)
+
+    def _compile(self, layer, layer_indexes):
+        # Shared (and cached) layers are generated once per area, while any other layer
+        # used by several parents is generated for each of them just like get_area would.
+        shared = isinstance(layer, (SharedLayer, CachedLayer))
+        while isinstance(layer, SharedLayer):
+            layer = layer.child_layer
+
+        if shared and id(layer) in layer_indexes:
+            return layer_indexes[id(layer)]
+
+        if isinstance(layer, CachedLayer):
+            child_indexes = None
+        else:
+            child_indexes = [
+                self._compile(child, layer_indexes)
+                for child, _ in layer.get_child_areas(0, 0, self.x_width, self.z_depth)
+            ]
+
+        if shared:
+            layer_indexes[id(layer)] = len(self.layers)
+
+        self.layers.append(layer)
+        self.child_indexes.append(child_indexes)
+        return len(self.layers) - 1
+
+    def _fuse_layers(self):
+        '''
+        Flags the layers generated per tile: every layer generating at least half of
+        a tile's resolution whose parents are all generated per tile as well.
+        '''
+        fused = [False] * len(self.layers)
+        if self.tile_size is None or any(layer._debug for layer in self.layers):
+            return fused
+
+        areas = [None] * len(self.layers)
+        areas[-1] = (0, 0, self.tile_size, self.tile_size)
+        self.plan_areas(areas, range(len(self.layers)))
+
+        parents_fused = [True] * len(self.layers)
+        for index in reversed(range(len(self.layers))):
+            _, _, x_width, z_depth = areas[index]
+            fused[index] = parents_fused[index] and \
+                self.child_indexes[index] is not None and \
+                x_width * z_depth * 4 >= self.tile_size * self.tile_size
+
+            for child_index in self.child_indexes[index] or ():
+                parents_fused[child_index] &= fused[index]
+
+        return fused
+
+    def plan_areas(self, areas, indexes):
+        '''
+        Plans the areas of every given layer's children, from the areas already planned
+        in areas, returning the areas each layer requests from its children.
+        '''
+        child_areas = [None] * len(self.layers)
+
+        # Parents always come after their children, so plan from the top layer down.
+        for index in reversed(indexes):
+            if self.child_indexes[index] is None:
+                continue
+
+            child_areas[index] = [
+                child_area
+                for _, child_area in self.layers[index].get_child_areas(*areas[index])
+            ]
+
+            for child_index, child_area in zip(self.child_indexes[index], child_areas[index]):
+                areas[child_index] = _union_area(areas[child_index], child_area)
+
+        return child_areas
+
+    def _get_buffer(self, index, x_width, z_depth):
+        buffers = getattr(self._state, 'buffers', None)
+        if buffers is None:
+            buffers = self._state.buffers = [
+                np.empty(shape, dtype=BiomeGrid.dtype)
+                for shape in self.buffer_shapes
+            ]
+
+        buffer = buffers[index]
+        if buffer.shape[0] < x_width or buffer.shape[1] < z_depth:
+            buffer = buffers[index] = np.empty(
+                (max(x_width, buffer.shape[0]), max(z_depth, buffer.shape[1])),
+                dtype=BiomeGrid.dtype,
+            )
+
+        return buffer[:x_width, :z_depth]
+
+    def _generate_areas(self, indexes, areas, child_areas, biome_grids):
+        for index in indexes:
+            layer = self.layers[index]
+            x_pos, z_pos, x_width, z_depth = areas[index]
+
+            if self.child_indexes[index] is None:
+                biome_grids[index] = layer.get_area(x_pos, z_pos, x_width, z_depth)
+                continue
+
+            biome_values = BiomeGrid(x_pos, z_pos, self._get_buffer(index, x_width, z_depth))
+            layer.generate_area(biome_values, *(
+                biome_grids[child_index].view(*child_area)
+                for child_index, child_area in zip(self.child_indexes[index], child_areas[index])
+            ))
+            biome_grids[index] = biome_values
+
+            if layer._debug:
+                layer._output_debug_data(layer.debug_name, x_pos, z_pos, x_width, z_depth, biome_values)
+
+    def get_area(self, x_pos, z_pos, x_width, z_depth):
+        tile_size = self.tile_size
+        indexes = range(len(self.layers))
+
+        if tile_size is None or not self.fused[-1] or (x_width <= tile_size and z_depth <= tile_size):
+            areas = [None] * len(self.layers)
+            areas[-1] = (x_pos, z_pos, x_width, z_depth)
+            biome_grids = [None] * len(self.layers)
+            self._generate_areas(indexes, areas, self.plan_areas(areas, indexes), biome_grids)
+
+            # The top layer's buffer is reused by the next area, so return a copy of it.
+            biome_values = biome_grids[-1]
+            return BiomeGrid(biome_values.x_pos, biome_values.z_pos, biome_values.values.copy())
+
+        fused_indexes = [index for index in indexes if self.fused[index]]
+        unfused_indexes = [index for index in indexes if not self.fused[index]]
+
+        # Plan each tile's fused layers, collecting the areas they request from the unfused layers.
+        tiles = []
+        unfused_areas = [None] * len(self.layers)
+        for tile_x in range(x_pos, x_pos + x_width, tile_size):
+            for tile_z in range(z_pos, z_pos + z_depth, tile_size):
+                tile_areas = [None] * len(self.layers)
+                tile_areas[-1] = (
+                    tile_x, tile_z,
+                    min(tile_size, x_pos + x_width - tile_x),
+                    min(tile_size, z_pos + z_depth - tile_z),
+                )
+                tiles.append((tile_areas, self.plan_areas(tile_areas, fused_indexes)))
+
+                for index in unfused_indexes:
+                    if tile_areas[index] is not None:
+                        unfused_areas[index] = _union_area(unfused_areas[index], tile_areas[index])
+
+        # Generate the unfused layers once, covering every tile.
+        biome_grids = [None] * len(self.layers)
+        self._generate_areas(
+            unfused_indexes, unfused_areas,
+            self.plan_areas(unfused_areas, unfused_indexes), biome_grids,
+        )
+
+        # Then run the fused layers tile by tile, on top of the unfused layers' areas.
+        biome_values = BiomeGrid.empty(x_pos, z_pos, x_width, z_depth)
+        for tile_areas, tile_child_areas in tiles:
+            self._generate_areas(fused_indexes, tile_areas, tile_child_areas, biome_grids)
+            biome_values.view(*tile_areas[-1]).values[...] = biome_grids[-1].values
+
+        return biome_values
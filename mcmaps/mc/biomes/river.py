@@ -17,6 +17,8 @@
 from copy import copy
 from ctypes import c_int64
 
+import numpy as np
+
 from ._abc import BaseLayer
 from mcmaps.mc.constants import BIOME_ID
 
@@ -27,102 +29,70 @@ __all__ = [
 
 
 class RiverInitLayer(BaseLayer):
+    debug_name = 'RiverInit'
 
-    def get_area(self, x_pos, z_pos, x_width, z_depth):
-        biome_values = [[BIOME_ID.OCEAN] * z_depth for _ in range(x_width)]
-        child_values = self.child_layer.get_area(
-            x_pos, z_pos, x_width, z_depth,
+    def get_child_areas(self, x_pos, z_pos, x_width, z_depth):
+        return (
+            (self.child_layer, (x_pos, z_pos, x_width, z_depth)),
         )
 
-        for z in range(z_depth):
-            for x in range(x_width):
-                self.init_chunk_seed(x_pos + x, z_pos + z)
-
-                if child_values[x][z] != BIOME_ID.OCEAN:
-                    # Randomly either BIOME_ID.DESERT or BIOME_ID.HILLS_EXTREME.
-                    biome_values[x][z] = BIOME_ID(BIOME_ID.DESERT + self.nextInt(2))
-                else:
-                    biome_values[x][z] = BIOME_ID.OCEAN
-
-        if self._debug:
-            self._output_debug_data('RiverInit', x_pos, z_pos, x_width, z_depth, biome_values)
+    def generate_area(self, biome_values, child_values):
+        chunk_seeds = self.init_chunk_seeds(*biome_values.area)
 
-        return biome_values
+        # Land is randomly either BIOME_ID.DESERT or BIOME_ID.HILLS_EXTREME.
+        land = child_values.values != BIOME_ID.OCEAN
+        next_values = BIOME_ID.DESERT + self.nextInts(chunk_seeds, 2, land)
+        biome_values.values[...] = BIOME_ID.OCEAN
+        biome_values.values[land] = next_values[land]
+        self._store_chunk_seed(chunk_seeds)
 
 
 class RiverLayer(BaseLayer):
+    debug_name = 'River'
 
-    def get_area(self, x_pos, z_pos, x_width, z_depth):
-        biome_values = [[BIOME_ID.OCEAN] * z_depth for _ in range(x_width)]
-        child_values = self.child_layer.get_area(
-            x_pos - 1, z_pos - 1,
-            x_width + 2, z_depth + 2,
-        )
+    def generate_area(self, biome_values, child_values):
+        area = child_values.neighborhood(*biome_values.area)
 
-        for z in range(z_depth):
-            for x in range(x_width):
-
-                # T=Top,  M=Middle, B=Bottom
-                # L=Left, C=Center, R=Right
-                #
-                # [   | TC |   ]
-                # [---+----+---]
-                # [ML | MC | MR]
-                # [---+----+---]
-                # [   | BC |   ]
-                center_value = child_values[x + 1][z + 1]  # MC
-                value_matrix = (
-                    child_values[x + 1][z + 0],  # TC
-                    child_values[x + 2][z + 1],  # ML
-                    child_values[x + 0][z + 1],  # MR
-                    child_values[x + 1][z + 2],  # BC
-                    center_value,
-                )
-
-                if BIOME_ID.OCEAN not in value_matrix and\
-                   all(value == center_value for value in value_matrix):
-                    biome_values[x][z] = BIOME_ID.NONE
-                else:
-                    biome_values[x][z] = BIOME_ID.RIVER
-
-        if self._debug:
-            self._output_debug_data('River', x_pos, z_pos, x_width, z_depth, biome_values)
-
-        return biome_values
+        # [   | TC |   ]
+        # [---+----+---]
+        # [ML | MC | MR]
+        # [---+----+---]
+        # [   | BC |   ]
+        center_value = area.mc
+        same_edges = np.logical_and.reduce([
+            value == center_value
+            for value in (area.tc, area.ml, area.mr, area.bc)
+        ])
 
+        # Rivers form along every edge between different land values and oceans.
+        biome_values.values[...] = BIOME_ID.RIVER
+        biome_values.values[(center_value != BIOME_ID.OCEAN) & same_edges] = BIOME_ID.NONE
 
-class SwampRiverLayer(BaseLayer):
 
-    def get_area(self, x_pos, z_pos, x_width, z_depth):
-        biome_values = [[BIOME_ID.OCEAN] * z_depth for _ in range(x_width)]
-        child_values = self.child_layer.get_area(
-            x_pos - 1, z_pos - 1,
-            x_width + 2, z_depth + 2,
-        )
-        jungle_biomes = (BIOME_ID.JUNGLE, BIOME_ID.HILLS_JUNGLE)
+class SwampRiverLayer(BaseLayer):
+    debug_name = 'SwampRiver'
 
-        for z in range(z_depth):
-            for x in range(x_width):
-                self.init_chunk_seed(x_pos + x, z_pos + z)
+    def generate_area(self, biome_values, child_values):
+        area = child_values.neighborhood(*biome_values.area)
+        chunk_seeds = self.init_chunk_seeds(*biome_values.area)
 
-                # Grab the diagonal biome value to us, up 1 X and over 1 Z.
-                adj_value = child_values[x + 1][z + 1]
-                if (
-                    (adj_value is not BIOME_ID.SWAMP or self.nextInt(6)) and
-                    (adj_value not in jungle_biomes or self.nextInt(8))
-                ):
-                    biome_values[x][z] = adj_value
-                else:
-                    biome_values[x][z] = BIOME_ID.RIVER
+        # Grab the diagonal biome values to us, up 1 X and over 1 Z.
+        adj_values = area.mc
+        swamp = adj_values == BIOME_ID.SWAMP
+        jungle = (adj_values == BIOME_ID.JUNGLE) | (adj_values == BIOME_ID.HILLS_JUNGLE)
 
-        if self._debug:
-            self._output_debug_data('SwampRiver', x_pos, z_pos, x_width, z_depth, biome_values)
+        # Swamps have a 1 in 6 chance and jungles a 1 in 8 chance of becoming rivers.
+        river = swamp & (self.nextInts(chunk_seeds, 6, swamp) == 0)
+        river |= jungle & (self.nextInts(chunk_seeds, 8, jungle) == 0)
+        self._store_chunk_seed(chunk_seeds)
 
-        return biome_values
+        biome_values.values[...] = adj_values
+        biome_values.values[river] = BIOME_ID.RIVER
 
 
 class RiverMixerLayer(BaseLayer):
     __slots__ = ('child_river_layer', )
+    debug_name = 'RiverMixer'
 
     def __init__(self, layer_seed, child=None, child_river=None, _debug=None):
         BaseLayer.__init__(self, layer_seed, child=child, _debug=_debug)
@@ -182,38 +152,34 @@ class RiverMixerLayer(BaseLayer):
         self.world_seed.value *= self.world_seed.value * 6364136223846793005 + 1442695040888963407
         self.world_seed.value += layer_seed
 
-    def get_area(self, x_pos, z_pos, x_width, z_depth):
-        biome_values = [[BIOME_ID.OCEAN] * z_depth for _ in range(x_width)]
-        child_biome_values = self.child_layer.get_area(
-            x_pos, z_pos, x_width, z_depth,
-        )
-        child_river_values = self.child_river_layer.get_area(
-            x_pos, z_pos, x_width, z_depth,
+    def get_child_areas(self, x_pos, z_pos, x_width, z_depth):
+        return (
+            (self.child_layer, (x_pos, z_pos, x_width, z_depth)),
+            (self.child_river_layer, (x_pos, z_pos, x_width, z_depth)),
         )
+
+    def generate_area(self, biome_values, child_biome_values, child_river_values):
+        child_biome_values = child_biome_values.values
+        child_river_values = child_river_values.values
         mushroom_biomes = (
             BIOME_ID.MUSHROOM_ISLAND,
             BIOME_ID.MUSHROOM_BEACH,
         )
 
-        for z in range(z_depth):
-            for x in range(x_width):
-                biome_value = child_biome_values[x][z]
-
-                if biome_value is BIOME_ID.OCEAN:
-                    biome_values[x][z] = biome_value
-
-                elif child_river_values[x][z] >= BIOME_ID.OCEAN:
-                    if biome_value is BIOME_ID.PLAINS_ICE:
-                        biome_values[x][z] = BIOME_ID.RIVER_FROZEN
-                    elif biome_value not in mushroom_biomes:
-                        biome_values[x][z] = child_river_values[x][z]
-                    else:
-                        biome_values[x][z] = BIOME_ID.MUSHROOM_BEACH
-
-                else:
-                    biome_values[x][z] = biome_value
-
-        if self._debug:
-            self._output_debug_data('RiverMixer', x_pos, z_pos, x_width, z_depth, biome_values)
-
-        return biome_values
+        # Rivers are mixed into every land biome, freezing in snowy biomes and becoming beaches on mushroom islands.
+        land = child_biome_values != BIOME_ID.OCEAN
+        river = land & (child_river_values >= BIOME_ID.OCEAN)
+
+        np.copyto(biome_values.values, np.select(
+            (
+                river & (child_biome_values == BIOME_ID.PLAINS_ICE),
+                river & np.isin(child_biome_values, mushroom_biomes),
+                river,
+            ),
+            (
+                BIOME_ID.RIVER_FROZEN,
+                BIOME_ID.MUSHROOM_BEACH,
+                child_river_values,
+            ),
+            default=child_biome_values,
+        ), casting='unsafe')
@@ -0,0 +1,103 @@
+# Copyright 2020 Lane Shaw
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+''' Flat snapshots of initialized layer seeds, memory mapped and shareable between processes. '''
+
+import os
+import struct
+import tempfile
+from collections import namedtuple
+
+import numpy as np
+
+from .cache import _LayerWrapper
+
+__all__ = [
+    'Snapshot', 'read_snapshot', 'walk_layers', 'write_snapshot',
+]
+
+# Magic, MC version, world type, world seed, and layer count, followed by every layer's world seed.
+_HEADER = struct.Struct('<8s16sBqI')
+_MAGIC = b'MCMAPSL1'
+
+Snapshot = namedtuple('Snapshot', ('version', 'world_type', 'world_seed', 'world_seeds'))
+
+
+def walk_layers(*layers):
+    '''
+    Yields every distinct layer below (and including) the given layers once, children
+    before their parents, looking through any wrapper layers like SharedLayer.
+    '''
+    visited = set()
+
+    def walk(layer):
+        while isinstance(layer, _LayerWrapper):
+            layer = layer.child_layer
+
+        if layer is None or id(layer) in visited:
+            return
+
+        visited.add(id(layer))
+        yield from walk(layer.child_layer)
+        yield from walk(getattr(layer, 'child_river_layer', None))
+        yield layer
+
+    for layer in layers:
+        yield from walk(layer)
+
+
+def write_snapshot(path, snapshot):
+    world_seeds = np.asarray(snapshot.world_seeds, dtype='<i8')
+
+    # Snapshots are replaced whole, so other processes never map a partially written one.
+    # (Each writer, even another thread of the same process, writes its own temporary file.)
+    fd, temp_path = tempfile.mkstemp(
+        prefix=os.path.basename(path) + '.', suffix='.tmp',
+        dir=os.path.dirname(path) or '.',
+    )
+    try:
+        with os.fdopen(fd, 'wb') as snapshot_file:
+            snapshot_file.write(_HEADER.pack(
+                _MAGIC,
+                snapshot.version.encode('us-ascii'),
+                snapshot.world_type,
+                snapshot.world_seed,
+                len(world_seeds),
+            ))
+            snapshot_file.write(world_seeds.tobytes())
+
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def read_snapshot(path):
+    '''
+    Reads a snapshot's header, memory mapping its world seeds read-only, so every
+    process reading the same snapshot shares a single copy of them.
+    '''
+    with open(path, 'rb') as snapshot_file:
+        header = snapshot_file.read(_HEADER.size)
+
+    if len(header) != _HEADER.size or not header.startswith(_MAGIC):
+        raise ValueError('Invalid layer snapshot: ' + str(path))
+
+    _, version, world_type, world_seed, layer_count = _HEADER.unpack(header)
+    world_seeds = np.memmap(path, dtype='<i8', mode='r', offset=_HEADER.size, shape=(layer_count,))
+
+    return Snapshot(version.rstrip(b'\0').decode('us-ascii'), world_type, world_seed, world_seeds)
@@ -16,8 +16,9 @@
 
 from abc import abstractmethod
 
+import numpy as np
+
 from ._abc import BaseLayer
-from mcmaps.mc.constants import BIOME_ID
 
 __all__ = [
     'FuzzyZoomLayer', 'VoronoiZoomLayer', 'ZoomLayer',
@@ -26,84 +27,77 @@ __all__ = [
 
 class _BaseZoomLayer(BaseLayer):
 
-    def get_area(self, x_pos, z_pos, x_width, z_depth):
-        child_x_pos = x_pos >> 1
-        child_z_pos = z_pos >> 1
-        child_x_width = (x_width >> 1) + 3
-        child_z_depth = (z_depth >> 1) + 3
-        zoom_z_depth = child_z_depth << 1
-
-        biome_values = [[BIOME_ID.OCEAN] * z_depth for _ in range(x_width)]
-        zoom_values = [[BIOME_ID.OCEAN] * zoom_z_depth for _ in range(child_x_width << 1)]
-        child_values = self.child_layer.get_area(
-            child_x_pos, child_z_pos, child_x_width, child_z_depth,
+    def get_child_areas(self, x_pos, z_pos, x_width, z_depth):
+        return (
+            (self.child_layer, (x_pos >> 1, z_pos >> 1, (x_width >> 1) + 3, (z_depth >> 1) + 3)),
         )
 
-        for z in range(child_z_depth - 1):
-            # T=Top,  B=Bottom
-            # L=Left, R=Right
-            #
-            # [TL | TR]
-            # [---+---]
-            # [BL | BR]
-
-            # Take each row from the child and place it every second row in the zoomed values.
-            z2 = z << 1
-
-            # Values are accumulated left to right along the X axis.
-            top_accl = child_values[0][z + 0]  # Child TL
-            bot_accl = child_values[0][z + 1]  # Child BL
-
-            for x in range(child_x_width - 1):
-                self.init_chunk_seed(child_x_pos + x << 1, child_z_pos + z << 1)
-
-                top_next = child_values[x + 1][z + 0]  # Child TR
-                bot_next = child_values[x + 1][z + 1]  # Child BR
-
-                # Take each column from the child and place it every second column in the zoomed values.
-                x2 = x << 1
+    def generate_area(self, biome_values, child_values):
+        x_pos, z_pos, x_width, z_depth = biome_values.area
+        child_x_pos, child_z_pos, child_x_width, child_z_depth = child_values.area
+        child_values = child_values.values
 
-                zoom_values[x2 + 0][z2 + 0] = top_accl                         # Zoom TL
-                zoom_values[x2 + 0][z2 + 1] = self.choose(top_accl, bot_accl)  # Zoom BL
-                zoom_values[x2 + 1][z2 + 0] = self.choose(top_accl, top_next)  # Zoom TR
-                zoom_values[x2 + 1][z2 + 1] = self.diagonal_func(              # Zoom BR
-                    top_accl, top_next, bot_accl, bot_next,
-                )
-
-                top_accl = top_next
-                bot_accl = bot_next
-
-        # Extract the inner square, a subset of the zoomed values.
-        x_offset = x_pos & 1
-        z_offset = z_pos & 1
-        for z in range(z_depth):
-            for x in range(x_width):
-                biome_values[x][z] = zoom_values[x + x_offset][z + z_offset]
-
-        return biome_values
+        # Each child cell is the top left corner of a 2x2 block, seeded by its zoomed coordinates.
+        chunk_seeds = self.init_chunk_seeds(
+            child_x_pos, child_z_pos,
+            child_x_width - 1, child_z_depth - 1,
+            shift=1,
+        )
 
-    def choose(self, *args):
-        return args[self.nextInt(len(args))]
+        # T=Top,  B=Bottom
+        # L=Left, R=Right
+        #
+        # [TL | TR]
+        # [---+---]
+        # [BL | BR]
+        value_tl = child_values[:-1, :-1]  # Child TL
+        value_tr = child_values[1:, :-1]   # Child TR
+        value_bl = child_values[:-1, 1:]   # Child BL
+        value_br = child_values[1:, 1:]    # Child BR
+
+        zoom_bl = self.choose(chunk_seeds, value_tl, value_bl)
+        zoom_tr = self.choose(chunk_seeds, value_tl, value_tr)
+        zoom_br = self.diagonal_func(chunk_seeds, value_tl, value_tr, value_bl, value_br)
+        self._store_chunk_seed(chunk_seeds)
+
+        # Place each zoomed block's cells every second row and column of the inner square,
+        # skipping the parts of the zoomed values outside of it.
+        x_offset = x_pos - (child_x_pos << 1)
+        z_offset = z_pos - (child_z_pos << 1)
+
+        for zoom_x, zoom_z, zoom_value in (
+            (0, 0, value_tl),  # Zoom TL
+            (0, 1, zoom_bl),   # Zoom BL
+            (1, 0, zoom_tr),   # Zoom TR
+            (1, 1, zoom_br),   # Zoom BR
+        ):
+            x_start = zoom_x - x_offset & 1
+            z_start = zoom_z - z_offset & 1
+            child_x_start = x_offset + x_start >> 1
+            child_z_start = z_offset + z_start >> 1
+
+            biome_values.values[x_start::2, z_start::2] = zoom_value[
+                child_x_start:child_x_start + (x_width - x_start + 1 >> 1),
+                child_z_start:child_z_start + (z_depth - z_start + 1 >> 1),
+            ]
+
+    def choose(self, chunk_seeds, *values, mask=None):
+        ''' Randomly picks one of the value arrays per cell, only drawing for cells in mask if given. '''
+        return np.choose(self.nextInts(chunk_seeds, len(values), mask), values)
 
     @abstractmethod
-    def diagonal_func(self, value_tl, value_tr, value_bl, value_br):
+    def diagonal_func(self, chunk_seeds, value_tl, value_tr, value_bl, value_br):
         ''' Calculates the result of using all 4 corner values for BR's values. '''
 
 
 class FuzzyZoomLayer(_BaseZoomLayer):
+    debug_name = 'FuzzyZoom'
 
     diagonal_func = _BaseZoomLayer.choose
 
-    def get_area(self, x_pos, z_pos, x_width, z_depth):
-        biome_values = super().get_area(x_pos, z_pos, x_width, z_depth)
-
-        if self._debug:
-            self._output_debug_data('FuzzyZoom', x_pos, z_pos, x_width, z_depth, biome_values)
-
-        return biome_values
-
 
 class ZoomLayer(_BaseZoomLayer):
+    debug_name = 'Zoom'
 
     @classmethod
     def zoom(cls, layer_seed, child, zoom_count, _debug=None):
@@ -114,145 +108,112 @@ class ZoomLayer(_BaseZoomLayer):
 
         return layer
 
-    def get_area(self, x_pos, z_pos, x_width, z_depth):
-        biome_values = super().get_area(x_pos, z_pos, x_width, z_depth)
-
-        if self._debug:
-            self._output_debug_data('Zoom', x_pos, z_pos, x_width, z_depth, biome_values)
-
-        return biome_values
-
-    def diagonal_func(self, value_tl, value_tr, value_bl, value_br):
-        if value_tr == value_bl and value_bl == value_br:
-            return value_tr
-        if value_tl == value_tr and value_tl == value_bl:
-            return value_tl
-        if value_tl == value_tr and value_tl == value_br:
-            return value_tl
-        if value_tl == value_bl and value_tl == value_br:
-            return value_tl
-        if value_tl == value_tr and value_bl != value_br:
-            return value_tl
-        if value_tl == value_bl and value_tr != value_br:
-            return value_tl
-        if value_tl == value_br and value_tr != value_bl:
-            return value_tl
-        if value_tr == value_tl and value_bl != value_br:
-            return value_tr
-        if value_tr == value_bl and value_tl != value_br:
-            return value_tr
-        if value_tr == value_br and value_tl != value_bl:
-            return value_tr
-        if value_bl == value_tl and value_tr != value_br:
-            return value_bl
-        if value_bl == value_tr and value_tl != value_br:
-            return value_bl
-        if value_bl == value_br and value_tl != value_tr:
-            return value_bl
-        if value_br == value_tl and value_tr != value_bl:
-            return value_bl
-        if value_br == value_tr and value_tl != value_bl:
-            return value_bl
-        if value_br == value_bl and value_tl != value_tr:
-            return value_bl
-
-        return self.choose(value_tl, value_tr, value_bl, value_br)
+    def diagonal_func(self, chunk_seeds, value_tl, value_tr, value_bl, value_br):
+        tl_tr = value_tl == value_tr
+        tl_bl = value_tl == value_bl
+        tl_br = value_tl == value_br
+        tr_bl = value_tr == value_bl
+        tr_br = value_tr == value_br
+        bl_br = value_bl == value_br
+
+        # Pick the most common corner value, checked in the same order as MC's selectModeOrRandom.
+        # (Its remaining checks repeat earlier conditions in a different order and can never match.)
+        conditions, choices = zip(
+            (tr_bl & bl_br,  value_tr),
+            (tl_tr & tl_bl,  value_tl),
+            (tl_tr & tl_br,  value_tl),
+            (tl_bl & tl_br,  value_tl),
+            (tl_tr & ~bl_br, value_tl),
+            (tl_bl & ~tr_br, value_tl),
+            (tl_br & ~tr_bl, value_tl),
+            (tr_bl & ~tl_br, value_tr),
+            (tr_br & ~tl_bl, value_tr),
+            (bl_br & ~tl_tr, value_bl),
+        )
+
+        # Otherwise every corner is different, so choose one at random.
+        random_values = self.choose(
+            chunk_seeds, value_tl, value_tr, value_bl, value_br,
+            mask=~np.logical_or.reduce(conditions),
+        )
+
+        return np.select(conditions, choices, default=random_values)
 
 
 class VoronoiZoomLayer(BaseLayer):
+    debug_name = 'VoronoiZoom'
 
-    def get_area(self, x_pos, z_pos, x_width, z_depth):
-        x_pos -= 2
-        z_pos -= 2
-        child_x_pos = x_pos >> 2
-        child_z_pos = z_pos >> 2
-        child_x_width = (x_width >> 2) + 3
-        child_z_depth = (z_depth >> 2) + 3
-        zoom_z_depth = child_z_depth << 2
-
-        biome_values = [[BIOME_ID.OCEAN] * z_depth for _ in range(x_width)]
-        zoom_values = [[BIOME_ID.OCEAN] * zoom_z_depth for _ in range(child_x_width << 2)]
-        child_values = self.child_layer.get_area(
-            child_x_pos, child_z_pos, child_x_width, child_z_depth,
+    def get_child_areas(self, x_pos, z_pos, x_width, z_depth):
+        return (
+            (self.child_layer, (x_pos - 2 >> 2, z_pos - 2 >> 2, (x_width >> 2) + 3, (z_depth >> 2) + 3)),
         )
 
-        for z in range(child_z_depth - 1):
-            # T=Top,  B=Bottom
-            # L=Left, R=Right
-            #
-            # [TL | TR]
-            # [---+---]
-            # [BL | BR]
-
-            # Take each pixel in a row from the child and stretch it across a 4x4 cell.
-            z2 = z << 2
-
-            # Values are accumulated left to right along the X axis.
-            top_accl = child_values[0][z + 0]  # Child TL
-            bot_accl = child_values[0][z + 1]  # Child BL
-
-            for x in range(child_x_width - 1):
-                # Random TL Corner X/Z
-                self.init_chunk_seed(child_x_pos + x + 0 << 2, child_z_pos + z + 0 << 2)
-                corner_tl_x = self.nextDouble(1024) * 3.6
-                corner_tl_z = self.nextDouble(1024) * 3.6
-
-                # Random TR Corner X/Z
-                self.init_chunk_seed(child_x_pos + x + 1 << 2, child_z_pos + z + 0 << 2)
-                corner_tr_x = self.nextDouble(1024) * 3.6 + 4.0
-                corner_tr_z = self.nextDouble(1024) * 3.6
-
-                # Random BL Corner X/Z
-                self.init_chunk_seed(child_x_pos + x + 0 << 2, child_z_pos + z + 1 << 2)
-                corner_bl_x = self.nextDouble(1024) * 3.6
-                corner_bl_z = self.nextDouble(1024) * 3.6 + 4.0
-
-                # Random BR Corner X/Z
-                self.init_chunk_seed(child_x_pos + x + 1 << 2, child_z_pos + z + 1 << 2)
-                corner_br_x = self.nextDouble(1024) * 3.6 + 4.0
-                corner_br_z = self.nextDouble(1024) * 3.6 + 4.0
-
-                top_next = child_values[x + 1][z + 0]  # Child TR
-                bot_next = child_values[x + 1][z + 1]  # Child BR
-
-                # Take each pixel in a column from the child and stretch it across a 4x4 cell.
-                x2 = x << 2
-
-                for cell_z in range(4):
-                    for cell_x in range(4):
-                        # Calculate pseudo-distances from each generated corner.
-                        dist_tl = (cell_z-corner_tl_z) * (cell_z-corner_tl_z) + (cell_x-corner_tl_x) * (cell_x-corner_tl_x)
-                        dist_tr = (cell_z-corner_tr_z) * (cell_z-corner_tr_z) + (cell_x-corner_tr_x) * (cell_x-corner_tr_x)
-                        dist_bl = (cell_z-corner_bl_z) * (cell_z-corner_bl_z) + (cell_x-corner_bl_x) * (cell_x-corner_bl_x)
-                        dist_br = (cell_z-corner_br_z) * (cell_z-corner_br_z) + (cell_x-corner_br_x) * (cell_x-corner_br_x)
-
-                        if all(dist_tl < dist for dist in (dist_tr, dist_bl, dist_br)):
-                            # Use the TL corner if it's closest.
-                            zoom_values[x2 + cell_x][z2 + cell_z] = top_accl
-                        elif all(dist_tr < dist for dist in (dist_tl, dist_bl, dist_br)):
-                            # Use the TR corner if it's closest.
-                            zoom_values[x2 + cell_x][z2 + cell_z] = top_next
-                        elif all(dist_bl < dist for dist in (dist_tl, dist_tr, dist_br)):
-                            # Use the BL corner if it's closest.
-                            zoom_values[x2 + cell_x][z2 + cell_z] = bot_accl
-                        else:
-                            # Use the BR corner if all others fail.
-                            zoom_values[x2 + cell_x][z2 + cell_z] = bot_next
-
-                top_accl = top_next
-                bot_accl = bot_next
-
-        # Extract the inner square, a subset of the zoomed values.
-        x_offset = x_pos & 3
-        z_offset = z_pos & 3
-        for z in range(z_depth):
-            for x in range(x_width):
-                biome_values[x][z] = zoom_values[x + x_offset][z + z_offset]
-
-        if self._debug:
-            self._output_debug_data('VoronoiZoom', x_pos, z_pos, x_width, z_depth, biome_values)
-
-        return biome_values
+    def generate_area(self, biome_values, child_values):
+        x_pos, z_pos, x_width, z_depth = biome_values.area
+        child_x_pos, child_z_pos, child_x_width, child_z_depth = child_values.area
+        child_values = child_values.values
+
+        # Randomly jitter every child cell's corner once, neighboring 4x4 cells share them.
+        chunk_seeds = self.init_chunk_seeds(
+            child_x_pos, child_z_pos,
+            child_x_width, child_z_depth,
+            shift=2,
+        )
+        jitter_x = self.nextDoubles(chunk_seeds, 1024) * 3.6
+        jitter_z = self.nextDoubles(chunk_seeds, 1024) * 3.6
+        self._store_chunk_seed(chunk_seeds)
+
+        # T=Top,  B=Bottom
+        # L=Left, R=Right
+        #
+        # [TL | TR]
+        # [---+---]
+        # [BL | BR]
+        #
+        # Arrays are indexed by [child x, cell x, child z, cell z] to stretch each child cell across a 4x4 cell.
+        corners = (
+            (child_values[:-1, :-1], jitter_x[:-1, :-1],       jitter_z[:-1, :-1]),        # TL
+            (child_values[1:, :-1],  jitter_x[1:, :-1] + 4.0,  jitter_z[1:, :-1]),         # TR
+            (child_values[:-1, 1:],  jitter_x[:-1, 1:],        jitter_z[:-1, 1:] + 4.0),   # BL
+            (child_values[1:, 1:],   jitter_x[1:, 1:] + 4.0,   jitter_z[1:, 1:] + 4.0),    # BR
+        )
+        cell_x = np.arange(4).reshape(1, 4, 1, 1)
+        cell_z = np.arange(4).reshape(1, 1, 1, 4)
+
+        # Calculate pseudo-distances from each generated corner.
+        values, distances = [], []
+        for corner_value, corner_x, corner_z in corners:
+            corner_x = corner_x[:, None, :, None]
+            corner_z = corner_z[:, None, :, None]
+            values.append(corner_value[:, None, :, None])
+            distances.append((cell_z-corner_z) * (cell_z-corner_z) + (cell_x-corner_x) * (cell_x-corner_x))
+
+        dist_tl, dist_tr, dist_bl, dist_br = distances
+        zoom_values = np.select(
+            (
+                # Use the TL corner if it's closest.
+                (dist_tl < dist_tr) & (dist_tl < dist_bl) & (dist_tl < dist_br),
+                # Use the TR corner if it's closest.
+                (dist_tr < dist_tl) & (dist_tr < dist_bl) & (dist_tr < dist_br),
+                # Use the BL corner if it's closest.
+                (dist_bl < dist_tl) & (dist_bl < dist_tr) & (dist_bl < dist_br),
+            ),
+            values[:3],
+            # Use the BR corner if all others fail.
+            default=values[3],
+        ).reshape(child_x_width - 1 << 2, child_z_depth - 1 << 2)
+
+        # Extract the inner square, a subset of the zoomed values offset by the corner jitter.
+        x_offset = x_pos - 2 - (child_x_pos << 2)
+        z_offset = z_pos - 2 - (child_z_pos << 2)
+        biome_values.values[...] = zoom_values[x_offset:x_offset + x_width, z_offset:z_offset + z_depth]
+
+    def _output_debug_data(self, name, x_pos, z_pos, x_width, z_depth, area):
+        # MC reports this layer's area from its offset corner.
+        BaseLayer._output_debug_data(self, name, x_pos - 2, z_pos - 2, x_width, z_depth, area)
 
     def nextDouble(self, precision):
         return self.nextInt(precision) / precision - 0.5
+
+    def nextDoubles(self, chunk_seeds, precision):
+        return self.nextInts(chunk_seeds, precision) / precision - 0.5
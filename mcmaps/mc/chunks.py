@@ -14,8 +14,14 @@
 
 ''' Functions for handling chunk related information. '''
 
-__all__ = ['hashChunkXZ']
+__all__ = ['hashChunkXZ', 'unhashChunkXZ']
 
 
 def hashChunkXZ(chunkX, chunkZ):
     return chunkX & 4294967295 | (chunkZ & 4294967295) << 32
+
+
+def unhashChunkXZ(chunkHash):
+    chunkX = chunkHash & 4294967295
+    chunkZ = chunkHash >> 32 & 4294967295
+    return chunkX - (chunkX >> 31 << 32), chunkZ - (chunkZ >> 31 << 32)
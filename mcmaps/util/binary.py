@@ -0,0 +1,111 @@
+# Copyright 2020 Lane Shaw
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''
+Compact binary form of a chunk's biome data, served by the API in place of its JSON data.
+
+Each chunk is a 16 byte little endian header followed by its encoded biomes:
+
+* 4 bytes: magic "MCBM".
+* 1 byte: format version, currently 1.
+* 1 byte: encoding of the biomes, BIOMES_RAW, BIOMES_RLE or BIOMES_ZLIB.
+* 2 bytes: length of the encoded biomes following the header.
+* 4 bytes each: the chunk's signed x and z coordinates.
+
+The chunk's 256 biome IDs (signed bytes, row by row along the X axis, same as the JSON
+"values") are stored either as is, as (run length - 1, biome ID) byte pairs, or zlib
+compressed. Chunks are self delimiting, so several chunks are simply concatenated.
+Everything else in the JSON data is derived from these, e.g. its "biomes" are the
+sorted unique values and its "hash" is hashChunkXZ(x, z).
+'''
+
+import struct
+import zlib
+
+import numpy as np
+
+__all__ = [
+    'BINARY_CONTENT_TYPE', 'BINARY_ENCODINGS', 'BIOMES_RAW', 'BIOMES_RLE', 'BIOMES_ZLIB',
+    'decode_biomes', 'encode_biomes', 'reencode_biomes',
+]
+
+BINARY_CONTENT_TYPE = 'application/x-mcmaps-biomes'
+
+BIOMES_RAW = 0
+BIOMES_RLE = 1
+BIOMES_ZLIB = 2
+
+# Encodings selectable by the API's "fmt" parameter.
+BINARY_ENCODINGS = {
+    'raw': BIOMES_RAW,
+    'rle': BIOMES_RLE,
+    'zlib': BIOMES_ZLIB,
+}
+
+_HEADER = struct.Struct('<4sBBHii')
+_MAGIC = b'MCBM'
+_VERSION = 1
+
+
+def encode_biomes(x, z, values, encoding=BIOMES_RLE):
+    ''' Returns the binary form of chunk (x, z), given its biome IDs row by row along the X axis. '''
+    values = np.asarray(values, dtype=np.int8).ravel()
+
+    if encoding == BIOMES_RLE:
+        # Runs never exceed the chunk's 256 biomes, so their length always fits a byte.
+        starts = np.flatnonzero(np.concatenate(([True], values[1:] != values[:-1])))
+        lengths = np.diff(np.append(starts, values.size)) - 1
+        payload = np.column_stack((lengths.astype(np.uint8), values[starts].view(np.uint8))).tobytes()
+    elif encoding == BIOMES_ZLIB:
+        payload = zlib.compress(values.tobytes(), 9)
+    elif encoding == BIOMES_RAW:
+        payload = values.tobytes()
+    else:
+        raise ValueError('Unknown biomes encoding: %s' % encoding)
+
+    return _HEADER.pack(_MAGIC, _VERSION, encoding, len(payload), x, z) + payload
+
+
+def decode_biomes(data, offset=0):
+    '''
+    Decodes the binary form of a chunk starting at offset in data, returning its x and
+    z, its biome IDs as an int8 array, and the offset following it.
+    '''
+    magic, version, encoding, length, x, z = _HEADER.unpack_from(data, offset)
+    if magic != _MAGIC or version != _VERSION:
+        raise ValueError('Not a version %s binary chunk' % _VERSION)
+
+    offset += _HEADER.size
+    payload = bytes(data[offset:offset + length])
+
+    if encoding == BIOMES_RLE:
+        runs = np.frombuffer(payload, dtype=np.uint8).reshape(-1, 2)
+        values = np.repeat(runs[:, 1].view(np.int8), runs[:, 0].astype(np.intp) + 1)
+    elif encoding == BIOMES_ZLIB:
+        values = np.frombuffer(zlib.decompress(payload), dtype=np.int8)
+    elif encoding == BIOMES_RAW:
+        values = np.frombuffer(payload, dtype=np.int8)
+    else:
+        raise ValueError('Unknown biomes encoding: %s' % encoding)
+
+    return x, z, values, offset + length
+
+
+def reencode_biomes(data, encoding):
+    ''' Returns the binary form of a chunk in data with its biomes in another encoding. '''
+    if _HEADER.unpack_from(data)[2] == encoding:
+        return bytes(data)
+
+    x, z, values, _ = decode_biomes(data)
+    return encode_biomes(x, z, values, encoding)
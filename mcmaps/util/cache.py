@@ -0,0 +1,454 @@
+# Copyright 2020 Lane Shaw
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+''' Pluggable storage backends for the chunk data cached by API endpoints. '''
+
+import atexit
+import logging
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+from collections import OrderedDict, defaultdict
+from queue import Queue
+from threading import Event, Lock, Thread, local
+
+from mcmaps.util.common import ensure_path
+from mcmaps.util.eviction import CacheIndex, parse_size, parse_worlds, start_eviction_thread
+from mcmaps.util.region import close_region, open_region, region_path
+from mcmaps.util.wsgi import get_setting
+
+__all__ = [
+    'CACHE_BACKENDS', 'CacheBackend', 'FilesystemBackend', 'HotCacheBackend',
+    'MemoryBackend', 'SQLiteBackend', 'WriteBehindBackend', 'get_cache_backend',
+]
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend(ABC):
+    '''
+    Storage of cached chunk records. Records are identified by their world, given as
+    a (version, world type, seed, dimension) tuple of strings, the kind of data (like
+    "biomes"), the chunk's coordinates, and the record type (like CHUNK_JSON).
+    Cached records never change, so records already cached are always kept.
+    '''
+    __slots__ = ()
+
+    def __repr__(self):
+        return '%s()' % self.__class__.__name__
+
+    @abstractmethod
+    def get(self, world, kind, x, z, record):
+        ''' Returns a chunk's cached record, or None if it isn't cached. '''
+
+    @abstractmethod
+    def put(self, world, kind, records):
+        ''' Caches every (chunk x, chunk z, record, data) in records that isn't already. '''
+
+    def get_file(self, world, kind, x, z, record):
+        '''
+        Returns a binary file opened at the start of a chunk's cached record, and the
+        record's length, for sending it straight from the file. Returns None if it isn't
+        cached, or the backend doesn't keep records in files.
+        '''
+        return None
+
+    def flush(self):
+        ''' Writes out anything the backend still holds back, like records or accesses. '''
+
+    def put_later(self, world, kind, chunks, produce_records, cached=None):
+        '''
+        Caches the records returned by produce_records(), holding the records of every
+        (chunk x, chunk z) in chunks, whenever the backend gets to it. (Right away,
+        unless the backend writes behind.) Calls cached() afterwards, if given, even if
+        caching them failed.
+        '''
+        try:
+            self.put(world, kind, produce_records())
+        finally:
+            if cached is not None:
+                cached()
+
+
+class FilesystemBackend(CacheBackend):
+    '''
+    Region files of 32x32 chunks, in a folder per world and kind below root. Accesses
+    of region files are counted in index (a CacheIndex), if given, for evicting them.
+    '''
+    __slots__ = ('root', 'index')
+
+    def __init__(self, root, index=None):
+        self.root = root
+        self.index = index
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, self.root)
+
+    def get(self, world, kind, x, z, record):
+        path = region_path(os.path.join(*world, kind), x, z)
+        region = open_region(os.path.join(self.root, path))
+        data = region and region.read(x, z, record)
+
+        if data is not None and self.index is not None:
+            self.index.record_access(path)
+
+        return data
+
+    def get_file(self, world, kind, x, z, record):
+        path = region_path(os.path.join(*world, kind), x, z)
+        region = open_region(os.path.join(self.root, path))
+        record_file = region and region.open_record(x, z, record)
+
+        if record_file is not None and self.index is not None:
+            self.index.record_access(path)
+
+        return record_file
+
+    def flush(self):
+        if self.index is not None:
+            self.index.flush()
+
+    def put(self, world, kind, records):
+        folder = os.path.join(*world, kind)
+        region_records = defaultdict(list)
+
+        for chunk_record in records:
+            region_records[region_path(folder, *chunk_record[:2])].append(chunk_record)
+
+        # Folders are only created for the world and kind of data actually written.
+        ensure_path(os.path.join(self.root, folder))
+        for path, chunk_records in region_records.items():
+            full_path = os.path.join(self.root, path)
+
+            try:
+                open_region(full_path, create=True).write(chunk_records)
+            except FileNotFoundError:
+                # The region (or its whole world) was evicted since this process opened it.
+                close_region(full_path)
+                ensure_path(os.path.join(self.root, folder), recheck=True)
+                open_region(full_path, create=True).write(chunk_records)
+
+            if self.index is not None:
+                self.index.record_access(path)
+
+
+class SQLiteBackend(CacheBackend):
+    '''
+    A single SQLite database file, in WAL mode so any number of readers (across
+    every process) never wait on a writer. Each thread uses its own connection.
+    '''
+    __slots__ = ('path', '_local')
+
+    def __init__(self, path):
+        self.path = path
+        self._local = local()
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, self.path)
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+
+        if connection is None:
+            connection = self._local.connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS records ('
+                'world TEXT NOT NULL, kind TEXT NOT NULL, '
+                'x INTEGER NOT NULL, z INTEGER NOT NULL, record INTEGER NOT NULL, '
+                'data BLOB NOT NULL, '
+                'PRIMARY KEY (world, kind, x, z, record)'
+                ') WITHOUT ROWID'
+            )
+
+        return connection
+
+    def get(self, world, kind, x, z, record):
+        row = self._connection().execute(
+            'SELECT data FROM records WHERE world=? AND kind=? AND x=? AND z=? AND record=?',
+            ('/'.join(world), kind, x, z, record),
+        ).fetchone()
+
+        return None if row is None else row[0]
+
+    def put(self, world, kind, records):
+        world = '/'.join(world)
+
+        with self._connection() as connection:
+            connection.executemany(
+                'INSERT OR IGNORE INTO records (world, kind, x, z, record, data) VALUES (?, ?, ?, ?, ?, ?)',
+                ((world, kind, x, z, record, data) for x, z, record, data in records),
+            )
+
+
+class MemoryBackend(CacheBackend):
+    '''
+    A least recently used cache of records in this process, bounded by the total
+    bytes they hold, counting how many gets were hits.
+    '''
+    __slots__ = ('max_bytes', 'used_bytes', 'hits', 'misses', '_records', '_lock')
+
+    def __init__(self, max_bytes=256 << 20):
+        self.max_bytes = max_bytes
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._records = OrderedDict()
+        self._lock = Lock()
+
+    def __repr__(self):
+        return '%s(records=%s, used bytes=%s, max bytes=%s, hits=%s, misses=%s)' % (
+            self.__class__.__name__,
+            len(self._records), self.used_bytes, self.max_bytes,
+            self.hits, self.misses,
+        )
+
+    @property
+    def hit_ratio(self):
+        return self.hits / ((self.hits + self.misses) or 1)
+
+    def get(self, world, kind, x, z, record):
+        key = (world, kind, x, z, record)
+
+        with self._lock:
+            data = self._records.get(key)
+
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._records.move_to_end(key)
+
+            return data
+
+    def put(self, world, kind, records):
+        with self._lock:
+            for x, z, record, data in records:
+                key = (world, kind, x, z, record)
+                if key in self._records:
+                    continue
+
+                self._records[key] = data
+                self.used_bytes += len(data)
+
+            # Evict the least recently used records until we're back within budget.
+            while self.used_bytes > self.max_bytes and self._records:
+                _, evicted = self._records.popitem(last=False)
+                self.used_bytes -= len(evicted)
+
+
+class HotCacheBackend(CacheBackend):
+    '''
+    Serves the most recently used records of another backend from this process'
+    memory, a MemoryBackend bounded by max_bytes, only getting records missing
+    from it from the other backend.
+    '''
+    __slots__ = ('backend', 'hot')
+
+    def __init__(self, backend, max_bytes=64 << 20):
+        self.backend = backend
+        self.hot = MemoryBackend(max_bytes)
+
+    def __repr__(self):
+        return '%s(%r, hot=%r)' % (self.__class__.__name__, self.backend, self.hot)
+
+    def get(self, world, kind, x, z, record):
+        data = self.hot.get(world, kind, x, z, record)
+
+        if data is None:
+            data = self.backend.get(world, kind, x, z, record)
+            if data is not None:
+                self.hot.put(world, kind, ((x, z, record, data),))
+
+        return data
+
+    def get_file(self, world, kind, x, z, record):
+        # Records sent straight from their files skip this process' memory altogether.
+        return self.backend.get_file(world, kind, x, z, record)
+
+    def put(self, world, kind, records):
+        self.backend.put(world, kind, records)
+
+    def put_later(self, world, kind, chunks, produce_records, cached=None):
+        self.backend.put_later(world, kind, chunks, produce_records, cached)
+
+    def flush(self):
+        self.backend.flush()
+
+
+class WriteBehindBackend(CacheBackend):
+    '''
+    Caches records in another backend from a background thread, so responses never
+    wait on their records being encoded or stored. Getting the records of a chunk
+    still waiting to be cached waits for them, instead of reporting them missing.
+
+    At most max_pending batches of records wait at once (putting more blocks until
+    one's cached), and every pending batch is cached before the process exits.
+    '''
+    __slots__ = ('backend', 'timeout', '_queue', '_pending', '_lock', '_thread')
+
+    def __init__(self, backend, max_pending=16, timeout=30):
+        self.backend = backend
+        self.timeout = timeout
+        self._queue = Queue(max_pending)
+        self._pending = {}
+        self._lock = Lock()
+        self._thread = Thread(target=self._write_records, name='mcmaps-cache-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def __repr__(self):
+        return '%s(%r, pending=%s)' % (self.__class__.__name__, self.backend, self._queue.qsize())
+
+    def get(self, world, kind, x, z, record):
+        written = self._pending.get((world, kind, x, z))
+        if written is not None:
+            written.wait(self.timeout)
+
+        return self.backend.get(world, kind, x, z, record)
+
+    def get_file(self, world, kind, x, z, record):
+        written = self._pending.get((world, kind, x, z))
+        if written is not None:
+            written.wait(self.timeout)
+
+        return self.backend.get_file(world, kind, x, z, record)
+
+    def put(self, world, kind, records):
+        records = list(records)
+        self.put_later(world, kind, {(x, z) for x, z, _, _ in records}, lambda: records)
+
+    def put_later(self, world, kind, chunks, produce_records, cached=None):
+        keys = [(world, kind, x, z) for x, z in chunks]
+        written = Event()
+
+        with self._lock:
+            for key in keys:
+                self._pending[key] = written
+
+        self._queue.put((world, kind, keys, produce_records, cached, written))
+
+    def _write_records(self):
+        while True:
+            world, kind, keys, produce_records, cached, written = self._queue.get()
+
+            try:
+                self.backend.put(world, kind, produce_records())
+            except Exception:
+                # Chunks that failed to be cached are simply generated again by their next request.
+                logger.exception('Failed caching %s records of %s', kind, world)
+            finally:
+                with self._lock:
+                    for key in keys:
+                        if self._pending.get(key) is written:
+                            del self._pending[key]
+
+                written.set()
+                if cached is not None:
+                    cached()
+                self._queue.task_done()
+
+    def flush(self):
+        ''' Waits until every pending batch of records is cached, then flushes the other backend. '''
+        self._queue.join()
+        self.backend.flush()
+
+
+CACHE_BACKENDS = {
+    'filesystem': FilesystemBackend,
+    'sqlite': SQLiteBackend,
+    'memory': MemoryBackend,
+}
+
+def _start_eviction(env, index):
+    max_size = get_setting(env, 'MCMAPS_CACHE_MAX_SIZE')
+    interval = int(get_setting(env, 'MCMAPS_CACHE_EVICT_INTERVAL', 0))
+
+    if max_size and interval > 0:
+        start_eviction_thread(
+            index, parse_size(max_size), interval,
+            pinned=parse_worlds(get_setting(env, 'MCMAPS_CACHE_PINNED_SEEDS', '')),
+            policy=get_setting(env, 'MCMAPS_CACHE_EVICT_POLICY', 'lru').casefold(),
+        )
+
+
+# Backends used by this process, keyed by their settings.
+_backends = {}
+_layered_backends = {}
+_backends_lock = Lock()
+
+
+def get_cache_backend(env, doc_root):
+    '''
+    Returns this process' CacheBackend selected by the MCMAPS_CACHE_BACKEND setting,
+    creating it the first time it's used. (Along with its eviction thread, if the
+    filesystem backend is bounded by MCMAPS_CACHE_MAX_SIZE.)
+
+    Records are cached behind responses, up to MCMAPS_CACHE_WRITE_QUEUE batches of
+    them at once, and the most recently used records are kept in memory, up to
+    MCMAPS_CACHE_HOT_SIZE bytes of them, unless either is set to 0.
+    '''
+    write_queue = int(get_setting(env, 'MCMAPS_CACHE_WRITE_QUEUE', 16))
+    hot_size = parse_size(get_setting(env, 'MCMAPS_CACHE_HOT_SIZE', 64 << 20))
+    backend = _get_backend(env, doc_root)
+
+    # Records of the memory backend are already kept in memory.
+    if isinstance(backend, MemoryBackend):
+        hot_size = 0
+
+    key = (backend, write_queue, hot_size)
+    with _backends_lock:
+        layered = _layered_backends.get(key)
+
+        if layered is None:
+            layered = backend
+            if write_queue > 0:
+                layered = WriteBehindBackend(layered, write_queue)
+            if hot_size > 0:
+                layered = HotCacheBackend(layered, hot_size)
+
+            _layered_backends[key] = layered
+
+        return layered
+
+
+def _get_backend(env, doc_root):
+    name = get_setting(env, 'MCMAPS_CACHE_BACKEND', 'filesystem').casefold()
+    root = os.path.join(doc_root, 'world_cache')
+
+    if name == 'filesystem':
+        key = (name, root)
+    elif name == 'sqlite':
+        key = (name, get_setting(env, 'MCMAPS_CACHE_PATH', os.path.join(root, 'cache.sqlite3')))
+    elif name == 'memory':
+        key = (name, parse_size(get_setting(env, 'MCMAPS_CACHE_MEMORY_SIZE', 256 << 20)))
+    else:
+        raise ValueError('Unknown cache backend: ' + name)
+
+    with _backends_lock:
+        backend = _backends.get(key)
+
+        if backend is None:
+            if name == 'filesystem':
+                backend = _backends[key] = FilesystemBackend(root, CacheIndex(root))
+                _start_eviction(env, backend.index)
+                return backend
+
+            if name == 'sqlite':
+                ensure_path(os.path.dirname(key[1]) or '.')
+
+            backend = _backends[key] = CACHE_BACKENDS[name](key[1])
+
+        return backend
@@ -0,0 +1,278 @@
+# Copyright 2020 Lane Shaw
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+''' Generating and caching the biome data of chunks, shared by the API endpoints. '''
+
+import io, json, logging, os, zlib
+from collections import OrderedDict, defaultdict
+from threading import Lock, Thread
+from PIL import Image
+
+try:
+    import brotli
+except ImportError:  # Optional, JSON data is then only precompressed with gzip.
+    brotli = None
+
+from mcmaps.mc.chunks import hashChunkXZ
+from mcmaps.mc.constants import WORLD_TYPE
+from mcmaps.util.binary import encode_biomes
+from mcmaps.util.cache import get_cache_backend
+from mcmaps.util.common import GeneratorCache, chunk_image_url
+from mcmaps.util.locks import get_key_locks
+from mcmaps.util.region import CHUNK_BINARY, CHUNK_IMAGE, CHUNK_JSON, CHUNK_JSON_BROTLI, CHUNK_JSON_GZIP
+from mcmaps.util.wsgi import get_setting
+
+__all__ = [
+    'CONTENT_ENCODINGS', 'cache_region', 'compress_json', 'generators', 'get_region_chunks',
+    'get_world_cache', 'load_chunks', 'warm_generators',
+]
+
+logger = logging.getLogger(__name__)
+
+# Initialized generators kept by this process, keyed by (version, world type, seed).
+generators = GeneratorCache(int(os.environ.get('MCMAPS_GENERATOR_CACHE_SIZE', 8)))
+
+# Whether this process started warming up its generators yet.
+_warm_started = False
+_warm_lock = Lock()
+
+
+# Records of the JSON data precompressed with each content coding, most preferred first.
+CONTENT_ENCODINGS = OrderedDict()
+if brotli is not None:
+    CONTENT_ENCODINGS['br'] = CHUNK_JSON_BROTLI
+CONTENT_ENCODINGS['gzip'] = CHUNK_JSON_GZIP
+
+
+def get_region_chunks(env):
+    ''' Returns the width and depth in chunks of the regions generated at once. '''
+    return max(int(get_setting(env, 'MCMAPS_REGION_SIZE', 512)) >> 4, 1)
+
+
+def _get_generator(version, world_type, seed, region_size):
+    from mcmaps.mc.biomes import initialize_all_biomes
+
+    # Generators are only initialized the first time this process needs them, compiled for region sized areas.
+    return generators.get(
+        (version, world_type, seed),
+        lambda: initialize_all_biomes(seed, world_type, plan_size=(region_size, region_size))[0],
+    )
+
+
+def warm_generators(env):
+    '''
+    Loads the generator of every "version:world type:seed" in the MCMAPS_WARM_SEEDS
+    setting (a comma separated string) into this process' generators cache, in a
+    daemon thread started by the first request calling it.
+    '''
+    global _warm_started
+
+    with _warm_lock:
+        if _warm_started:
+            return None
+        _warm_started = True
+
+    worlds = get_setting(env, 'MCMAPS_WARM_SEEDS', '')
+    region_size = get_region_chunks(env) << 4
+
+    def run():
+        for world in filter(None, map(str.strip, worlds.split(','))):
+            try:
+                version, world_type, seed = world.split(':')
+                world_type = WORLD_TYPE.__members__[world_type.upper()]  # @UndefinedVariable
+
+                _get_generator(version, world_type, int(seed), region_size)
+            except Exception:
+                logger.exception('Failed warming up the generator of %s', world)
+
+    thread = Thread(target=run, name='mcmaps-warm-generators', daemon=True)
+    thread.start()
+    return thread
+
+
+def get_world_cache(env, doc_root):
+    '''
+    Returns this process' cache backend for the endpoints serving world data, warming
+    up the generators of any popular worlds with the first request's settings.
+    '''
+    warm_generators(env)
+    return get_cache_backend(env, doc_root)
+
+
+def _chunk_json(version, world_type_name, seed, x, z, area):
+    ''' Returns a chunk's API JSON data. '''
+    chunk_hash = str(hashChunkXZ(x, z)).rjust(20, '0')
+    biomes = area.biomes()
+
+    return json.dumps({
+        'x': x, 'z': z,
+        'hash': chunk_hash,
+        'biomes': sorted(map(int, set(biomes))),
+        'values': list(map(int, biomes)),
+        'image': chunk_image_url(version, world_type_name, seed, x, z),
+    }).encode('us-ascii')
+
+
+def _chunk_image(area):
+    ''' Returns a chunk's PNG image. '''
+    image_file = io.BytesIO()
+    Image.frombytes(
+        mode='RGB',
+        size=(16, 16),
+        data=area.colors(),
+    ).save(image_file, format='PNG', optimize=True)
+
+    return image_file.getvalue()
+
+
+def compress_json(body, record):
+    ''' Returns a chunk's API JSON data compressed for its record type. '''
+    if record == CHUNK_JSON_BROTLI:
+        # (A lower quality than brotli's default, since every chunk of a region is compressed at once.)
+        return brotli.compress(body, mode=brotli.MODE_TEXT, quality=9)
+
+    # Gzip with an mtime of 0, so the same data is always compressed the same.
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 31)
+    return compressor.compress(body) + compressor.flush()
+
+
+def _chunk_binary(x, z, area):
+    ''' Returns a chunk's binary biome data, run length encoded. '''
+    return encode_biomes(x, z, area.values.T)
+
+
+def _chunk_record(version, world_type_name, seed, x, z, area, record):
+    ''' Returns a chunk's record of the given type. '''
+    if record == CHUNK_IMAGE:
+        return _chunk_image(area)
+    if record == CHUNK_BINARY:
+        return _chunk_binary(x, z, area)
+
+    body = _chunk_json(version, world_type_name, seed, x, z, area)
+    return body if record == CHUNK_JSON else compress_json(body, record)
+
+
+def _json_record(x, z, body, record):
+    ''' Returns a chunk's record of the given type, derived from its API JSON data. '''
+    if record == CHUNK_BINARY:
+        return encode_biomes(x, z, json.loads(body)['values'])
+    return compress_json(bytes(body), record)
+
+
+def cache_region(cache, version, world_type, seed, region_x, region_z, region_chunks, cached=None):
+    '''
+    Generates the biomes of the region_chunks by region_chunks chunks region starting
+    at chunk (region_x, region_z), returning them as a BiomeGrid. Every chunk's records
+    are encoded and cached whenever the cache gets to them, calling cached() after.
+    '''
+    world_type_name = world_type.name.casefold()
+
+    # Load our cached generator, if it was already generated itself.
+    generator = _get_generator(version, world_type, seed, region_chunks << 4)
+    region_area = generator.get_area(region_x << 4, region_z << 4, region_chunks << 4, region_chunks << 4)
+
+    chunks = [
+        (chunk_x, chunk_z)
+        for chunk_x in range(region_x, region_x + region_chunks)
+        for chunk_z in range(region_z, region_z + region_chunks)
+    ]
+
+    def chunk_records():
+        for chunk_x, chunk_z in chunks:
+            chunk_area = region_area.view(chunk_x << 4, chunk_z << 4, 16, 16)
+            body = _chunk_json(version, world_type_name, seed, chunk_x, chunk_z, chunk_area)
+            yield chunk_x, chunk_z, CHUNK_JSON, body
+            for record in CONTENT_ENCODINGS.values():
+                yield chunk_x, chunk_z, record, compress_json(body, record)
+            yield chunk_x, chunk_z, CHUNK_IMAGE, _chunk_image(chunk_area)
+            yield chunk_x, chunk_z, CHUNK_BINARY, _chunk_binary(chunk_x, chunk_z, chunk_area)
+
+    # (Chunks another process already cached are kept as they are.)
+    cache.put_later((version, world_type_name, str(seed), 'DIM0'), 'biomes', chunks, chunk_records, cached)
+    return region_area
+
+
+def _generate_region(env, cache, doc_root, version, world_type, seed, region_x, region_z, region_chunks, chunks, record):
+    '''
+    Returns the record of every (chunk x, chunk z) in chunks, all inside of the region
+    starting at chunk (region_x, region_z), generating (and caching) the region.
+    '''
+    world_type_name = world_type.name.casefold()
+    world = (version, world_type_name, str(seed), 'DIM0')
+
+    # Only one thread of any process generates a region at once, while the others
+    # wait for it to be cached. (Or give up waiting and generate it themselves.)
+    release = get_key_locks(os.path.join(doc_root, 'world_cache', 'locks')).acquire(
+        (version, world_type_name, seed, region_x, region_z, region_chunks),
+        timeout=float(get_setting(env, 'MCMAPS_GENERATE_TIMEOUT', 10)),
+    )
+
+    try:
+        if release is not None:
+            bodies = [cache.get(world, 'biomes', x, z, record) for x, z in chunks]
+            if None not in bodies:
+                return bodies
+
+        region_area = cache_region(
+            cache, version, world_type, seed,
+            region_x, region_z, region_chunks, release,
+        )
+        release = None  # Released once the region's cached.
+    finally:
+        # (Caching the region right away releases the lock even when it fails, before
+        # this releases it again, which does nothing.)
+        if release is not None:
+            release()
+
+    # Only the requested chunks are encoded before responding, the rest are left to the cache.
+    return [
+        _chunk_record(version, world_type_name, seed, x, z, region_area.view(x << 4, z << 4, 16, 16), record)
+        for x, z in chunks
+    ]
+
+
+def load_chunks(env, cache, doc_root, version, world_type, seed, chunks, record=CHUNK_JSON):
+    '''
+    Returns the record (API JSON data by default) of every (chunk x, chunk z) in chunks,
+    in order. Chunks missing from the cache are generated (and cached) along with their
+    whole regions, so a client panning nearby only hits the cache.
+    '''
+    world = (version, world_type.name.casefold(), str(seed), 'DIM0')
+    bodies = [cache.get(world, 'biomes', x, z, record) for x, z in chunks]
+
+    # Regions cached before binary and compressed records were added only have their JSON data to go on.
+    if record != CHUNK_JSON and record != CHUNK_IMAGE:
+        for index, (x, z) in enumerate(chunks):
+            if bodies[index] is None:
+                body = cache.get(world, 'biomes', x, z, CHUNK_JSON)
+                if body is not None:
+                    bodies[index] = _json_record(x, z, body, record)
+
+    # Generate each region with missing chunks once.
+    region_chunks = get_region_chunks(env)
+    missing = defaultdict(list)
+    for index, (x, z) in enumerate(chunks):
+        if bodies[index] is None:
+            missing[x // region_chunks * region_chunks, z // region_chunks * region_chunks].append(index)
+
+    for (region_x, region_z), indexes in missing.items():
+        region_bodies = _generate_region(
+            env, cache, doc_root, version, world_type, seed,
+            region_x, region_z, region_chunks, [chunks[index] for index in indexes], record,
+        )
+
+        for index, body in zip(indexes, region_bodies):
+            bodies[index] = body
+
+    return bodies
@@ -14,25 +14,118 @@
 
 ''' Common functionality used by MC Maps WSGI script endpoints '''
 
+from collections import OrderedDict
 from os import makedirs
-from os.path import join
+from threading import Lock
+from urllib.parse import urlencode
 
 
-__all__ = ['ensure_world_paths']
+__all__ = ['GeneratorCache', 'chunk_image_url', 'ensure_path']
 
+# Folders this process already knows exist, so they're only created once.
+_known_paths = set()
 
-def _ensure_dim_folders(world_path, dim):
-    # Create the blocks, layers, and biomes maps folders
-    makedirs(join(world_path, dim, 'blocks'), exist_ok=True)
-    makedirs(join(world_path, dim, 'layers'), exist_ok=True)
-    makedirs(join(world_path, dim, 'biomes', 'img'), exist_ok=True)
 
+class GeneratorCache:
+    '''
+    A least recently used cache of initialized generators kept for the life of a
+    process, keyed by (version, world type, seed) and bounded by their count.
+    '''
+    __slots__ = ('max_size', 'hits', 'misses', '_generators', '_loading', '_lock')
 
-def ensure_world_paths(path):
-    # Create the seeds project folder
-    makedirs(path, exist_ok=True)
+    def __init__(self, max_size=8):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._generators = OrderedDict()
+        self._loading = {}
+        self._lock = Lock()
+
+    def __repr__(self):
+        return '%s(generators=%s, max size=%s, hits=%s, misses=%s)' % (
+            self.__class__.__name__,
+            len(self._generators), self.max_size,
+            self.hits, self.misses,
+        )
+
+    def __len__(self):
+        return len(self._generators)
+
+    def __contains__(self, key):
+        return key in self._generators
+
+    def get(self, key, load):
+        '''
+        Returns the generator cached for key, calling load() to create it if it's missing.
+        Threads missing the same key wait for the first one's load instead of loading it too.
+        '''
+        with self._lock:
+            generator = self._get(key)
+            if generator is not None:
+                return generator
+
+            key_lock = self._loading.setdefault(key, Lock())
+
+        # Generators are loaded outside of the lock, so other keys aren't blocked meanwhile.
+        with key_lock:
+            with self._lock:
+                generator = self._get(key)
+                if generator is not None:
+                    return generator
+
+                self.misses += 1
+
+            try:
+                generator = load()
+            except BaseException:
+                with self._lock:
+                    if self._loading.get(key) is key_lock:
+                        del self._loading[key]
+                raise
+
+            # Cached before it's no longer loading, so no thread misses it in between.
+            with self._lock:
+                self._generators[key] = generator
+                self._generators.move_to_end(key)
+                if self._loading.get(key) is key_lock:
+                    del self._loading[key]
+
+                while len(self._generators) > self.max_size:
+                    self._generators.popitem(last=False)
+
+        return generator
+
+    def _get(self, key):
+        generator = self._generators.get(key)
+
+        if generator is not None:
+            self.hits += 1
+            self._generators.move_to_end(key)
+
+        return generator
+
+    def clear(self):
+        with self._lock:
+            self._generators.clear()
+
+
+def ensure_path(path, recheck=False):
+    '''
+    Creates the folder at path (and its parents) unless this process already knows
+    it exists. Use recheck if it may have been deleted since, by another process.
+    '''
+    if recheck or path not in _known_paths:
+        makedirs(path, exist_ok=True)
+        _known_paths.add(path)
+
+
+def chunk_image_url(version, world_type_name, seed, x, z):
+    # Chunk images are stored in region files, so they're served by the image endpoint.
+    return '/api/image?' + urlencode((
+        ('seed', seed),
+        ('version', version),
+        ('wtype', world_type_name),
+        ('x', x),
+        ('z', z),
+    ))
 
-    # Make dimensions for Overworld, Nether, and the End.
-    _ensure_dim_folders(path, 'DIM0')
-    _ensure_dim_folders(path, 'DIM-1')
-    _ensure_dim_folders(path, 'DIM1')
@@ -0,0 +1,271 @@
+# Copyright 2020 Lane Shaw
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+''' Size accounting and eviction of the region files cached in the world_cache folder. '''
+
+import atexit
+import glob
+import logging
+import os
+import shutil
+import sqlite3
+import time
+from collections import defaultdict, namedtuple
+from threading import Lock, Thread, local
+
+from mcmaps.util.region import remove_region
+
+__all__ = [
+    'EVICTION_POLICIES', 'CacheIndex', 'RegionUsage',
+    'evict', 'parse_size', 'parse_worlds', 'start_eviction_thread',
+]
+
+logger = logging.getLogger(__name__)
+
+# A cached region file's path relative to the cache's root, its world as "version:world type:seed",
+# size in bytes, last access time, and number of accesses.
+RegionUsage = namedtuple('RegionUsage', ('path', 'world', 'size', 'accessed', 'hits'))
+
+_SIZE_UNITS = {'': 1, 'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30, 'T': 1 << 40}
+
+
+def parse_size(size):
+    ''' Parses a size in bytes, optionally suffixed by K, M, G, or T (like "10G"). '''
+    size = str(size).strip().upper().rstrip('B')
+    unit = size[-1:] if size[-1:] in _SIZE_UNITS else ''
+
+    return int(float(size[:len(size) - len(unit)]) * _SIZE_UNITS[unit])
+
+
+def parse_worlds(worlds):
+    ''' Parses a comma separated string of "version:world type:seed" worlds into a set. '''
+    parsed = set()
+
+    for world in filter(None, map(str.strip, worlds.split(','))):
+        version, world_type_name, seed = world.split(':')
+        parsed.add('%s:%s:%s' % (version, world_type_name.casefold(), int(seed)))
+
+    return parsed
+
+
+def _world_of(path):
+    # Region files are stored as <version>/<world type>/<seed>/<dimension>/<kind>/r.<x>.<z>.region
+    return ':'.join(path.replace(os.sep, '/').split('/')[:3])
+
+
+class CacheIndex:
+    '''
+    An index of every cached region file's size and accesses, kept in a small SQLite
+    database in the cache's root folder and shared by every process using the cache.
+
+    Accesses are only counted in memory by record_access, then written to the index
+    by a daemon thread every flush_interval seconds (or by flush), so serving cached
+    data never waits on the index. Accesses still counted are written when the process
+    exits.
+    '''
+    __slots__ = ('root', 'path', 'flush_interval', '_accesses', '_thread', '_lock', '_local')
+
+    def __init__(self, root, flush_interval=60):
+        self.root = root
+        self.path = os.path.join(root, 'index.sqlite3')
+        self.flush_interval = flush_interval
+        self._accesses = {}
+        self._thread = None
+        self._lock = Lock()
+        self._local = local()
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, self.root)
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+
+        if connection is None:
+            os.makedirs(self.root, exist_ok=True)
+            connection = self._local.connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS regions ('
+                'path TEXT PRIMARY KEY, world TEXT NOT NULL, size INTEGER NOT NULL, '
+                'accessed REAL NOT NULL, hits INTEGER NOT NULL'
+                ') WITHOUT ROWID'
+            )
+
+        return connection
+
+    def record_access(self, path):
+        ''' Counts an access of the region file at path (relative to the cache's root). '''
+        with self._lock:
+            hits = self._accesses.get(path, (0, 0))[1]
+            self._accesses[path] = (time.time(), hits + 1)
+
+            # Accesses are only written by the index's own thread, started by the first one.
+            if self._thread is None:
+                self._thread = Thread(target=self._flush_accesses, name='mcmaps-cache-index', daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _flush_accesses(self):
+        while True:
+            time.sleep(self.flush_interval)
+
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Failed writing cached region accesses to %s', self.path)
+
+    def flush(self):
+        ''' Writes the accesses counted so far into the index. '''
+        with self._lock:
+            accesses, self._accesses = self._accesses, {}
+
+        if not accesses:
+            return
+
+        with self._connection() as connection:
+            connection.executemany(
+                'INSERT INTO regions (path, world, size, accessed, hits) VALUES (?, ?, 0, ?, ?) '
+                'ON CONFLICT (path) DO UPDATE SET '
+                'accessed=max(accessed, excluded.accessed), hits=hits + excluded.hits',
+                ((path, _world_of(path), accessed, hits) for path, (accessed, hits) in accesses.items()),
+            )
+
+    def scan(self):
+        '''
+        Updates the index with the size of every region file in the cache, dropping
+        any removed since, and returns a RegionUsage of every region file.
+        '''
+        self.flush()
+
+        sizes = {}
+        pattern = os.path.join(glob.escape(self.root), '*', '*', '*', 'DIM*', '*', 'r.*.region')
+        for region_path in glob.iglob(pattern):
+            try:
+                stat = os.stat(region_path)
+            except FileNotFoundError:
+                continue
+            sizes[os.path.relpath(region_path, self.root)] = stat
+
+        with self._connection() as connection:
+            indexed = {row[0] for row in connection.execute('SELECT path FROM regions')}
+
+            connection.executemany(
+                'DELETE FROM regions WHERE path=?',
+                ((path,) for path in indexed.difference(sizes)),
+            )
+            # Regions never accessed through the index count as accessed when last written.
+            connection.executemany(
+                'INSERT INTO regions (path, world, size, accessed, hits) VALUES (?, ?, ?, ?, 0) '
+                'ON CONFLICT (path) DO UPDATE SET size=excluded.size',
+                ((path, _world_of(path), stat.st_size, stat.st_mtime) for path, stat in sizes.items()),
+            )
+
+            return [
+                RegionUsage(*row)
+                for row in connection.execute('SELECT path, world, size, accessed, hits FROM regions')
+            ]
+
+    def remove(self, paths):
+        ''' Removes the region files at paths from the cache and the index. '''
+        for path in paths:
+            remove_region(os.path.join(self.root, path))
+
+        with self._connection() as connection:
+            connection.executemany('DELETE FROM regions WHERE path=?', ((path,) for path in paths))
+
+
+def _lru_key(usage):
+    return usage.accessed
+
+
+def _lfu_key(usage):
+    return usage.hits, usage.accessed
+
+
+EVICTION_POLICIES = {
+    'lru': _lru_key,
+    'lfu': _lfu_key,
+}
+
+
+def evict(index, max_size, pinned=(), policy='lru', whole_worlds=False):
+    '''
+    Evicts cached region files, least recently (or frequently) used first, until the
+    cache's total size is within max_size bytes, returning the RegionUsage of every
+    region file evicted. Regions of pinned worlds ("version:world type:seed") are
+    never evicted. If whole_worlds is set, entire worlds are evicted at once.
+
+    Worlds left without any cached regions are removed altogether.
+    '''
+    usages = index.scan()
+    total_size = sum(usage.size for usage in usages)
+    if total_size <= max_size:
+        return []
+
+    policy_key = EVICTION_POLICIES[policy]
+    candidates = [usage for usage in usages if usage.world not in pinned]
+
+    if whole_worlds:
+        # A world is as recently (and frequently) used as all of its regions combined.
+        worlds = defaultdict(list)
+        for usage in candidates:
+            worlds[usage.world].append(usage)
+
+        groups = sorted(worlds.values(), key=lambda regions: policy_key(RegionUsage(
+            None, None, None,
+            max(usage.accessed for usage in regions),
+            sum(usage.hits for usage in regions),
+        )))
+    else:
+        groups = [[usage] for usage in sorted(candidates, key=policy_key)]
+
+    evicted = []
+    for regions in groups:
+        if total_size <= max_size:
+            break
+
+        index.remove([usage.path for usage in regions])
+        total_size -= sum(usage.size for usage in regions)
+        evicted.extend(regions)
+
+    # Remove the folders of worlds without any regions left.
+    evicted_paths = {usage.path for usage in evicted}
+    remaining_worlds = {usage.world for usage in usages if usage.path not in evicted_paths}
+    for world in {usage.world for usage in evicted}.difference(remaining_worlds):
+        shutil.rmtree(os.path.join(index.root, *world.split(':')), ignore_errors=True)
+
+    return evicted
+
+
+def start_eviction_thread(index, max_size, interval, pinned=(), policy='lru', whole_worlds=False):
+    ''' Starts a daemon thread evicting cached regions every interval seconds. '''
+    def run():
+        while True:
+            time.sleep(interval)
+
+            try:
+                evicted = evict(index, max_size, pinned, policy, whole_worlds)
+            except Exception:
+                logger.exception('Failed evicting cached regions from %s', index.root)
+                continue
+
+            if evicted:
+                logger.info(
+                    'Evicted %s cached region(s), %s bytes, from %s',
+                    len(evicted), sum(usage.size for usage in evicted), index.root,
+                )
+
+    thread = Thread(target=run, name='mcmaps-cache-eviction', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,123 @@
+# Copyright 2020 Lane Shaw
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+''' Locks shared by every process on the same machine, for generating data only once. '''
+
+import os
+import time
+import zlib
+from threading import Lock
+
+try:
+    import fcntl
+except ImportError:  # Windows, where only a single development server generates data.
+    fcntl = None
+
+from mcmaps.util.common import ensure_path
+
+__all__ = ['KeyLocks', 'get_key_locks']
+
+# Lock tables used by this process, keyed by their folder.
+_key_locks = {}
+_key_locks_lock = Lock()
+
+
+class KeyLocks:
+    '''
+    A fixed table of exclusive locks, each a lock file in folder locked by any one
+    thread of every process using the same folder. Keys are hashed to one of the
+    table's slots, so unrelated keys rarely (and only briefly) wait on each other,
+    while the number of lock files stays bounded.
+    '''
+    __slots__ = ('folder', 'slots', '_thread_locks')
+
+    def __init__(self, folder, slots=256):
+        self.folder = folder
+        self.slots = slots
+        self._thread_locks = [Lock() for _ in range(slots)]
+
+    def __repr__(self):
+        return '%s(%r, slots=%s)' % (self.__class__.__name__, self.folder, self.slots)
+
+    def acquire(self, key, timeout=None):
+        '''
+        Locks key, waiting up to timeout seconds (or forever) for any other thread or
+        process holding it. Returns a function releasing the lock, which any thread may
+        call (only the first call releases it, later calls do nothing), or None if the
+        lock timed out.
+        '''
+        slot = zlib.crc32(repr(key).encode('utf-8')) % self.slots
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        # Threads of this process wait on each other without polling.
+        thread_lock = self._thread_locks[slot]
+        if not thread_lock.acquire(timeout=-1 if timeout is None else timeout):
+            return None
+
+        # Locked by the first release, so releasing twice never unlocks (or closes)
+        # whatever another thread acquired since.
+        released = Lock()
+
+        def release_thread_lock():
+            if released.acquire(False):
+                thread_lock.release()
+
+        if fcntl is None:
+            return release_thread_lock
+
+        # (Locking a file only needs permission to read it, so lock files created by another
+        # user still lock. Without permission to create it, only this process' threads wait.)
+        try:
+            ensure_path(self.folder)
+            fd = os.open(os.path.join(self.folder, '%02x.lock' % slot), os.O_RDONLY | os.O_CREAT, 0o644)
+        except PermissionError:
+            return release_thread_lock
+        except BaseException:
+            thread_lock.release()
+            raise
+
+        # While other processes are polled, since flock can't time out.
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if deadline is not None and time.monotonic() >= deadline:
+                    os.close(fd)
+                    thread_lock.release()
+                    return None
+
+                time.sleep(0.02)
+
+        def release():
+            if not released.acquire(False):
+                return
+
+            try:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+            finally:
+                thread_lock.release()
+
+        return release
+
+
+def get_key_locks(folder):
+    ''' Returns this process' KeyLocks of folder, creating them the first time they're used. '''
+    with _key_locks_lock:
+        key_locks = _key_locks.get(folder)
+        if key_locks is None:
+            key_locks = _key_locks[folder] = KeyLocks(folder)
+
+        return key_locks
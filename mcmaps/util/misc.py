@@ -15,3 +15,6 @@
 ''' Miscellaneous helpful structures and constants '''
 
 SLONG_RANGE = range(-1 << 63, 1 << 63)
+
+# Chunk coordinates inside of MC's world border, 30,000,000 blocks from the origin.
+CHUNK_RANGE = range(-30000000 >> 4, 30000000 >> 4)
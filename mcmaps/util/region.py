@@ -0,0 +1,331 @@
+# Copyright 2020 Lane Shaw
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+''' Region files packing the cached data of 32x32 chunks into a single file. '''
+
+import mmap
+import os
+import struct
+from collections import OrderedDict
+from threading import Lock
+
+try:
+    import fcntl
+except ImportError:  # Windows, where only a single development server writes to the cache.
+    fcntl = None
+
+__all__ = [
+    'CHUNK_BINARY', 'CHUNK_IMAGE', 'CHUNK_JSON', 'CHUNK_JSON_BROTLI', 'CHUNK_JSON_GZIP', 'REGION_CHUNKS',
+    'RegionFile', 'close_region', 'open_region', 'region_path', 'remove_region',
+]
+
+# Chunks per side of a region, same as MC's own region files.
+REGION_CHUNKS = 32
+
+# Records stored per chunk.
+CHUNK_JSON = 0
+CHUNK_IMAGE = 1
+CHUNK_BINARY = 2
+CHUNK_JSON_GZIP = 3
+CHUNK_JSON_BROTLI = 4
+_RECORD_COUNT = 5
+
+# Magic and record count, followed by an (offset, length) index entry of every chunk's records.
+# (Region files created before a record type was added simply never store it.)
+_HEADER = struct.Struct('<8sI4x')
+_INDEX_ENTRY = struct.Struct('<II')
+_MAGIC = b'MCMAPSR1'
+
+# Region files kept open (and mapped) by this process, most recently used last.
+_MAX_OPEN_REGIONS = 64
+_open_regions = OrderedDict()
+_open_regions_lock = Lock()
+
+
+def _seek_pread(fd, size, offset):
+    # Windows' os.pread, reading after seeking. (Region files are only read this way
+    # while holding their lock, so nothing moves the offset meanwhile.)
+    os.lseek(fd, offset, os.SEEK_SET)
+    data = bytearray()
+
+    while len(data) < size:
+        chunk = os.read(fd, size - len(data))
+        if not chunk:
+            break
+        data += chunk
+
+    return bytes(data)
+
+
+def _seek_pwrite(fd, data, offset):
+    # Windows' os.pwrite, writing after seeking, the same way.
+    os.lseek(fd, offset, os.SEEK_SET)
+    data = memoryview(data)
+
+    written = 0
+    while written < len(data):
+        written += os.write(fd, data[written:])
+
+    return written
+
+
+_pread = getattr(os, 'pread', _seek_pread)
+_pwrite = getattr(os, 'pwrite', _seek_pwrite)
+
+
+def region_path(folder, chunk_x, chunk_z):
+    ''' Returns the path of the region file holding a chunk, inside of a world's folder. '''
+    return os.path.join(folder, 'r.%s.%s.region' % (chunk_x >> 5, chunk_z >> 5))
+
+
+def _index_size(record_count):
+    return REGION_CHUNKS * REGION_CHUNKS * record_count * _INDEX_ENTRY.size
+
+
+def _index_offset(chunk_x, chunk_z, record, record_count):
+    chunk_index = (chunk_z & 31) * REGION_CHUNKS + (chunk_x & 31)
+    return _HEADER.size + (chunk_index * record_count + record) * _INDEX_ENTRY.size
+
+
+class RegionFile:
+    '''
+    A region's cached records, indexed by chunk and record type. Records are appended
+    to the end of the file and never change once stored, so readers can serve them
+    straight from a shared memory map while other processes append new records.
+
+    Region files are only opened for writing when created, or first written to, so
+    readers only need permission to read them.
+    '''
+    __slots__ = ('path', '_fd', '_writable', '_map', '_lock')
+
+    def __init__(self, path, create=True):
+        self.path = path
+        self._map = None
+        self._writable = create
+        self._fd = os.open(
+            path, (os.O_RDWR | os.O_CREAT if create else os.O_RDONLY) | getattr(os, 'O_BINARY', 0), 0o644,
+        )
+        self._lock = Lock()
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, self.path)
+
+    def __del__(self):
+        # Region files are closed once no thread is using them anymore.
+        if self._map is not None:
+            self._map.close()
+        if hasattr(self, '_fd'):
+            os.close(self._fd)
+
+    def _mapped(self, size):
+        # Map the file again whenever other writers have grown it past the current map.
+        if self._map is None or len(self._map) < size:
+            file_size = os.fstat(self._fd).st_size
+            if file_size < size:
+                return None
+
+            if self._map is not None:
+                self._map.close()
+            self._map = mmap.mmap(self._fd, file_size, access=mmap.ACCESS_READ)
+
+        return self._map
+
+    def _locate(self, chunk_x, chunk_z, record):
+        region_map = self._mapped(_HEADER.size)
+        if region_map is None:
+            return None
+
+        record_count = _HEADER.unpack_from(region_map)[1]
+        if record >= record_count:
+            return None
+
+        region_map = self._mapped(_HEADER.size + _index_size(record_count))
+        if region_map is None:
+            return None
+
+        offset, length = _INDEX_ENTRY.unpack_from(
+            region_map, _index_offset(chunk_x, chunk_z, record, record_count),
+        )
+        return (offset, length) if length else None
+
+    def locate(self, chunk_x, chunk_z, record):
+        ''' Returns the (offset, length) of a chunk's record in the file, or None if it isn't stored yet. '''
+        with self._lock:
+            return self._locate(chunk_x, chunk_z, record)
+
+    def open_record(self, chunk_x, chunk_z, record):
+        '''
+        Returns a new binary file opened at the start of a chunk's record, and the
+        record's length, or None if it isn't stored yet. (Or if the file at path isn't
+        this region file anymore, since it was removed and created again.)
+        '''
+        location = self.locate(chunk_x, chunk_z, record)
+        if location is None:
+            return None
+
+        try:
+            record_file = open(self.path, 'rb')
+        except FileNotFoundError:
+            return None
+
+        # (Files are opened separately, since duplicated descriptors would share their offset.)
+        if not self._same_file(record_file.fileno()):
+            record_file.close()
+            return None
+
+        offset, length = location
+        record_file.seek(offset)
+        return record_file, length
+
+    def _same_file(self, fd):
+        with self._lock:
+            region_stat = os.fstat(self._fd)
+
+        file_stat = os.fstat(fd)
+        return (file_stat.st_dev, file_stat.st_ino) == (region_stat.st_dev, region_stat.st_ino)
+
+    def _open_writable(self):
+        fd = os.open(self.path, os.O_RDWR | getattr(os, 'O_BINARY', 0))
+
+        # The file at path may have been removed, and created again, since it was opened for reading.
+        region_stat, file_stat = os.fstat(self._fd), os.fstat(fd)
+        if (file_stat.st_dev, file_stat.st_ino) != (region_stat.st_dev, region_stat.st_ino):
+            os.close(fd)
+            raise FileNotFoundError('Region file was removed: ' + self.path)
+
+        os.close(self._fd)
+        self._fd = fd
+        self._writable = True
+
+    def read(self, chunk_x, chunk_z, record):
+        ''' Returns a chunk's record, or None if it isn't stored yet. '''
+        with self._lock:
+            location = self._locate(chunk_x, chunk_z, record)
+            if location is None:
+                return None
+
+            offset, length = location
+            region_map = self._mapped(offset + length)
+            return None if region_map is None else region_map[offset:offset + length]
+
+    def write(self, records):
+        '''
+        Appends every (chunk x, chunk z, record, data) in records that isn't already
+        stored, returning how many were. Other processes are locked out meanwhile.
+        Record types the region file predates are skipped. Raises FileNotFoundError if the region file was removed since it was opened.
+        '''
+        written = 0
+
+        with self._lock:
+            if not self._writable:
+                self._open_writable()
+
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+
+            try:
+                stat = os.fstat(self._fd)
+                if not stat.st_nlink:
+                    raise FileNotFoundError('Region file was removed: ' + self.path)
+
+                end = stat.st_size
+                if end < _HEADER.size:
+                    record_count = _RECORD_COUNT
+                    _pwrite(self._fd, _HEADER.pack(_MAGIC, record_count) + bytes(_index_size(record_count)), 0)
+                    end = _HEADER.size + _index_size(record_count)
+                else:
+                    record_count = _HEADER.unpack(_pread(self._fd, _HEADER.size, 0))[1]
+
+                index = bytearray(_pread(self._fd, _index_size(record_count), _HEADER.size))
+                data = bytearray()
+
+                for chunk_x, chunk_z, record, record_data in records:
+                    if record >= record_count:
+                        continue
+
+                    index_offset = _index_offset(chunk_x, chunk_z, record, record_count) - _HEADER.size
+                    if _INDEX_ENTRY.unpack_from(index, index_offset)[1]:
+                        continue
+
+                    _INDEX_ENTRY.pack_into(index, index_offset, end + len(data), len(record_data))
+                    data += record_data
+                    written += 1
+
+                # Store the data before indexing it, so readers never see a partial record.
+                if written:
+                    _pwrite(self._fd, data, end)
+                    _pwrite(self._fd, index, _HEADER.size)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+        return written
+
+
+def open_region(path, create=False):
+    '''
+    Returns this process' open RegionFile at path, opening it if needed. Missing
+    region files are only created if create is set, otherwise None is returned.
+    '''
+    with _open_regions_lock:
+        region = _open_regions.get(path)
+
+        if region is not None:
+            _open_regions.move_to_end(path)
+            return region
+
+        # Opening the file is the only system call made for a region this process hasn't opened yet.
+        try:
+            region = _open_regions[path] = RegionFile(path, create)
+        except FileNotFoundError:
+            if create:
+                raise
+            return None
+
+        while len(_open_regions) > _MAX_OPEN_REGIONS:
+            _open_regions.popitem(last=False)
+
+        return region
+
+
+def close_region(path):
+    ''' Forgets this process' open RegionFile at path, if any. '''
+    with _open_regions_lock:
+        _open_regions.pop(path, None)
+
+
+def remove_region(path):
+    '''
+    Removes the region file at path, waiting for any other process writing to it to
+    finish first. Processes still reading it keep their copy until they reopen it.
+    '''
+    close_region(path)
+
+    try:
+        if fcntl is None:
+            os.unlink(path)
+            return
+
+        # (Locking a file only needs permission to read it.)
+        fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    except FileNotFoundError:
+        return
+
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+    finally:
+        os.close(fd)
@@ -14,19 +14,38 @@
 
 ''' Helper functions for common tasks in WSGI '''
 
+import hashlib
+import os
 from http import HTTPStatus
 from urllib.parse import parse_qs
 
 from mcmaps.mc.constants import WORLD_TYPE
-from mcmaps.util.misc import SLONG_RANGE
+from mcmaps.util.binary import BINARY_CONTENT_TYPE, BINARY_ENCODINGS, BIOMES_RLE
+from mcmaps.util.misc import CHUNK_RANGE, SLONG_RANGE
 
 __all__ = [
+    'GENERATOR_VERSION',
     'BadRequest',
+    'NotFound',
+    'get_setting',
+    'immutable_headers',
+    'is_not_modified',
     'jsonify_exception',
+    'select_content_encoding',
+    'verify_area_parameters',
     'verify_default_parameters',
+    'verify_format_parameters',
 ]
 
 
+# Version of the output generated for the same request, bumped whenever it changes (like
+# a generator bug fix), so clients and proxies stop using their cached copies of it.
+GENERATOR_VERSION = 1
+
+# Generated output never changes for the same request, so it may be cached for a year (HTTP's maximum).
+_IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
 class HTTPServerException(Exception):
     code = 0
 
@@ -35,6 +54,75 @@ class BadRequest(HTTPServerException):
     code = HTTPStatus.BAD_REQUEST
 
 
+class NotFound(HTTPServerException):
+    code = HTTPStatus.NOT_FOUND
+
+
+def get_setting(env, name, default=None):
+    ''' Reads a setting from the request's environ (Apache's SetEnv), falling back to the process environment. '''
+    return env.get(name, os.environ.get(name, default))
+
+
+def immutable_headers(*key):
+    '''
+    Returns the caching headers of a response that never changes, identified by key
+    (the endpoint and every parameter the response depends on), including its ETag.
+    '''
+    key_hash = hashlib.blake2b(repr((GENERATOR_VERSION,) + key).encode('utf-8'), digest_size=16)
+
+    return {
+        'ETag': '"%s"' % key_hash.hexdigest(),
+        'Cache-Control': _IMMUTABLE_CACHE_CONTROL,
+    }
+
+
+def is_not_modified(env, etag):
+    ''' Returns whether the request's If-None-Match header matches etag, so the client's copy is current. '''
+    if_none_match = env.get('HTTP_IF_NONE_MATCH', '').strip()
+    if if_none_match == '*':
+        return True
+
+    # (If-None-Match always uses the weak comparison, ignoring any "W/" prefix.)
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if (tag[2:] if tag.startswith('W/') else tag) == etag:
+            return True
+
+    return False
+
+
+def select_content_encoding(accept_encoding, codings):
+    '''
+    Returns the content coding of codings (like "gzip") the request's Accept-Encoding
+    header prefers most, the first of them if equally preferred, or None if the response
+    should be sent as is.
+    '''
+    accepted = {}
+    for coding in accept_encoding.split(','):
+        coding, _, params = coding.partition(';')
+        quality = 1.0
+
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+
+        accepted[coding.strip().casefold()] = quality
+
+    selected, selected_quality = None, 0.0
+    for coding in codings:
+        quality = accepted.get(coding, accepted.get('*', 0.0))
+        if quality > selected_quality:
+            selected, selected_quality = coding, quality
+
+    # (Unless the request prefers the response as is, by naming identity.)
+    if accepted.get('identity', 0.0) > selected_quality:
+        return None
+    return selected
+
+
 def verify_default_parameters(query):
     query = parse_qs(query)
 
@@ -61,6 +149,8 @@ def verify_default_parameters(query):
         raise BadRequest('No chunk x coordinate specified. Missing parameter "x"')
     try:
         x = int(query['x'][0])
+        if x not in CHUNK_RANGE:
+            raise ValueError
     except ValueError:
         raise BadRequest('Invalid chunk x integer coordinate specified: ' + query['x'][0]) from None
 
@@ -68,21 +158,72 @@ def verify_default_parameters(query):
         raise BadRequest('No chunk z coordinate specified. Missing parameter "z"')
     try:
         z = int(query['z'][0])
+        if z not in CHUNK_RANGE:
+            raise ValueError
     except ValueError:
         raise BadRequest('Invalid chunk y integer coordinate specified: ' + query['z'][0]) from None
 
     return seed, version, world_type, x, z
 
 
+def verify_area_parameters(query, max_chunks):
+    query = parse_qs(query)
+    sizes = []
+
+    for name, axis in (('w', 'width'), ('d', 'depth')):
+        if not query.get(name):
+            raise BadRequest('No chunk area %s specified. Missing parameter "%s"' % (axis, name))
+        try:
+            size = int(query[name][0])
+            if size < 1:
+                raise ValueError
+        except ValueError:
+            raise BadRequest('Invalid chunk area %s specified: %s' % (axis, query[name][0])) from None
+        sizes.append(size)
+
+    width, depth = sizes
+    if width * depth > max_chunks:
+        raise BadRequest('Chunk area of %sx%s is larger than the maximum of %s chunks' % (width, depth, max_chunks))
+
+    return width, depth
+
+
+def verify_format_parameters(query, accept=''):
+    '''
+    Returns the binary biomes encoding selected by the "fmt" parameter (json, raw, rle
+    or zlib), or run length encoding if the Accept header asks for binary biomes,
+    otherwise None for JSON.
+    '''
+    query = parse_qs(query)
+
+    if query.get('fmt'):
+        response_format = query['fmt'][0].casefold()
+        if response_format == 'json':
+            return None
+        if response_format not in BINARY_ENCODINGS:
+            raise BadRequest('Invalid response format specified: ' + query['fmt'][0])
+        return BINARY_ENCODINGS[response_format]
+
+    return BIOMES_RLE if BINARY_CONTENT_TYPE in accept else None
+
+
 def jsonify_exception(application):
     import json, os
     from functools import wraps
     from traceback import format_exc
+    from types import GeneratorType
 
     @wraps(application)
     def wrapped_app(env, start_response):
         try:
-            yield from application(env, start_response)
+            response = application(env, start_response)
+
+            # Generators only run once iterated, so run them here to catch their errors.
+            # (Any other response, like a wsgi.file_wrapper, is passed on to the server as is.)
+            if isinstance(response, GeneratorType):
+                response = list(response)
+
+            return response
         except Exception as err:
             if isinstance(err, HTTPServerException):
                 response_code = err.code
@@ -99,6 +240,6 @@ def jsonify_exception(application):
                 '%s %s' % (response_code.value, response_code.phrase),
                 [('Content-Type', 'application/json')],
             )
-            yield json.dumps(body, indent=2 if os.environ.get('DEBUG_HTTP') else None).encode('us-ascii')
+            return [json.dumps(body, indent=2 if os.environ.get('DEBUG_HTTP') else None).encode('us-ascii')]
 
     return wrapped_app
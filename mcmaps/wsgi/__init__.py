@@ -17,12 +17,14 @@
 __all__ = ['apps']
 
 from . import (
-    env, biomes, layers, seed,
+    env, area, biomes, image, layers, seed,
 )
 
 apps = [
     env.application,
+    area.application,
     biomes.application,
+    image.application,
     layers.application,
     seed.application,
 ]
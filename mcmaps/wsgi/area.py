@@ -0,0 +1,94 @@
+# Copyright 2020 Lane Shaw
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+''' Generates the biome maps of a whole area of chunks at once based on MC version '''
+
+import os
+from http import HTTPStatus
+
+from mcmaps.util.binary import BINARY_CONTENT_TYPE, reencode_biomes
+from mcmaps.util.chunks import CONTENT_ENCODINGS, compress_json, get_world_cache, load_chunks
+from mcmaps.util.region import CHUNK_BINARY
+from mcmaps.util.wsgi import (
+    get_setting,
+    immutable_headers,
+    is_not_modified,
+    jsonify_exception,
+    select_content_encoding,
+    verify_area_parameters,
+    verify_default_parameters,
+    verify_format_parameters,
+)
+
+__all__ = ('application',)
+
+
+@jsonify_exception
+def application(env, start_response):
+    response_code = HTTPStatus.OK
+    response_headers = {}
+    doc_root = env.get('CONTEXT_DOCUMENT_ROOT', os.getcwd())
+
+    # The area's chunks start at (x, z), and span w chunks along the X axis by d along the Z axis.
+    seed, version, world_type, x, z = verify_default_parameters(env['QUERY_STRING'])
+    width, depth = verify_area_parameters(env['QUERY_STRING'], int(get_setting(env, 'MCMAPS_AREA_MAX_CHUNKS', 1024)))
+    encoding = verify_format_parameters(env['QUERY_STRING'], env.get('HTTP_ACCEPT', ''))
+
+    # JSON data is compressed like the biomes endpoint's, while binary data is already compact.
+    content_encoding = None
+    if encoding is None:
+        content_encoding = select_content_encoding(env.get('HTTP_ACCEPT_ENCODING', ''), CONTENT_ENCODINGS)
+
+    # An area's data never changes, so clients still holding it don't even touch the cache.
+    response_headers.update(immutable_headers(
+        'area', version, world_type.name, seed, x, z, width, depth, encoding, content_encoding,
+    ))
+    response_headers['Vary'] = 'Accept, Accept-Encoding'
+    if is_not_modified(env, response_headers['ETag']):
+        response_code = HTTPStatus.NOT_MODIFIED
+        start_response(
+            '%s %s' % (response_code.value, response_code.phrase),
+            list(response_headers.items()),
+        )
+        return
+
+    cache = get_world_cache(env, doc_root)
+
+    chunks = [
+        (chunk_x, chunk_z)
+        for chunk_z in range(z, z + depth)
+        for chunk_x in range(x, x + width)
+    ]
+
+    # Every chunk's cached data is passed through as is, row by row along the X axis.
+    if encoding is None:
+        bodies = load_chunks(env, cache, doc_root, version, world_type, seed, chunks)
+        body = b''.join((b'{"chunks": [', b', '.join(bodies), b']}'))
+        response_headers['Content-Type'] = 'application/json'
+
+        # (Chunks precompressed separately can't be joined into one stream, so the whole area is compressed.)
+        if content_encoding is not None:
+            body = compress_json(body, CONTENT_ENCODINGS[content_encoding])
+            response_headers['Content-Encoding'] = content_encoding
+    else:
+        # (Binary chunks are self delimiting, so they're simply concatenated.)
+        bodies = load_chunks(env, cache, doc_root, version, world_type, seed, chunks, CHUNK_BINARY)
+        body = b''.join(reencode_biomes(body, encoding) for body in bodies)
+        response_headers['Content-Type'] = BINARY_CONTENT_TYPE
+
+    start_response(
+        '%s %s' % (response_code.value, response_code.phrase),
+        list(response_headers.items()),
+    )
+    yield body
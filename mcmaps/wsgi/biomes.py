@@ -14,105 +14,90 @@
 
 ''' Generates a chunk's biome map based on MC version '''
 
-import json, os, pickle
+import os
 from http import HTTPStatus
-from PIL import Image
 
-from mcmaps.mc.chunks import hashChunkXZ
-from mcmaps.util.common import ensure_world_paths
+from mcmaps.util.binary import BINARY_CONTENT_TYPE, BIOMES_RLE, reencode_biomes
+from mcmaps.util.chunks import CONTENT_ENCODINGS, get_world_cache, load_chunks
+from mcmaps.util.region import CHUNK_BINARY, CHUNK_JSON
 from mcmaps.util.wsgi import (
+    get_setting,
+    immutable_headers,
+    is_not_modified,
     jsonify_exception,
+    select_content_encoding,
     verify_default_parameters,
+    verify_format_parameters,
 )
 
 __all__ = ('application',)
 
 
-def _ensure_generator(dim_folder, seed, world_type):
-    generator_path = os.path.join(dim_folder, 'generator.pickled')
-    if os.path.exists(generator_path):
-        with open(generator_path, 'rb') as gen_file:
-            return pickle.load(gen_file)
-
-    # Load the generator and pickle a raw copy of it.
-    from mcmaps.mc.biomes import initialize_all_biomes
-    biome_generator, _ = initialize_all_biomes(seed, world_type)
-
-    with open(generator_path, 'wb') as gen_file:
-        pickle.dump(biome_generator, gen_file)
-
-    return biome_generator
-
-
 @jsonify_exception
 def application(env, start_response):
     response_code = HTTPStatus.OK
     response_headers = {}
-    body = {}
     doc_root = env.get('CONTEXT_DOCUMENT_ROOT', os.getcwd())
 
     seed, version, world_type, x, z = verify_default_parameters(env['QUERY_STRING'])
-    world_type_name = world_type.name.casefold()
-    chunk_hash = str(hashChunkXZ(x, z)).rjust(20, '0')
-
-    # World relative folders.
-    world_path = os.path.join(
-        doc_root, 'world_cache',
-        version, world_type_name, str(seed),
-    )
-    dim_path = os.path.join(world_path, 'DIM0')
-    image_comp = (version, world_type_name, str(seed), 'DIM0', 'biomes', 'img', chunk_hash)
-    chunk_path = os.path.join(dim_path, 'biomes', chunk_hash + '.json')
-    image_path = os.path.join(dim_path, 'biomes', 'img', chunk_hash + '.png')
-
-    ensure_world_paths(world_path)
-
-    # Load our existing biome data if it was already generated.
-    if os.path.exists(chunk_path):
-        with open(chunk_path, 'rb') as json_file:
-            body = json_file.read()
+    encoding = verify_format_parameters(env['QUERY_STRING'], env.get('HTTP_ACCEPT', ''))
 
+    # JSON data is cached precompressed as well, while binary data is already compact.
+    if encoding is None:
+        content_encoding = select_content_encoding(env.get('HTTP_ACCEPT_ENCODING', ''), CONTENT_ENCODINGS)
+        record = CONTENT_ENCODINGS.get(content_encoding, CHUNK_JSON)
         response_headers['Content-Type'] = 'application/json'
+    else:
+        content_encoding = None
+        record = CHUNK_BINARY
+        response_headers['Content-Type'] = BINARY_CONTENT_TYPE
+
+    if content_encoding is not None:
+        response_headers['Content-Encoding'] = content_encoding
+
+    # A chunk's data never changes, so clients still holding it don't even touch the cache.
+    response_headers.update(immutable_headers(
+        'biomes', version, world_type.name, seed, x, z, encoding, content_encoding,
+    ))
+    response_headers['Vary'] = 'Accept, Accept-Encoding'
+    if is_not_modified(env, response_headers['ETag']):
+        del response_headers['Content-Type']
+        response_headers.pop('Content-Encoding', None)
+
+        response_code = HTTPStatus.NOT_MODIFIED
         start_response(
             '%s %s' % (response_code.value, response_code.phrase),
             list(response_headers.items()),
         )
-        yield body
-        return
-
-    # Load our cached generator, if it was already generated itself.
-    generator = _ensure_generator(dim_path, seed, world_type)
-
-    # Generate the biome data and cache it.
-    r = range(16)
-    area = generator.get_area(x << 4, z << 4, 16, 16)
-    biomes = []
-    for az in r:
-        for ax in r:
-            biomes.append(area[ax][az])
-
-    # Generate the chunk image and save it.
-    Image.frombytes(
-        mode='RGB',
-        size=(16, 16),
-        data=b''.join(bytes(biome.color) for biome in biomes),
-    ).save(image_path, optimize=True)
-
-    # Create our API JSON data and cache it.
-    body = json.dumps({
-        'x': x, 'z': z,
-        'hash': chunk_hash,
-        'biomes': sorted(map(int, set(biomes))),
-        'values': list(map(int, biomes)),
-        'image': '/' + '/'.join(('cache', *image_comp)) + '.png',
-    }).encode('us-ascii')
-
-    with open(chunk_path, 'wb') as json_file:
-        json_file.write(body)
-
-    response_headers['Content-Type'] = 'application/json'
+        return []
+
+    cache = get_world_cache(env, doc_root)
+
+    # Cached records are sent straight from their files by the server, if it's able to.
+    # (Such as mod_wsgi's wsgi.file_wrapper, which only sends up to the Content-Length.)
+    file_wrapper = env.get('wsgi.file_wrapper')
+    if file_wrapper is not None and get_setting(env, 'MCMAPS_CACHE_SENDFILE', '0') == '1' and \
+            encoding in (None, BIOMES_RLE):
+        world = (version, world_type.name.casefold(), str(seed), 'DIM0')
+        record_file = cache.get_file(world, 'biomes', x, z, record)
+
+        if record_file is not None:
+            record_file, length = record_file
+            response_headers['Content-Length'] = str(length)
+            start_response(
+                '%s %s' % (response_code.value, response_code.phrase),
+                list(response_headers.items()),
+            )
+            return file_wrapper(record_file)
+
+    # Load our existing biome data, generating it if it wasn't yet. (Only the cache is touched on a hit.)
+    body, = load_chunks(env, cache, doc_root, version, world_type, seed, [(x, z)], record)
+    if encoding is not None:
+        body = reencode_biomes(body, encoding)
+
+    response_headers['Content-Length'] = str(len(body))
     start_response(
         '%s %s' % (response_code.value, response_code.phrase),
         list(response_headers.items()),
     )
-    yield body
+    return [body]
@@ -12,10 +12,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import json, os
+import json
 from http import HTTPStatus
 
-from mcmaps.util.common import ensure_world_paths
 from mcmaps.util.wsgi import (
     jsonify_exception,
     verify_default_parameters,
@@ -29,15 +28,8 @@ def application(env, start_response):
     response_code = HTTPStatus.OK
     response_headers = {}
     body = {}
-    doc_root = env.get('CONTEXT_DOCUMENT_ROOT', os.getcwd())
 
     seed, version, world_type, x, z = verify_default_parameters(env['QUERY_STRING'])
-    world_type_name = world_type.name.casefold()
-    world_path = os.path.join(
-        doc_root, 'world_cache',
-        version, world_type_name, str(seed),
-    )
-    ensure_world_paths(world_path)
 
     body = json.dumps(body)
     response_headers['Content-Type'] = 'application/json'
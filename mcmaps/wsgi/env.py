@@ -16,12 +16,15 @@ import json
 import os
 import sys
 
+from mcmaps.util.cache import get_cache_backend
+
 __all__ = ('application',)
 
 
 def application(env, start_response):
     env['python.version'] = tuple(sys.version_info)
     env['python.cwd'] = os.getcwd()
+    env['mcmaps.cache'] = get_cache_backend(env, env.get('CONTEXT_DOCUMENT_ROOT', os.getcwd()))
     response_header = [('Content-Type', 'application/json')]
     start_response('200 OK', response_header)
     yield json.dumps({
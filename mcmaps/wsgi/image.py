@@ -0,0 +1,60 @@
+# Copyright 2020 Lane Shaw
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+''' Serves a chunk's biome map image, generating it if it wasn't yet '''
+
+import os
+from http import HTTPStatus
+
+from mcmaps.util.chunks import get_world_cache, load_chunks
+from mcmaps.util.region import CHUNK_IMAGE
+from mcmaps.util.wsgi import (
+    immutable_headers,
+    is_not_modified,
+    jsonify_exception,
+    verify_default_parameters,
+)
+
+__all__ = ('application',)
+
+
+@jsonify_exception
+def application(env, start_response):
+    response_code = HTTPStatus.OK
+    response_headers = {}
+    doc_root = env.get('CONTEXT_DOCUMENT_ROOT', os.getcwd())
+
+    seed, version, world_type, x, z = verify_default_parameters(env['QUERY_STRING'])
+
+    # A chunk's image never changes, so clients still holding it don't even touch the cache.
+    response_headers.update(immutable_headers('image', version, world_type.name, seed, x, z))
+    if is_not_modified(env, response_headers['ETag']):
+        response_code = HTTPStatus.NOT_MODIFIED
+        start_response(
+            '%s %s' % (response_code.value, response_code.phrase),
+            list(response_headers.items()),
+        )
+        return
+
+    # Images are cached along with the chunk's biome data, possibly still being cached by another
+    # process (or not cached there at all, for the memory backend), so they're loaded the same way.
+    cache = get_world_cache(env, doc_root)
+    body, = load_chunks(env, cache, doc_root, version, world_type, seed, [(x, z)], CHUNK_IMAGE)
+
+    response_headers['Content-Type'] = 'image/png'
+    start_response(
+        '%s %s' % (response_code.value, response_code.phrase),
+        list(response_headers.items()),
+    )
+    yield body
@@ -14,10 +14,9 @@
 
 ''' Generates the individual layers of a chunk based on MC version '''
 
-import json, os
+import json
 from http import HTTPStatus
 
-from mcmaps.util.common import ensure_world_paths
 from mcmaps.util.wsgi import (
     jsonify_exception,
     verify_default_parameters,
@@ -31,15 +30,8 @@ def application(env, start_response):
     response_code = HTTPStatus.OK
     response_headers = {}
     body = {}
-    doc_root = env.get('CONTEXT_DOCUMENT_ROOT', os.getcwd())
 
     seed, version, world_type, x, z = verify_default_parameters(env['QUERY_STRING'])
-    world_type_name = world_type.name.casefold()
-    world_path = os.path.join(
-        doc_root, 'world_cache',
-        version, world_type_name, str(seed),
-    )
-    ensure_world_paths(world_path)
 
     body = json.dumps(body)
     response_headers['Content-Type'] = 'application/json'
@@ -18,6 +18,7 @@ from urllib.parse import parse_qs
 
 from mcmaps.java.string import hashCode
 from mcmaps.util.misc import SLONG_RANGE
+from mcmaps.util.wsgi import immutable_headers, is_not_modified
 
 __all__ = ('application',)
 
@@ -26,6 +27,12 @@ def application(env, start_response):
     query = parse_qs(env['QUERY_STRING'])
     seed_text = query.get('seed', ('',))[0] or 0
 
+    # A seed's number never changes, so clients still holding it needn't be sent it again.
+    response_headers = immutable_headers('seed', str(seed_text))
+    if is_not_modified(env, response_headers['ETag']):
+        start_response('304 Not Modified', list(response_headers.items()))
+        return []
+
     try:
         seed = int(seed_text)
         if seed not in SLONG_RANGE:
@@ -33,5 +40,5 @@ def application(env, start_response):
     except ValueError:
         seed = hashCode(seed_text)
 
-    start_response('200 OK', [])
+    start_response('200 OK', list(response_headers.items()))
     return [str(seed).encode()]
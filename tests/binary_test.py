@@ -0,0 +1,62 @@
+# Copyright 2020 Lane Shaw
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''
+Tests for the mcmaps.util.binary module.
+
+Meant for use with py.test.
+Write each test as a function named test_<something>.
+Read more here: http://pytest.org/
+'''
+
+import json
+
+import pytest
+
+from mcmaps.mc.biomes import initialize_all_biomes
+from mcmaps.mc.constants import WORLD_TYPE
+from mcmaps.util.binary import (
+    BIOMES_RAW, BIOMES_RLE, BIOMES_ZLIB,
+    decode_biomes, encode_biomes, reencode_biomes,
+)
+from mcmaps.util.chunks import _chunk_binary, _chunk_json
+
+
+@pytest.mark.parametrize('encoding', [BIOMES_RAW, BIOMES_RLE, BIOMES_ZLIB])
+def test_round_trip(encoding):
+    biome_generator, _ = initialize_all_biomes(12345, WORLD_TYPE.DEFAULT)
+    area = biome_generator.get_area(-48, 32, 16, 16)
+    chunk = json.loads(_chunk_json('1.6.4', 'default', 12345, -3, 2, area))
+
+    data = reencode_biomes(_chunk_binary(-3, 2, area), encoding)
+    x, z, values, end = decode_biomes(data)
+
+    assert (x, z, values.tolist()) == (chunk['x'], chunk['z'], chunk['values'])
+    assert sorted(set(values.tolist())) == chunk['biomes']
+    assert end == len(data)
+
+
+def test_run_length_encoding():
+    values = [1] * 100 + [-1] * 56 + [22] * 100
+    data = encode_biomes(7, -8, values)
+
+    # A header, then two bytes per run.
+    assert len(data) == 16 + 3 * 2
+    assert decode_biomes(data)[2].tolist() == values
+    assert len(encode_biomes(0, 0, [5] * 256)) == 16 + 2
+
+    # Chunks are self delimiting, so they're simply concatenated.
+    data += encode_biomes(8, -8, [2] * 256, BIOMES_ZLIB)
+    x, z, second, end = decode_biomes(data, decode_biomes(data)[3])
+    assert (x, z, second.tolist(), end) == (8, -8, [2] * 256, len(data))
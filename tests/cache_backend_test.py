@@ -0,0 +1,185 @@
+# Copyright 2020 Lane Shaw
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''
+Tests for the mcmaps.util.cache module.
+
+Meant for use with py.test.
+Write each test as a function named test_<something>.
+Read more here: http://pytest.org/
+'''
+
+import os
+from threading import Event
+
+import pytest
+
+from mcmaps.util.cache import (
+    FilesystemBackend,
+    HotCacheBackend,
+    MemoryBackend,
+    SQLiteBackend,
+    WriteBehindBackend,
+    get_cache_backend,
+)
+from mcmaps.util.eviction import CacheIndex
+from mcmaps.util.region import CHUNK_IMAGE, CHUNK_JSON, RegionFile, region_path
+
+WORLD = ('1.6.4', 'default', '12345', 'DIM0')
+
+
+@pytest.mark.parametrize('backend_type', ['filesystem', 'sqlite', 'memory', 'write-behind', 'hot'])
+def test_cache_backend(tmp_path, backend_type):
+    if backend_type == 'filesystem':
+        cache = FilesystemBackend(str(tmp_path))
+    elif backend_type == 'sqlite':
+        cache = SQLiteBackend(str(tmp_path / 'cache.sqlite3'))
+    elif backend_type == 'memory':
+        cache = MemoryBackend()
+    elif backend_type == 'write-behind':
+        cache = WriteBehindBackend(MemoryBackend())
+    else:
+        cache = HotCacheBackend(SQLiteBackend(str(tmp_path / 'cache.sqlite3')))
+
+    assert cache.get(WORLD, 'biomes', -1, 0, CHUNK_JSON) is None
+
+    cache.put(WORLD, 'biomes', [
+        (-1, 0, CHUNK_JSON, b'{"x": -1}'),
+        (-1, 0, CHUNK_IMAGE, b'PNG'),
+        (32, 0, CHUNK_JSON, b'{"x": 32}'),
+    ])
+
+    # Cached records are kept as they are.
+    cache.put(WORLD, 'biomes', [(-1, 0, CHUNK_JSON, b'{"x": "changed"}')])
+
+    assert cache.get(WORLD, 'biomes', -1, 0, CHUNK_JSON) == b'{"x": -1}'
+    assert cache.get(WORLD, 'biomes', -1, 0, CHUNK_IMAGE) == b'PNG'
+    assert cache.get(WORLD, 'biomes', 32, 0, CHUNK_JSON) == b'{"x": 32}'
+    assert cache.get(WORLD, 'biomes', 32, 0, CHUNK_IMAGE) is None
+    assert cache.get(WORLD, 'layers', -1, 0, CHUNK_JSON) is None
+    assert cache.get(WORLD[:3] + ('DIM-1',), 'biomes', -1, 0, CHUNK_JSON) is None
+
+
+def test_get_file(tmp_path):
+    cache = HotCacheBackend(WriteBehindBackend(FilesystemBackend(str(tmp_path))))
+    cache.put(WORLD, 'biomes', [(-1, 0, CHUNK_JSON, b'{"x": -1}'), (-2, 0, CHUNK_JSON, b'{"x": -2}')])
+
+    # Records are sent straight from the region file, starting at their offset.
+    record_file, length = cache.get_file(WORLD, 'biomes', -2, 0, CHUNK_JSON)
+    with record_file:
+        assert record_file.read(length) == b'{"x": -2}'
+
+    assert cache.get_file(WORLD, 'biomes', -1, 0, CHUNK_IMAGE) is None
+    assert cache.get_file(WORLD, 'biomes', 0, 0, CHUNK_JSON) is None
+    assert MemoryBackend().get_file(WORLD, 'biomes', -1, 0, CHUNK_JSON) is None
+
+
+def test_get_file_recreated(tmp_path):
+    cache = FilesystemBackend(str(tmp_path))
+    cache.put(WORLD, 'biomes', [(0, 0, CHUNK_JSON, b'{"x": 0, "old": true}')])
+    assert cache.get(WORLD, 'biomes', 0, 0, CHUNK_JSON) == b'{"x": 0, "old": true}'
+
+    # Another process evicts the region, and a third creates it again with other records first.
+    path = os.path.join(str(tmp_path), region_path(os.path.join(*WORLD, 'biomes'), 0, 0))
+    os.unlink(path)
+    RegionFile(path).write([(1, 0, CHUNK_JSON, b'{"x": 1}'), (0, 0, CHUNK_JSON, b'{"x": 0, "new": true}')])
+
+    # Records are never sent from the offsets of the region file this process still has open.
+    assert cache.get(WORLD, 'biomes', 0, 0, CHUNK_JSON) == b'{"x": 0, "old": true}'
+    assert cache.get_file(WORLD, 'biomes', 0, 0, CHUNK_JSON) is None
+
+
+def test_memory_backend_eviction():
+    cache = MemoryBackend(max_bytes=8)
+    cache.put(WORLD, 'biomes', [(0, 0, CHUNK_JSON, b'1234'), (1, 0, CHUNK_JSON, b'1234')])
+    cache.get(WORLD, 'biomes', 0, 0, CHUNK_JSON)
+    cache.put(WORLD, 'biomes', [(2, 0, CHUNK_JSON, b'1234')])
+
+    # The least recently used record is evicted to stay within budget.
+    assert cache.used_bytes == 8
+    assert cache.get(WORLD, 'biomes', 1, 0, CHUNK_JSON) is None
+    assert cache.get(WORLD, 'biomes', 0, 0, CHUNK_JSON) == b'1234'
+    assert cache.get(WORLD, 'biomes', 2, 0, CHUNK_JSON) == b'1234'
+
+
+def test_hot_cache_backend(tmp_path):
+    cache = HotCacheBackend(FilesystemBackend(str(tmp_path)), max_bytes=8)
+    cache.put(WORLD, 'biomes', [(0, 0, CHUNK_JSON, b'1234'), (1, 0, CHUNK_JSON, b'12345678')])
+
+    # Records are only kept in memory once they're used, and within budget.
+    assert cache.hot.used_bytes == 0
+    assert cache.get(WORLD, 'biomes', 0, 0, CHUNK_JSON) == b'1234'
+    assert cache.get(WORLD, 'biomes', 0, 0, CHUNK_JSON) == b'1234'
+    assert (cache.hot.hits, cache.hot.misses) == (1, 1)
+
+    assert cache.get(WORLD, 'biomes', 1, 0, CHUNK_JSON) == b'12345678'
+    assert cache.hot.used_bytes == 8
+    assert cache.get(WORLD, 'biomes', 0, 0, CHUNK_JSON) == b'1234'
+    assert cache.hot.hit_ratio == 0.25
+
+
+def test_write_behind_backend():
+    cache = WriteBehindBackend(MemoryBackend())
+    produced = Event()
+
+    def records():
+        produced.wait()
+        yield 0, 0, CHUNK_JSON, b'{"x": 0}'
+
+    # Records are produced and cached in the background, while getting them waits.
+    cache.put_later(WORLD, 'biomes', [(0, 0), (1, 0)], records)
+    assert cache.backend.get(WORLD, 'biomes', 0, 0, CHUNK_JSON) is None
+
+    produced.set()
+    assert cache.get(WORLD, 'biomes', 0, 0, CHUNK_JSON) == b'{"x": 0}'
+    assert cache.get(WORLD, 'biomes', 1, 0, CHUNK_JSON) is None
+
+    cache.put(WORLD, 'biomes', [(2, 0, CHUNK_JSON, b'{"x": 2}')])
+    cache.flush()
+    assert cache.backend.get(WORLD, 'biomes', 2, 0, CHUNK_JSON) == b'{"x": 2}'
+
+
+def test_flush(tmp_path):
+    cache = HotCacheBackend(WriteBehindBackend(FilesystemBackend(str(tmp_path), CacheIndex(str(tmp_path)))))
+    cache.put(WORLD, 'biomes', [(0, 0, CHUNK_JSON, b'{"x": 0}')])
+
+    # Flushing writes the records, then their accesses, all the way through.
+    cache.flush()
+    index = cache.backend.backend.index
+    assert index._connection().execute('SELECT hits FROM regions').fetchall() == [(1,)]
+
+
+def test_get_cache_backend(tmp_path):
+    doc_root = str(tmp_path)
+
+    # Backends are layered below a hot cache and writing behind, by default.
+    cache = get_cache_backend({}, doc_root)
+    assert isinstance(cache, HotCacheBackend)
+    assert isinstance(cache.backend, WriteBehindBackend)
+    assert isinstance(cache.backend.backend, FilesystemBackend)
+    assert isinstance(get_cache_backend({'MCMAPS_CACHE_BACKEND': 'memory'}, doc_root).backend, MemoryBackend)
+
+    cache = get_cache_backend({'MCMAPS_CACHE_BACKEND': 'memory', 'MCMAPS_CACHE_MEMORY_SIZE': '1M'}, doc_root)
+    assert cache.backend.max_bytes == 1 << 20
+
+    cache = get_cache_backend({
+        'MCMAPS_CACHE_BACKEND': 'sqlite',
+        'MCMAPS_CACHE_WRITE_QUEUE': '0',
+        'MCMAPS_CACHE_HOT_SIZE': '0',
+    }, doc_root)
+    assert isinstance(cache, SQLiteBackend)
+    assert get_cache_backend({'MCMAPS_CACHE_BACKEND': 'sqlite', 'MCMAPS_CACHE_HOT_SIZE': '0'}, doc_root).backend is cache
+
+    with pytest.raises(ValueError):
+        get_cache_backend({'MCMAPS_CACHE_BACKEND': 'unknown'}, doc_root)
@@ -0,0 +1,122 @@
+# Copyright 2020 Lane Shaw
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''
+Tests for the mcmaps.mc.biomes.cache module.
+
+Meant for use with py.test.
+Write each test as a function named test_<something>.
+Read more here: http://pytest.org/
+'''
+
+import pickle
+import time
+
+from mcmaps.mc.biomes import (
+    BiomeGrid, IslandLayer, RiverLayer, RiverMixerLayer,
+    SharedLayer, SmoothLayer, TileCache, initialize_all_biomes,
+)
+from mcmaps.mc.constants import WORLD_TYPE
+
+TEST_AREAS = (
+    (0, 0, 16, 16),
+    (-16, -32, 16, 16),
+    (-101, 55, 31, 17),
+    (7, -3, 64, 9),
+)
+
+
+def test_cached_areas():
+    tile_cache = TileCache(tile_size=16)
+    biome_generator, index_generator = initialize_all_biomes(12345, WORLD_TYPE.DEFAULT)
+    cached_biome_generator, cached_index_generator = initialize_all_biomes(
+        12345, WORLD_TYPE.DEFAULT, tile_cache=tile_cache,
+    )
+
+    # Request every area twice so the second pass is served from the cache.
+    for _ in range(2):
+        for area in TEST_AREAS:
+            assert cached_biome_generator.get_area(*area) == biome_generator.get_area(*area)
+            assert cached_index_generator.get_area(*area) == index_generator.get_area(*area)
+
+    assert tile_cache.hits and tile_cache.misses
+
+
+def test_small_budget():
+    biome_generator, _ = initialize_all_biomes(12345, WORLD_TYPE.DEFAULT)
+    expected_area = biome_generator.get_area(-16, 32, 16, 16)
+
+    # Budgets smaller than a request's tiles only cost regenerating them for later requests.
+    for max_bytes in (256 << 10, 0):
+        tile_cache = TileCache(max_bytes=max_bytes)
+        cached_biome_generator, _ = initialize_all_biomes(12345, WORLD_TYPE.DEFAULT, tile_cache=tile_cache)
+
+        start_time = time.perf_counter()
+        assert cached_biome_generator.get_area(-16, 32, 16, 16) == expected_area
+        assert time.perf_counter() - start_time < 10
+        assert tile_cache.used_bytes <= max(max_bytes, 32 * 32)
+
+
+def test_cached_pickle():
+    biome_generator, _ = initialize_all_biomes(1, WORLD_TYPE.DEFAULT, tile_cache=TileCache())
+    unpickled_generator = pickle.loads(pickle.dumps(biome_generator))
+
+    assert repr(unpickled_generator).count('CachedLayer') == 0
+    assert unpickled_generator.get_area(0, 0, 16, 16) == biome_generator.get_area(0, 0, 16, 16)
+
+
+def test_eviction():
+    tile_cache = TileCache(max_bytes=64 * 3, tile_size=8)
+
+    for tile_x in range(5):
+        tile_cache.put(tile_x, BiomeGrid.empty(tile_x * 8, 0, 8, 8))
+    tile_cache.get(2)
+    tile_cache.put(5, BiomeGrid.empty(40, 0, 8, 8))
+
+    assert len(tile_cache) == 3
+    assert tile_cache.used_bytes == 64 * 3
+    assert tile_cache.get(2) is not None
+    assert tile_cache.get(0) is None
+
+
+class _CountingIslandLayer(IslandLayer):
+    __slots__ = ('areas',)
+
+    def get_area(self, x_pos, z_pos, x_width, z_depth):
+        self.areas.append((x_pos, z_pos, x_width, z_depth))
+        return super().get_area(x_pos, z_pos, x_width, z_depth)
+
+
+def _mixed_layers(island_layer):
+    layer = RiverMixerLayer(
+        100,
+        child=SmoothLayer(1000, island_layer),
+        child_river=RiverLayer(1, island_layer),
+    )
+    layer.init_world_seed(8)
+    return layer
+
+
+def test_shared_layer():
+    island_layer = _CountingIslandLayer(1)
+    island_layer.areas = []
+    shared_island_layer = _CountingIslandLayer(1)
+    shared_island_layer.areas = []
+
+    expected_area = _mixed_layers(island_layer).get_area(-5, 3, 12, 7)
+    shared_area = _mixed_layers(SharedLayer(shared_island_layer)).get_area(-5, 3, 12, 7)
+
+    assert shared_area == expected_area
+    assert len(island_layer.areas) == 2
+    assert shared_island_layer.areas == [(-6, 2, 14, 9)]
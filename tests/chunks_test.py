@@ -0,0 +1,54 @@
+# Copyright 2020 Lane Shaw
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''
+Tests for the mcmaps.util.chunks module.
+
+Meant for use with py.test.
+Write each test as a function named test_<something>.
+Read more here: http://pytest.org/
+'''
+
+import errno
+import os
+
+import pytest
+
+from mcmaps.mc.constants import WORLD_TYPE
+from mcmaps.util.cache import MemoryBackend
+from mcmaps.util.chunks import load_chunks
+from mcmaps.util.locks import get_key_locks
+
+
+class _FullBackend(MemoryBackend):
+    __slots__ = ()
+
+    def put(self, world, kind, records):
+        raise OSError(errno.ENOSPC, os.strerror(errno.ENOSPC))
+
+
+def test_failed_caching(tmp_path):
+    doc_root = str(tmp_path)
+    env = {'MCMAPS_REGION_SIZE': '16'}
+
+    # The cache's own error is raised, after the region's lock was released (only once).
+    with pytest.raises(OSError) as error:
+        load_chunks(env, _FullBackend(), doc_root, '1.6.4', WORLD_TYPE.DEFAULT, 12345, [(0, 0)])
+    assert error.value.errno == errno.ENOSPC
+
+    release = get_key_locks(os.path.join(doc_root, 'world_cache', 'locks')).acquire(
+        ('1.6.4', 'default', 12345, 0, 0, 1), timeout=0.1,
+    )
+    assert release is not None
+    release()
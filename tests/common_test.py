@@ -0,0 +1,84 @@
+# Copyright 2020 Lane Shaw
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''
+Tests for the mcmaps.util.common module.
+
+Meant for use with py.test.
+Write each test as a function named test_<something>.
+Read more here: http://pytest.org/
+'''
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from mcmaps.util.common import GeneratorCache, ensure_path
+
+
+def test_generator_cache():
+    cache = GeneratorCache(max_size=2)
+    loads = []
+
+    def loader(key):
+        def load():
+            loads.append(key)
+            return object()
+        return load
+
+    first = cache.get(('1.6.4', 'default', 1), loader(1))
+    assert cache.get(('1.6.4', 'default', 1), loader(1)) is first
+    cache.get(('1.6.4', 'default', 2), loader(2))
+
+    # Using the first generator again makes the second one the least recently used.
+    cache.get(('1.6.4', 'default', 1), loader(1))
+    cache.get(('1.6.4', 'default', 3), loader(3))
+
+    assert loads == [1, 2, 3]
+    assert (cache.hits, cache.misses) == (2, 3)
+    assert ('1.6.4', 'default', 1) in cache
+    assert ('1.6.4', 'default', 2) not in cache
+    assert len(cache) == 2
+
+
+def test_generator_cache_single_load():
+    cache = GeneratorCache()
+    loads = []
+
+    def load():
+        loads.append(1)
+        time.sleep(0.05)
+        return object()
+
+    # Threads missing the same generator at once wait for a single load of it.
+    with ThreadPoolExecutor(8) as executor:
+        generators = list(executor.map(lambda _: cache.get(('1.6.4', 'default', 1), load), range(8)))
+
+    assert loads == [1]
+    assert all(generator is generators[0] for generator in generators)
+    assert not cache._loading
+
+
+def test_ensure_path(tmp_path):
+    path = str(tmp_path / 'world' / 'DIM0' / 'biomes')
+    ensure_path(path)
+    assert os.path.isdir(path)
+
+    # Known folders aren't created again, unless rechecked.
+    os.rmdir(path)
+    ensure_path(path)
+    assert not os.path.exists(path)
+
+    ensure_path(path, recheck=True)
+    assert os.path.isdir(path)
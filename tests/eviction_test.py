@@ -0,0 +1,100 @@
+# Copyright 2020 Lane Shaw
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''
+Tests for the mcmaps.util.eviction module.
+
+Meant for use with py.test.
+Write each test as a function named test_<something>.
+Read more here: http://pytest.org/
+'''
+
+import os
+import time
+
+from mcmaps.util.cache import FilesystemBackend
+from mcmaps.util.eviction import CacheIndex, evict, parse_size, parse_worlds
+from mcmaps.util.region import CHUNK_JSON
+
+
+def test_parse_size():
+    assert parse_size(512) == 512
+    assert parse_size('10K') == 10 << 10
+    assert parse_size('1.5gb') == 3 << 29
+
+
+def test_parse_worlds():
+    assert parse_worlds('') == set()
+    assert parse_worlds('1.6.4:DEFAULT:012, 1.6.4:large_biomes:-5') == {'1.6.4:default:12', '1.6.4:large_biomes:-5'}
+
+
+def _cache_worlds(tmp_path, *seeds):
+    cache = FilesystemBackend(str(tmp_path), CacheIndex(str(tmp_path)))
+
+    # Every world caches two regions, the first of them used most.
+    for seed in seeds:
+        world = ('1.6.4', 'default', str(seed), 'DIM0')
+        cache.put(world, 'biomes', [(0, 0, CHUNK_JSON, bytes(100)), (32, 0, CHUNK_JSON, bytes(100))])
+        cache.get(world, 'biomes', 0, 0, CHUNK_JSON)
+
+    cache.index.flush()
+    return cache
+
+
+def test_index_flush(tmp_path):
+    cache = FilesystemBackend(str(tmp_path), CacheIndex(str(tmp_path), flush_interval=0.05))
+    world = ('1.6.4', 'default', '1', 'DIM0')
+    cache.put(world, 'biomes', [(0, 0, CHUNK_JSON, bytes(100))])
+    cache.get(world, 'biomes', 0, 0, CHUNK_JSON)
+
+    # Accesses are written by the index's own thread, never by the access itself.
+    connection = cache.index._connection()
+    for _ in range(100):
+        if connection.execute('SELECT hits FROM regions').fetchall() == [(2,)]:
+            break
+        time.sleep(0.05)
+
+    assert connection.execute('SELECT hits FROM regions').fetchall() == [(2,)]
+
+
+def test_evict_regions(tmp_path):
+    cache = _cache_worlds(tmp_path, 1, 2)
+    usages = cache.index.scan()
+    region_size = usages[0].size
+    assert len(usages) == 4
+
+    assert evict(cache.index, region_size * 4) == []
+
+    # The least frequently used regions go first, except for pinned worlds.
+    evicted = evict(cache.index, region_size * 3, pinned={'1.6.4:default:1'}, policy='lfu')
+    assert [usage.path for usage in evicted] == [os.path.join('1.6.4', 'default', '2', 'DIM0', 'biomes', 'r.1.0.region')]
+    assert cache.get(('1.6.4', 'default', '2', 'DIM0'), 'biomes', 32, 0, CHUNK_JSON) is None
+    assert cache.get(('1.6.4', 'default', '2', 'DIM0'), 'biomes', 0, 0, CHUNK_JSON) == bytes(100)
+
+    # Evicted regions are cached again when written to.
+    cache.put(('1.6.4', 'default', '2', 'DIM0'), 'biomes', [(32, 0, CHUNK_JSON, bytes(10))])
+    assert cache.get(('1.6.4', 'default', '2', 'DIM0'), 'biomes', 32, 0, CHUNK_JSON) == bytes(10)
+
+
+def test_evict_worlds(tmp_path):
+    cache = _cache_worlds(tmp_path, 1, 2, 3)
+    region_size = cache.index.scan()[0].size
+    cache.get(('1.6.4', 'default', '1', 'DIM0'), 'biomes', 0, 0, CHUNK_JSON)
+    cache.index.flush()
+
+    # Worlds are evicted whole, least recently used first, removing their folders.
+    evicted = evict(cache.index, region_size * 3, whole_worlds=True)
+    assert {usage.world for usage in evicted} == {'1.6.4:default:2', '1.6.4:default:3'}
+    assert sorted(os.listdir(tmp_path / '1.6.4' / 'default')) == ['1']
+
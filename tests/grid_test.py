@@ -0,0 +1,72 @@
+# Copyright 2020 Lane Shaw
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''
+Tests for the mcmaps.mc.biomes.grid module.
+
+Meant for use with py.test.
+Write each test as a function named test_<something>.
+Read more here: http://pytest.org/
+'''
+
+import pytest
+
+from mcmaps.mc.biomes import BiomeGrid
+from mcmaps.mc.constants import BIOME_ID
+
+
+def test_empty():
+    grid = BiomeGrid.empty(-3, 5, 4, 2)
+    assert (grid.x_pos, grid.z_pos) == (-3, 5)
+    assert (grid.x_width, grid.z_depth) == (4, 2)
+    assert grid.biomes() == [BIOME_ID.OCEAN] * 8
+
+
+def test_view():
+    grid = BiomeGrid.empty(-3, 5, 4, 3)
+    view = grid.view(-2, 6, 2, 2)
+    view.values[1, 0] = BIOME_ID.JUNGLE
+
+    assert (view.x_pos, view.z_pos) == (-2, 6)
+    assert grid.biome(2, 1) is BIOME_ID.JUNGLE
+
+    with pytest.raises(ValueError):
+        grid.view(-4, 5, 2, 2)
+    with pytest.raises(ValueError):
+        grid.view(-3, 5, 4, 4)
+
+
+def test_biomes_order():
+    grid = BiomeGrid.empty(0, 0, 2, 2)
+    grid.values[1, 0] = BIOME_ID.DESERT
+    grid.values[0, 1] = BIOME_ID.NONE
+
+    assert grid.biomes() == [
+        BIOME_ID.OCEAN, BIOME_ID.DESERT,
+        BIOME_ID.NONE, BIOME_ID.OCEAN,
+    ]
+    assert grid.colors() == b''.join(bytes(biome.color) for biome in grid.biomes())
+
+
+def test_neighborhood():
+    grid = BiomeGrid.empty(-1, -1, 4, 3)
+    grid.values[:] = [[0, 1, 2], [3, 4, 5], [6, 7, 8], [9, 10, 11]]
+    area = grid.neighborhood(0, 0, 2, 1)
+
+    assert area.mc.tolist() == [[4], [7]]
+    assert area.tl.tolist() == [[0], [3]]
+    assert area.tc.tolist() == [[3], [6]]
+    assert area.mr.tolist() == [[7], [10]]
+    assert area.bl.tolist() == [[2], [5]]
+    assert area.br.tolist() == [[8], [11]]
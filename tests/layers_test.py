@@ -0,0 +1,311 @@
+# Copyright 2020 Lane Shaw
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''
+Tests for the mcmaps.mc.biomes layer classes.
+
+Meant for use with py.test.
+Write each test as a function named test_<something>.
+Read more here: http://pytest.org/
+'''
+
+from itertools import product
+
+import numpy as np
+
+from mcmaps.mc.biomes import (
+    AddIslandLayer, BaseLayer, BiomeGrid, HillsLayer, IslandLayer, LayerPlan, ShoreLayer, SmoothLayer,
+    VoronoiZoomLayer, ZoomLayer, initialize_all_biomes,
+)
+from mcmaps.mc.constants import BIOME_ID, WORLD_TYPE
+
+TEST_WORLD_SEEDS = (0, 1, -5, 123456789123, 2 ** 63 - 1, -2 ** 63)
+
+
+def test_init_chunk_seeds():
+    layer = IslandLayer(2000)
+
+    for world_seed in TEST_WORLD_SEEDS:
+        layer.init_world_seed(world_seed)
+
+        for shift in range(3):
+            chunk_seeds = layer.init_chunk_seeds(-3, 1000, 6, 5, shift)
+
+            for x in range(6):
+                for z in range(5):
+                    layer.init_chunk_seed(-3 + x << shift, 1000 + z << shift)
+                    assert chunk_seeds[x, z] == layer.chunk_seed.value
+
+
+def test_nextInts():
+    layer = IslandLayer(1)
+    layer.init_world_seed(-8675309)
+    chunk_seeds = layer.init_chunk_seeds(-20, -20, 8, 8)
+    draws = layer.peekInts(chunk_seeds, 10, 3)
+
+    for x in range(8):
+        for z in range(8):
+            layer.init_chunk_seed(-20 + x, -20 + z)
+            assert [layer.nextInt(10) for _ in range(3)] == draws[:, x, z].tolist()
+
+
+def test_nextInts_mask():
+    layer = IslandLayer(1)
+    layer.init_world_seed(42)
+    chunk_seeds = layer.init_chunk_seeds(0, 0, 4, 4)
+    mask = chunk_seeds % 2 == 0
+
+    initial_seeds = chunk_seeds.copy()
+    layer.nextInts(chunk_seeds, 5, mask)
+
+    assert (chunk_seeds[~mask] == initial_seeds[~mask]).all()
+    assert (chunk_seeds[mask] != initial_seeds[mask]).all()
+
+
+def _select_mode(value_tl, value_tr, value_bl, value_br):
+    ''' Per-cell reference of MC's selectModeOrRandom, returning None when it would be random. '''
+    rules = (
+        (value_tr == value_bl == value_br, value_tr),
+        (value_tl == value_tr == value_bl, value_tl),
+        (value_tl == value_tr == value_br, value_tl),
+        (value_tl == value_bl == value_br, value_tl),
+        (value_tl == value_tr and value_bl != value_br, value_tl),
+        (value_tl == value_bl and value_tr != value_br, value_tl),
+        (value_tl == value_br and value_tr != value_bl, value_tl),
+        (value_tr == value_tl and value_bl != value_br, value_tr),
+        (value_tr == value_bl and value_tl != value_br, value_tr),
+        (value_tr == value_br and value_tl != value_bl, value_tr),
+        (value_bl == value_tl and value_tr != value_br, value_bl),
+        (value_bl == value_tr and value_tl != value_br, value_bl),
+        (value_bl == value_br and value_tl != value_tr, value_bl),
+        (value_br == value_tl and value_tr != value_bl, value_bl),
+        (value_br == value_tr and value_tl != value_bl, value_bl),
+        (value_br == value_bl and value_tl != value_tr, value_bl),
+    )
+
+    return next((value for matched, value in rules if matched), None)
+
+
+def test_zoom_diagonal_func():
+    layer = ZoomLayer(1000)
+    layer.init_world_seed(0)
+
+    corners = np.array(list(product(range(4), repeat=4)), dtype=np.int8).T[:, :, None]
+    chunk_seeds = layer.init_chunk_seeds(0, 0, corners.shape[1], 1)
+    random_values = layer.peekInts(chunk_seeds, 4, 1)[0]
+    diagonal_values = layer.diagonal_func(chunk_seeds, *corners)
+
+    for index, values in enumerate(corners[:, :, 0].T.tolist()):
+        expected = _select_mode(*values)
+        if expected is None:
+            expected = values[random_values[index, 0]]
+        assert diagonal_values[index, 0] == expected
+
+
+class _RandomLayer(BaseLayer):
+    ''' A child layer of random biomes out of a few, the same wherever areas overlap. '''
+
+    def __init__(self, biomes):
+        super().__init__(0)
+        self.biomes = np.array(biomes, dtype=BiomeGrid.dtype)
+
+    def get_child_areas(self, x_pos, z_pos, x_width, z_depth):
+        return ()
+
+    def generate_area(self, biome_values):
+        chunk_seeds = self.init_chunk_seeds(*biome_values.area)
+        biome_values.values[...] = self.biomes[self.nextInts(chunk_seeds, len(self.biomes))]
+
+
+def _voronoi_zoom(layer, x_pos, z_pos, x_width, z_depth):
+    ''' Per-cell reference of VoronoiZoomLayer, jittering each corner of every child cell in turn. '''
+    x_pos -= 2
+    z_pos -= 2
+    child_x_pos = x_pos >> 2
+    child_z_pos = z_pos >> 2
+    child = layer.child_layer.get_area(child_x_pos, child_z_pos, (x_width >> 2) + 3, (z_depth >> 2) + 3)
+    zoom_values = np.zeros((child.x_width - 1 << 2, child.z_depth - 1 << 2), dtype=BiomeGrid.dtype)
+
+    for z in range(child.z_depth - 1):
+        for x in range(child.x_width - 1):
+            corners = []
+
+            # TL, TR, BL and BR, each with its own jitter.
+            for corner_z, corner_x in product(range(2), repeat=2):
+                layer.init_chunk_seed(child_x_pos + x + corner_x << 2, child_z_pos + z + corner_z << 2)
+                jitter_x = layer.nextDouble(1024) * 3.6 + 4.0 * corner_x
+                jitter_z = layer.nextDouble(1024) * 3.6 + 4.0 * corner_z
+                corners.append((jitter_x, jitter_z, child.values[x + corner_x, z + corner_z]))
+
+            for cell_z in range(4):
+                for cell_x in range(4):
+                    dists = [(cell_z - jitter_z) ** 2 + (cell_x - jitter_x) ** 2 for jitter_x, jitter_z, _ in corners]
+
+                    # The first strictly closest corner wins, otherwise BR.
+                    value = corners[3][2]
+                    for index in range(3):
+                        if all(dists[index] < dist for other, dist in enumerate(dists) if other != index):
+                            value = corners[index][2]
+                            break
+
+                    zoom_values[(x << 2) + cell_x, (z << 2) + cell_z] = value
+
+    x_offset = x_pos & 3
+    z_offset = z_pos & 3
+    return BiomeGrid(x_pos + 2, z_pos + 2, zoom_values[x_offset:x_offset + x_width, z_offset:z_offset + z_depth])
+
+
+def test_voronoi_zoom():
+    layer = VoronoiZoomLayer(10, child=_RandomLayer(range(8)))
+
+    for world_seed in TEST_WORLD_SEEDS[:3]:
+        layer.init_world_seed(world_seed)
+
+        for area in ((0, 0, 16, 16), (-5, 7, 16, 16), (3, -9, 13, 22), (-48, 160, 7, 5)):
+            assert layer.get_area(*area) == _voronoi_zoom(layer, *area)
+
+
+def _stencil_area(layer, cell_func, x_pos, z_pos, x_width, z_depth):
+    '''
+    Per-cell reference of a layer reading its child's 3x3 neighborhood, calling
+    cell_func(layer, x, z, child) for every cell where child(dx, dz) is a neighbor's value.
+    '''
+    child = layer.child_layer.get_area(x_pos - 1, z_pos - 1, x_width + 2, z_depth + 2)
+    biome_values = BiomeGrid.empty(x_pos, z_pos, x_width, z_depth)
+
+    for z in range(z_depth):
+        for x in range(x_width):
+            biome_values.values[x, z] = cell_func(
+                layer, x_pos + x, z_pos + z,
+                lambda dx, dz: child.values[x + 1 + dx, z + 1 + dz],
+            )
+
+    return biome_values
+
+
+def _add_island_cell(layer, x, z, child):
+    layer.init_chunk_seed(x, z)
+    center_value = child(0, 0)
+    corner_values = (child(-1, -1), child(1, -1), child(-1, 1), child(1, 1))
+
+    if center_value == BIOME_ID.OCEAN and any(value != BIOME_ID.OCEAN for value in corner_values):
+        # Every land corner draws once, with growing odds of replacing the others.
+        corner_probability = 1
+        next_value = BIOME_ID.PLAINS
+
+        for value in corner_values:
+            if value != BIOME_ID.OCEAN:
+                if not layer.nextInt(corner_probability):
+                    next_value = value
+                corner_probability += 1
+
+        if not layer.nextInt(3):
+            return next_value
+        return BIOME_ID.OCEAN_FROZEN if next_value == BIOME_ID.PLAINS_ICE else BIOME_ID.OCEAN
+
+    if center_value != BIOME_ID.OCEAN and BIOME_ID.OCEAN in corner_values and not layer.nextInt(5):
+        return BIOME_ID.OCEAN_FROZEN if center_value == BIOME_ID.PLAINS_ICE else BIOME_ID.OCEAN
+
+    return center_value
+
+
+def _shore_cell(layer, x, z, child):
+    center_value = child(0, 0)
+    edge_values = (child(0, -1), child(1, 0), child(-1, 0), child(0, 1))
+
+    if center_value == BIOME_ID.MUSHROOM_ISLAND:
+        return BIOME_ID.MUSHROOM_BEACH if BIOME_ID.OCEAN in edge_values else center_value
+    if center_value not in (BIOME_ID.OCEAN, BIOME_ID.RIVER, BIOME_ID.SWAMP, BIOME_ID.HILLS_EXTREME):
+        return BIOME_ID.BEACH if BIOME_ID.OCEAN in edge_values else center_value
+    if center_value == BIOME_ID.HILLS_EXTREME:
+        if all(value == BIOME_ID.HILLS_EXTREME for value in edge_values):
+            return center_value
+        return BIOME_ID.HILLS_EXTREME_EDGE
+
+    return center_value
+
+
+def _hills_cell(layer, x, z, child):
+    layer.init_chunk_seed(x, z)
+    next_value = child(0, 0)
+
+    if not layer.nextInt(3):
+        hill_value = HillsLayer.HILLS_MAP.get(next_value, next_value)
+        if all(value == next_value for value in (child(0, -1), child(1, 0), child(-1, 0), child(0, 1))):
+            return hill_value
+
+    return next_value
+
+
+def _smooth_cell(layer, x, z, child):
+    value_ml, value_mr, value_tc, value_bc = child(-1, 0), child(1, 0), child(0, -1), child(0, 1)
+
+    if value_ml == value_mr and value_tc == value_bc:
+        layer.init_chunk_seed(x, z)
+        return value_tc if layer.nextInt(2) else value_ml
+    if value_tc == value_bc:
+        return value_tc
+    if value_ml == value_mr:
+        return value_ml
+
+    return child(0, 0)
+
+
+def test_stencil_layers():
+    stencils = (
+        # Mostly oceans, so AddIsland's cells draw once per land corner.
+        (AddIslandLayer, _add_island_cell, (
+            BIOME_ID.OCEAN, BIOME_ID.OCEAN, BIOME_ID.OCEAN,
+            BIOME_ID.PLAINS, BIOME_ID.PLAINS_ICE, BIOME_ID.FOREST,
+        )),
+        (ShoreLayer, _shore_cell, (
+            BIOME_ID.OCEAN, BIOME_ID.MUSHROOM_ISLAND, BIOME_ID.PLAINS,
+            BIOME_ID.HILLS_EXTREME, BIOME_ID.HILLS_EXTREME, BIOME_ID.RIVER, BIOME_ID.SWAMP,
+        )),
+        # Mostly plains, so hills have neighborhoods of the same biome.
+        (HillsLayer, _hills_cell, (BIOME_ID.PLAINS,) * 4 + (BIOME_ID.DESERT, BIOME_ID.JUNGLE, BIOME_ID.OCEAN)),
+        (SmoothLayer, _smooth_cell, (BIOME_ID.OCEAN, BIOME_ID.PLAINS)),
+    )
+
+    for layer_type, cell_func, biomes in stencils:
+        layer = layer_type(3, child=_RandomLayer(biomes))
+
+        for world_seed in TEST_WORLD_SEEDS[:3]:
+            layer.init_world_seed(world_seed)
+
+            for area in ((0, 0, 16, 16), (-5, 7, 16, 16), (3, -9, 40, 23)):
+                assert layer.get_area(*area) == _stencil_area(layer, cell_func, *area), layer_type.__name__
+
+
+def test_layer_plan():
+    for world_seed in TEST_WORLD_SEEDS[:3]:
+        layers = initialize_all_biomes(world_seed, WORLD_TYPE.DEFAULT)
+        plans = initialize_all_biomes(world_seed, WORLD_TYPE.DEFAULT, plan_size=(16, 16))
+
+        for layer, plan in zip(layers, plans):
+            assert isinstance(plan, LayerPlan)
+
+            # Chunk sized areas reuse the same buffers, while larger areas grow them.
+            for area in ((0, 0, 16, 16), (-48, 160, 16, 16), (-5, 7, 16, 16), (3, -9, 40, 23)):
+                assert plan.get_area(*area) == layer.get_area(*area)
+
+
+def test_layer_plan_tiles():
+    for layer in initialize_all_biomes(-5, WORLD_TYPE.LARGE_BIOME):
+        plan = LayerPlan(layer, 16, 16, tile_size=24)
+        assert any(plan.fused)
+
+        # Areas larger than a tile are generated in fused tiles, including partial tiles along the edges.
+        for area in ((0, 0, 48, 48), (-37, 11, 61, 30), (5, -90, 24, 25)):
+            assert plan.get_area(*area) == layer.get_area(*area)
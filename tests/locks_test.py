@@ -0,0 +1,72 @@
+# Copyright 2020 Lane Shaw
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''
+Tests for the mcmaps.util.locks module.
+
+Meant for use with py.test.
+Write each test as a function named test_<something>.
+Read more here: http://pytest.org/
+'''
+
+from multiprocessing import get_context
+from threading import Thread
+
+from mcmaps.util.locks import KeyLocks, get_key_locks
+
+
+def _try_lock(folder, key):
+    release = KeyLocks(folder).acquire(key, timeout=0.1)
+    if release is None:
+        return False
+
+    release()
+    return True
+
+
+def test_key_locks(tmp_path):
+    folder = str(tmp_path / 'locks')
+    key_locks = get_key_locks(folder)
+    assert get_key_locks(folder) is key_locks
+
+    release = key_locks.acquire(('1.6.4', 'default', 12345, 0, 0))
+    assert release is not None
+
+    # Other threads and processes wait for the key, until timing out.
+    assert key_locks.acquire(('1.6.4', 'default', 12345, 0, 0), timeout=0.1) is None
+    with get_context('spawn').Pool(1) as pool:
+        assert not pool.apply(_try_lock, (folder, ('1.6.4', 'default', 12345, 0, 0)))
+
+        # Locks can be released by any thread.
+        thread = Thread(target=release)
+        thread.start()
+        thread.join()
+
+        assert pool.apply(_try_lock, (folder, ('1.6.4', 'default', 12345, 0, 0)))
+
+    key_locks.acquire(('1.6.4', 'default', 12345, 0, 0), timeout=0.1)()
+
+
+def test_release_twice(tmp_path):
+    key_locks = KeyLocks(str(tmp_path / 'locks'))
+    release = key_locks.acquire('key')
+    release()
+
+    # Releasing again never touches the lock acquired since.
+    second_release = key_locks.acquire('key', timeout=0.1)
+    release()
+    assert key_locks.acquire('key', timeout=0.1) is None
+
+    second_release()
+    assert key_locks.acquire('key', timeout=0.1) is not None
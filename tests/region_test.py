@@ -0,0 +1,119 @@
+# Copyright 2020 Lane Shaw
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''
+Tests for the mcmaps.util.region module.
+
+Meant for use with py.test.
+Write each test as a function named test_<something>.
+Read more here: http://pytest.org/
+'''
+
+import os
+import struct
+
+import pytest
+
+from mcmaps.util import region as region_module
+from mcmaps.util.region import CHUNK_BINARY, CHUNK_IMAGE, CHUNK_JSON, RegionFile, open_region, region_path
+
+
+def test_region_path():
+    assert region_path('biomes', 0, 31) == os.path.join('biomes', 'r.0.0.region')
+    assert region_path('biomes', -1, 32) == os.path.join('biomes', 'r.-1.1.region')
+
+
+def test_region_records(tmp_path):
+    path = str(tmp_path / 'r.-1.0.region')
+    assert open_region(path) is None
+
+    region = open_region(path, create=True)
+    assert region.read(-1, 0, CHUNK_JSON) is None
+
+    assert region.write([
+        (-1, 0, CHUNK_JSON, b'{"x": -1}'),
+        (-1, 0, CHUNK_IMAGE, b'PNG'),
+        (-32, 31, CHUNK_JSON, b'{"x": -32}'),
+    ]) == 3
+
+    # Stored records are kept, while new ones are appended.
+    assert region.write([
+        (-1, 0, CHUNK_JSON, b'{"x": "changed"}'),
+        (-2, 0, CHUNK_JSON, b'{"x": -2}'),
+    ]) == 1
+
+    assert region.read(-1, 0, CHUNK_JSON) == b'{"x": -1}'
+    assert region.read(-1, 0, CHUNK_IMAGE) == b'PNG'
+    assert region.read(-32, 31, CHUNK_JSON) == b'{"x": -32}'
+    assert region.read(-2, 0, CHUNK_JSON) == b'{"x": -2}'
+    assert region.read(-2, 0, CHUNK_IMAGE) is None
+
+    # Other readers of the same file see every record.
+    assert RegionFile(path).read(-2, 0, CHUNK_JSON) == b'{"x": -2}'
+
+
+def test_region_record_count(tmp_path):
+    # Region files created before binary records were added only index JSON and image records.
+    path = str(tmp_path / 'r.0.0.region')
+    with open(path, 'wb') as region_file:
+        region_file.write(struct.pack('<8sI4x', b'MCMAPSR1', 2) + bytes(32 * 32 * 2 * 8))
+
+    region = RegionFile(path)
+    assert region.write([
+        (1, 2, CHUNK_JSON, b'{"x": 1}'),
+        (1, 2, CHUNK_BINARY, b'MCBM'),
+    ]) == 1
+
+    assert region.read(1, 2, CHUNK_JSON) == b'{"x": 1}'
+    assert region.read(1, 2, CHUNK_BINARY) is None
+
+
+def test_region_readers(tmp_path):
+    fcntl = pytest.importorskip('fcntl')
+    path = str(tmp_path / 'r.0.0.region')
+    RegionFile(path).write([(0, 0, CHUNK_JSON, b'{"x": 0}')])
+
+    # Readers only need permission to read region files, until they write to them.
+    region = RegionFile(path, create=False)
+    assert fcntl.fcntl(region._fd, fcntl.F_GETFL) & os.O_ACCMODE == os.O_RDONLY
+    assert region.read(0, 0, CHUNK_JSON) == b'{"x": 0}'
+
+    assert region.write([(1, 0, CHUNK_JSON, b'{"x": 1}')]) == 1
+    assert fcntl.fcntl(region._fd, fcntl.F_GETFL) & os.O_ACCMODE == os.O_RDWR
+    assert region.read(1, 0, CHUNK_JSON) == b'{"x": 1}'
+
+    # Unless the region file was removed, and created again, since they opened it.
+    region = RegionFile(path, create=False)
+    os.unlink(path)
+    RegionFile(path).write([(2, 0, CHUNK_JSON, b'{"x": 2}')])
+
+    with pytest.raises(FileNotFoundError):
+        region.write([(2, 0, CHUNK_JSON, b'{"x": "old"}')])
+    assert RegionFile(path, create=False).read(2, 0, CHUNK_JSON) == b'{"x": 2}'
+
+
+def test_region_without_pread(tmp_path, monkeypatch):
+    # Windows has no os.pread or os.pwrite, so region files are read and written after seeking.
+    monkeypatch.setattr(region_module, '_pread', region_module._seek_pread)
+    monkeypatch.setattr(region_module, '_pwrite', region_module._seek_pwrite)
+
+    path = str(tmp_path / 'r.0.0.region')
+    region = RegionFile(path)
+    assert region.write([(0, 0, CHUNK_JSON, b'{"x": 0}'), (1, 0, CHUNK_IMAGE, b'PNG')]) == 2
+    assert region.write([(0, 0, CHUNK_JSON, b'{"x": "changed"}'), (2, 0, CHUNK_JSON, b'{"x": 2}')]) == 1
+
+    region = RegionFile(path, create=False)
+    assert region.read(0, 0, CHUNK_JSON) == b'{"x": 0}'
+    assert region.read(1, 0, CHUNK_IMAGE) == b'PNG'
+    assert region.read(2, 0, CHUNK_JSON) == b'{"x": 2}'
@@ -0,0 +1,74 @@
+# Copyright 2020 Lane Shaw
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''
+Tests for the mcmaps.mc.biomes.snapshot module.
+
+Meant for use with py.test.
+Write each test as a function named test_<something>.
+Read more here: http://pytest.org/
+'''
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from mcmaps.mc.biomes import (
+    initialize_all_biomes, load_biomes_snapshot, read_snapshot,
+    save_biomes_snapshot, walk_layers, write_snapshot,
+)
+from mcmaps.mc.constants import WORLD_TYPE
+
+
+def test_snapshot(tmp_path):
+    snapshot_path = str(tmp_path / 'generator.snapshot')
+
+    for world_type in (WORLD_TYPE.DEFAULT, WORLD_TYPE.LARGE_BIOME, WORLD_TYPE.DEFAULT_1_1):
+        save_biomes_snapshot(snapshot_path, -8675309, world_type)
+        snapshot = read_snapshot(snapshot_path)
+        layers = initialize_all_biomes(-8675309, world_type)
+
+        assert snapshot[:3] == ('1.6.4', world_type, -8675309)
+        assert snapshot.world_seeds.tolist() == [layer.world_seed.value for layer in walk_layers(*layers)]
+
+        for layer, snapshot_layer in zip(layers, load_biomes_snapshot(snapshot_path)):
+            assert snapshot_layer.get_area(-40, 72, 24, 24) == layer.get_area(-40, 72, 24, 24)
+
+
+def test_snapshot_mismatch(tmp_path):
+    snapshot_path = str(tmp_path / 'generator.snapshot')
+
+    # Large biome worlds have more layers than default ones.
+    save_biomes_snapshot(snapshot_path, 1, WORLD_TYPE.LARGE_BIOME)
+    world_seeds = read_snapshot(snapshot_path).world_seeds
+    write_snapshot(snapshot_path, read_snapshot(snapshot_path)._replace(
+        world_type=WORLD_TYPE.DEFAULT, world_seeds=world_seeds.copy(),
+    ))
+
+    with pytest.raises(ValueError):
+        load_biomes_snapshot(snapshot_path)
+
+
+def test_snapshot_concurrent_writes(tmp_path):
+    snapshot_path = str(tmp_path / 'generator.snapshot')
+    save_biomes_snapshot(snapshot_path, 5, WORLD_TYPE.DEFAULT)
+    snapshot = read_snapshot(snapshot_path)._replace(world_seeds=read_snapshot(snapshot_path).world_seeds.copy())
+
+    # Threads of the same process writing the same snapshot never trip over each other.
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(lambda _: write_snapshot(snapshot_path, snapshot), range(64)))
+
+    assert read_snapshot(snapshot_path).world_seeds.tolist() == snapshot.world_seeds.tolist()
+    assert os.listdir(str(tmp_path)) == ['generator.snapshot']
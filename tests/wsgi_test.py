@@ -0,0 +1,96 @@
+# Copyright 2020 Lane Shaw
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''
+Tests for the mcmaps.util.wsgi module.
+
+Meant for use with py.test.
+Write each test as a function named test_<something>.
+Read more here: http://pytest.org/
+'''
+
+import pytest
+
+from mcmaps.mc.constants import WORLD_TYPE
+from mcmaps.util.binary import BIOMES_RAW, BIOMES_RLE
+from mcmaps.util.wsgi import (
+    BadRequest,
+    immutable_headers,
+    is_not_modified,
+    select_content_encoding,
+    verify_area_parameters,
+    verify_default_parameters,
+    verify_format_parameters,
+)
+
+
+def test_verify_default_parameters():
+    assert verify_default_parameters('seed=-5&version=1.6.4&wtype=large_biome&x=3&z=-4') == \
+        (-5, '1.6.4', WORLD_TYPE.LARGE_BIOME, 3, -4)  # @UndefinedVariable
+
+    assert verify_default_parameters('seed=1&version=1.6.4&x=-1875000&z=1874999')[3:] == (-1875000, 1874999)
+
+    for query in (
+        'seed=a&version=1.6.4&x=3&z=-4',
+        # Chunks outside of the world border.
+        'seed=1&version=1.6.4&x=1875000&z=0',
+        'seed=1&version=1.6.4&x=0&z=-1875001',
+        'seed=1&version=1.6.4&x=2147483648&z=0',
+    ):
+        with pytest.raises(BadRequest):
+            verify_default_parameters(query)
+
+
+def test_verify_area_parameters():
+    assert verify_area_parameters('w=16&d=4', 64) == (16, 4)
+
+    for query in ('w=16', 'w=0&d=4', 'w=x&d=4', 'w=16&d=5'):
+        with pytest.raises(BadRequest):
+            verify_area_parameters(query, 64)
+
+
+def test_verify_format_parameters():
+    assert verify_format_parameters('x=0') is None
+    assert verify_format_parameters('x=0&fmt=raw') == BIOMES_RAW
+    assert verify_format_parameters('x=0', 'application/x-mcmaps-biomes, */*') == BIOMES_RLE
+    assert verify_format_parameters('fmt=json', 'application/x-mcmaps-biomes') is None
+
+    with pytest.raises(BadRequest):
+        verify_format_parameters('fmt=xml')
+
+
+def test_immutable_headers():
+    headers = immutable_headers('biomes', '1.6.4', 'DEFAULT', 5, 1, 2, None)
+    etag = headers['ETag']
+
+    assert 'immutable' in headers['Cache-Control']
+    assert immutable_headers('biomes', '1.6.4', 'DEFAULT', 5, 1, 2, None)['ETag'] == etag
+    assert immutable_headers('biomes', '1.6.4', 'DEFAULT', 5, 2, 1, None)['ETag'] != etag
+
+    assert is_not_modified({'HTTP_IF_NONE_MATCH': etag}, etag)
+    assert is_not_modified({'HTTP_IF_NONE_MATCH': '"other", W/' + etag}, etag)
+    assert is_not_modified({'HTTP_IF_NONE_MATCH': '*'}, etag)
+    assert not is_not_modified({'HTTP_IF_NONE_MATCH': '"other"'}, etag)
+    assert not is_not_modified({}, etag)
+
+
+def test_select_content_encoding():
+    assert select_content_encoding('gzip, deflate, br', ('br', 'gzip')) == 'br'
+    assert select_content_encoding('gzip, deflate, br', ('gzip',)) == 'gzip'
+    assert select_content_encoding('br;q=0, *', ('br', 'gzip')) == 'gzip'
+    assert select_content_encoding('gzip;q=1, br;q=0.1', ('br', 'gzip')) == 'gzip'
+    assert select_content_encoding('gzip;q=0.5, *;q=0.8', ('br', 'gzip')) == 'br'
+    assert select_content_encoding('gzip;q=0.5, identity', ('br', 'gzip')) is None
+    assert select_content_encoding('identity', ('br', 'gzip')) is None
+    assert select_content_encoding('', ('gzip',)) is None
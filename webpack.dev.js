@@ -25,7 +25,7 @@ module.exports = {
         serveIndex: false,
         port: 3000,
         proxy: [{
-            context: ['/api', '/cache'],
+            context: ['/api'],
             target:'http://localhost:3001',
         }],
         publicPath: '/',